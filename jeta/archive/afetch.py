@@ -0,0 +1,243 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Asyncio interface to fetch telemetry from the engineering archive.
+
+The coroutines ``msid()`` and ``msidset()`` return the same ``MSID`` and
+``MSIDset`` objects as the blocking ``fetch`` API, for example::
+
+  from jeta.archive import afetch
+
+  async def handler():
+      dat = await afetch.msid('aogyrct1', '2018:001', '2018:002')
+      dats = await afetch.msidset(['aogyrct1', 'aogyrct2'], '2018:001', '2018:002')
+
+HDF5 reads are done on a managed thread pool executor in blocks (see
+``fetch.BLOCK_ROWS``) so the event loop is never blocked by a read and many
+concurrent requests are interleaved block by block.  The reads themselves are
+serialized by ``fetch.HDF5_LOCK`` as for any fetch, so the executor does not
+read in parallel.  ``MAX_READS_PER_FILE`` limits the requests of any one MSID
+file that have the file open and blocks queued on the executor, so a burst of
+requests for one MSID does not hold up the requests for other MSIDs.
+Requests are cancellable: cancelling the awaiting task stops the read at the
+next block boundary and closes the files.
+"""
+from __future__ import print_function, division, absolute_import
+
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from jeta.archive import fetch
+from jeta.archive import timeconv
+from jeta.archive import decimate as decim
+
+# Number of worker threads of the default executor
+MAX_WORKERS = 8
+
+# Maximum number of concurrent requests reading the same MSID file
+MAX_READS_PER_FILE = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+# Semaphores of each event loop keyed by file path.  The entries of a loop
+# are dropped with the loop.
+_file_semaphores = weakref.WeakKeyDictionary()
+_file_semaphores_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    Get the executor used for archive reads, creating it if needed.
+
+    :returns: concurrent.futures.Executor
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=MAX_WORKERS)
+        return _executor
+
+
+def set_executor(executor):
+    """
+    Set the executor used for archive reads.  Any previous default executor is
+    shut down.
+
+    :param executor: concurrent.futures.Executor or None to use the default
+    """
+    global _executor
+    with _executor_lock:
+        old_executor, _executor = _executor, executor
+    if old_executor is not None and old_executor is not executor:
+        old_executor.shutdown(wait=False)
+
+
+def shutdown(wait=True):
+    """
+    Shut down the executor used for archive reads.  A new default executor is
+    created on the next request.
+
+    :param wait: wait for pending reads to finish
+    """
+    global _executor
+    with _executor_lock:
+        executor, _executor = _executor, None
+    if executor is not None:
+        executor.shutdown(wait=wait)
+
+
+def _file_semaphore(filepath):
+    """Get the semaphore limiting concurrent reads of ``filepath`` in this event loop"""
+    loop = asyncio.get_running_loop()
+    with _file_semaphores_lock:
+        semaphores = _file_semaphores.setdefault(loop, {})
+    if filepath not in semaphores:
+        semaphores[filepath] = asyncio.Semaphore(MAX_READS_PER_FILE)
+    return semaphores[filepath]
+
+
+def _get_msid(msid, start, stop, stat):
+    """Create an MSID in the executor, deferring the data read if possible"""
+    return fetch.MSID(msid, start, stop, stat=stat, lazy=stat is None)
+
+
+def _next_block(blocks):
+    return next(blocks, None)
+
+
+def _close_blocks(blocks):
+    blocks.close()
+
+
+async def _read_blocks(dat, decimate=None, method='minmax'):
+    """
+    Read the deferred times and values of lazy MSID ``dat`` block by block.
+
+    :param dat: lazy MSID
+    :param decimate: if set then decimate to at most this many samples
+    :param method: decimation method
+    """
+    lazy = dat._lazy
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    start_jd, stop_jd = lazy['start_jd'], lazy['stop_jd']
+
+    if decimate is not None:
+        decimator = decim.MinMaxDecimator(lazy['row0'], lazy['row1'],
+                                          decimate * decim.PRESELECT_FACTOR)
+    out_times = []
+    out_vals = []
+
+    async with _file_semaphore(lazy['times_filepath']):
+        blocks = fetch._iter_jwst_blocks(lazy['times_filepath'], lazy['values_filepath'],
+                                         lazy['index'], lazy['row0'], lazy['row1'])
+        try:
+            while True:
+                # Shield the read from cancellation so the generator is only
+                # closed once the executor is done with it.
+                future = loop.run_in_executor(executor, _next_block, blocks)
+                try:
+                    block = await asyncio.shield(future)
+                except asyncio.CancelledError:
+                    future.add_done_callback(
+                        lambda _, blocks=blocks: loop.run_in_executor(executor, _close_blocks,
+                                                                      blocks))
+                    blocks = None
+                    raise
+                if block is None:
+                    break
+
+                row, jds, vals = block
+                # Final time filtering for exact user interval
+                idx0, idx1 = np.searchsorted(jds, [start_jd, stop_jd])
+                if decimate is not None:
+                    decimator.update(row + idx0, jds[idx0:idx1], vals[idx0:idx1])
+                elif idx1 > idx0:
+                    out_times.append(jds[idx0:idx1])
+                    out_vals.append(vals[idx0:idx1])
+        finally:
+            if blocks is not None:
+                await loop.run_in_executor(executor, _close_blocks, blocks)
+
+    if decimate is not None:
+        jds, vals = decimator.result(decimate, method)
+    elif out_times:
+        jds, vals = np.concatenate(out_times), np.concatenate(out_vals)
+    else:
+        jds, vals = np.array([], dtype=np.float64), np.array([], dtype=np.float64)
+
+    try:
+        vals = np.float64(vals)
+    except Exception:
+        pass
+
+    dat.times = timeconv.jd_to_unix(jds, out=jds)
+    dat.vals = vals
+    dat.bads = None
+    del dat._lazy
+
+
+async def msid(msid, start=fetch.LAUNCH_DATE, stop=None, stat=None, decimate=None,
+               method='minmax'):
+    """
+    Fetch data from the engineering telemetry archive into an MSID object.
+
+    :param msid: name of MSID (case-insensitive)
+    :param start: start date of telemetry (Chandra.Time compatible)
+    :param stop: stop date of telemetry (current time if not supplied)
+    :param stat: return 5-minute or daily statistics ('5min' or 'daily')
+    :param decimate: return at most this many full-resolution samples
+    :param method: decimation method, 'minmax' (default) or 'lttb'
+
+    :returns: MSID instance
+    """
+    if decimate is not None:
+        if stat:
+            raise ValueError('decimate is not supported for stat={!r}'.format(stat))
+        if method not in decim.METHODS:
+            raise ValueError('decimation method must be one of {}'.format(decim.METHODS))
+
+    loop = asyncio.get_running_loop()
+    dat = await loop.run_in_executor(get_executor(), _get_msid, msid, start, stop, stat)
+
+    # Data from sources without deferred reads have already been read
+    if '_lazy' in dat.__dict__:
+        await _read_blocks(dat, decimate, method)
+        dat.lazy = False
+        dat.decimate = decimate
+        dat.method = method
+
+    return dat
+
+
+async def msidset(msids, start=fetch.LAUNCH_DATE, stop=None, stat=None, decimate=None,
+                  method='minmax'):
+    """
+    Fetch a set of MSIDs from the engineering telemetry archive.  The MSIDs are
+    fetched concurrently.
+
+    :param msids: list of MSID names (case-insensitive)
+    :param start: start date of telemetry (Chandra.Time compatible)
+    :param stop: stop date of telemetry (current time if not supplied)
+    :param stat: return 5-minute or daily statistics ('5min' or 'daily')
+    :param decimate: return at most this many full-resolution samples per MSID
+    :param method: decimation method, 'minmax' (default) or 'lttb'
+
+    :returns: Dict-like object containing MSID instances keyed by MSID name
+    """
+    out = fetch.MSIDset([], start, stop)
+
+    # Input ``msids`` may contain globs, so expand each and add to new list
+    new_msids = []
+    for name in msids:
+        new_msids.extend(fetch.msid_glob(name)[0])
+
+    dats = await asyncio.gather(*[msid(name, out.tstart, out.tstop, stat, decimate, method)
+                                  for name in new_msids])
+    for name, dat in zip(new_msids, dats):
+        out[name] = dat
+
+    return out
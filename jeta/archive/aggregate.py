@@ -0,0 +1,318 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Aggregates (number of samples, min, max, mean and std) of telemetry over many
+time windows from the moments of the stats pyramid.
+
+``aggregate()`` covers each window with the coarsest pyramid bins that fit
+inside it (see ``pyramid.tile``), merges the moments of those bins and adds
+the moments of the full-resolution samples at the ragged edges of the window
+that are not covered by a bin.  For each MSID the index column of each level
+is read once, the moment records of all windows are read together, and the
+edges of all windows are read in one pass, so thousands of windows cost
+little more than a few.  Many MSIDs are split between worker processes, for
+example::
+
+  >>> dat = fetch.aggregate('tephin', start='2020:001', stop='2021:001', bin='1d')
+  >>> dat['tstart'], dat['mean'], dat['max']
+  >>> dats = fetch.aggregate(['aogyrct*', 'tephin'], intervals=orbits, funcs=['mean'])
+
+As for the pyramid stats, the mean and std are weighted by the time of each
+sample (see ``binstats.time_weights``).
+"""
+from __future__ import print_function, division, absolute_import
+
+import collections
+import os
+import time
+
+import numpy as np
+import six
+
+from jeta.archive import fetch
+from jeta.archive import pyramid
+from jeta.archive import timeconv
+from jeta.archive.catalog import GLOB_CHARS
+from jeta.archive.percentiles import EDGE_PAD
+from jeta.archive.utils import map_msids
+
+FUNCS = ('n', 'min', 'max', 'mean', 'std')
+DEFAULT_FUNCS = ('mean', 'min', 'max', 'std')
+
+# Minimum number of MSIDs per worker process
+MSIDS_PER_WORKER = 16
+
+# The moment records of a level are read by row coordinates, instead of as
+# one slice, when they are less than this fraction of the slice
+SPARSE_READ_FRACTION = 0.25
+
+
+def _windows(intervals, start, stop, bin):
+    """
+    Get the windows of ``aggregate``.
+
+    :returns: tuple (tstarts, tstops) of arrays of CXC seconds
+    """
+    if intervals is not None:
+        if isinstance(intervals, np.ndarray) and intervals.dtype.names is None:
+            intervals = intervals.tolist()
+        intervals = fetch._get_table_intervals_as_list(intervals, check_overlaps=False)
+        if intervals is None:
+            raise ValueError('intervals must be a list of (start, stop) or a table '
+                             'with tstart/tstop or datestart/datestop columns')
+        intervals = np.array(intervals, dtype=np.float64).reshape(-1, 2)
+        return intervals[:, 0], intervals[:, 1]
+
+    if bin is None or start is None:
+        raise ValueError('give either intervals or start and bin')
+    dt = fetch.STATS_DT[bin] if isinstance(bin, six.string_types) else float(bin)
+    tstart = timeconv.to_secs(start)
+    tstop = timeconv.to_secs(stop) if stop else timeconv.unix_to_cxcsec(time.time())
+    tstarts = tstart + np.arange(int(np.ceil((tstop - tstart) / dt))) * dt
+    return tstarts, np.minimum(tstarts + dt, tstop)
+
+
+def _span_reduce(ufunc, col, p0s, p1s):
+    """Reduce ``col[p0:p1]`` of each non-empty span with ``ufunc``"""
+    col = np.append(col, col[:1])
+    idx = np.empty(2 * len(p0s), dtype=np.int64)
+    idx[0::2] = p0s
+    idx[1::2] = p1s
+    return ufunc.reduceat(col, idx)[0::2]
+
+
+def _read_level_moments(table, index, tiles, ids):
+    """
+    Read the moment records of the bins of ``tiles`` of one pyramid level and
+    merge them per tile.
+
+    :param table: moments table of the level
+    :param index: index column of ``table``
+    :param tiles: list of Tile of the level
+    :param ids: window number of each tile
+    :returns: structured array of MOMENTS_DTYPE with the window numbers as index
+    """
+    r0s = np.searchsorted(index, [tile.start for tile in tiles])
+    r1s = np.searchsorted(index, [tile.stop for tile in tiles])
+    ok = r1s > r0s
+    r0s, r1s, ids = r0s[ok], r1s[ok], np.asarray(ids)[ok]
+    out = np.zeros(len(r0s), dtype=pyramid.MOMENTS_DTYPE)
+    if len(r0s) == 0:
+        return out
+
+    lo, hi = r0s.min(), r1s.max()
+    if np.sum(r1s - r0s) < SPARSE_READ_FRACTION * (hi - lo):
+        coords = np.unique(np.concatenate([np.arange(r0, r1) for r0, r1 in zip(r0s, r1s)]))
+        records = table.read_coordinates(coords)
+        p0s = np.searchsorted(coords, r0s)
+    else:
+        records = table[lo:hi]
+        p0s = r0s - lo
+    p1s = p0s + (r1s - r0s)
+
+    out['index'] = ids
+    out['min'] = _span_reduce(np.minimum, records['min'], p0s, p1s)
+    out['max'] = _span_reduce(np.maximum, records['max'], p0s, p1s)
+    for name in ('n', 'sum', 'sumsq', 'weight', 'wsum', 'wsumsq'):
+        out[name] = _span_reduce(np.add, records[name], p0s, p1s)
+    return out
+
+
+def _edge_moments(context, tiles, ids, tstarts, tstops):
+    """
+    Compute the moments of the full-resolution samples of the edges of the
+    windows.  At a boundary with a bin the samples are selected by unix time,
+    as for the bins of the pyramid.
+
+    :param context: fetch.FetchContext
+    :param tiles: list of full-resolution Tile
+    :param ids: window number of each tile
+    :param tstarts: window starts (CXC sec)
+    :param tstops: window stops (CXC sec)
+    :returns: structured array of MOMENTS_DTYPE with the window numbers as index
+    """
+    edge_starts = np.array([tile.start for tile in tiles], dtype=np.float64)
+    edge_stops = np.array([tile.stop for tile in tiles], dtype=np.float64)
+    ids = np.asarray(ids, dtype=np.int64)
+    window_starts = tstarts[ids]
+    window_stops = tstops[ids]
+    inner_start = edge_starts != timeconv.cxcsec_to_unix(window_starts)
+    inner_stop = edge_stops != timeconv.cxcsec_to_unix(window_stops)
+    starts = np.where(inner_start, timeconv.unix_to_cxcsec(edge_starts) - EDGE_PAD, window_starts)
+    stops = np.where(inner_stop, timeconv.unix_to_cxcsec(edge_stops) + EDGE_PAD, window_stops)
+
+    covered = context.covers_many(starts, stops)
+    if not np.any(covered):
+        return np.zeros(0, dtype=pyramid.MOMENTS_DTYPE)
+    start_jds = timeconv.cxcsec_to_jd(starts[covered])
+    stop_jds = timeconv.cxcsec_to_jd(stops[covered])
+
+    times_filepath = context.abs('mnemonic_times')
+    index, row0s, row1s = fetch._get_jwst_interval_rows(
+        context.abs('mnemonic_index'), times_filepath, start_jds, stop_jds,
+        context.committed_rows())
+    selected = fetch._read_jwst_interval_list(times_filepath, context.abs('mnemonic_value'),
+                                              index, row0s, row1s, start_jds, stop_jds)
+
+    all_times = []
+    all_vals = []
+    ns = []
+    for sel, i in zip(selected, np.flatnonzero(covered)):
+        if sel is None or len(sel[0]) == 0:
+            ns.append(0)
+            continue
+        jds, vals = sel
+        if not issubclass(vals.dtype.type, (np.number, np.bool_)):
+            # State-valued MSIDs have no moments
+            return np.zeros(0, dtype=pyramid.MOMENTS_DTYPE)
+        times = timeconv.jd_to_unix(jds)
+        ok = np.ones(len(times), dtype=bool)
+        if inner_start[i]:
+            ok &= times >= edge_starts[i]
+        if inner_stop[i]:
+            ok &= times < edge_stops[i]
+        all_times.append(times[ok])
+        all_vals.append(np.asarray(vals[ok], dtype=np.float64))
+        ns.append(np.count_nonzero(ok))
+
+    if not all_times:
+        return np.zeros(0, dtype=pyramid.MOMENTS_DTYPE)
+    rows = np.concatenate([[0], np.cumsum(ns)])
+    return pyramid.calc_moments(np.concatenate(all_times), np.concatenate(all_vals),
+                                rows, np.append(ids[covered], -1))
+
+
+def _aggregate_msid(context, tstarts, tstops):
+    """
+    Get the merged moments of each window for one MSID in the archive units.
+
+    :returns: structured array of MOMENTS_DTYPE with a record per window
+    """
+    import tables
+
+    # Index column of the moments of each level, from which the tiles and the
+    # record rows of all windows are found
+    indexes = {}
+    for level in pyramid.LEVELS:
+        filename = context.abs('stats', interval=level)
+        if not os.path.exists(filename):
+            continue
+        with fetch.HDF5_LOCK:
+            with tables.open_file(filename, 'r') as h5:
+                if h5.__contains__('/data') and h5.root.data.nrows > 0:
+                    indexes[level] = h5.root.data.cols.index[:]
+    ranges = {level: (int(index[0]), int(index[-1]) + 1) for level, index in indexes.items()}
+
+    tiles = collections.defaultdict(list)
+    tile_ids = collections.defaultdict(list)
+    for i, (tstart, tstop) in enumerate(zip(timeconv.cxcsec_to_unix(tstarts),
+                                            timeconv.cxcsec_to_unix(tstops))):
+        for tile in pyramid.tile(tstart, tstop, ranges):
+            tiles[tile.level].append(tile)
+            tile_ids[tile.level].append(i)
+
+    parts = []
+    for level in indexes:
+        if tiles[level]:
+            with fetch.HDF5_LOCK:
+                with tables.open_file(context.abs('stats', interval=level), 'r') as h5:
+                    parts.append(_read_level_moments(h5.root.data, indexes[level],
+                                                     tiles[level], tile_ids[level]))
+    if tiles[None]:
+        parts.append(_edge_moments(context, tiles[None], tile_ids[None], tstarts, tstops))
+
+    out = np.zeros(len(tstarts), dtype=pyramid.MOMENTS_DTYPE)
+    out['index'] = np.arange(len(tstarts))
+    out['min'] = np.inf
+    out['max'] = -np.inf
+    if parts:
+        parts = np.concatenate(parts)
+        ids = parts['index']
+        np.minimum.at(out['min'], ids, parts['min'])
+        np.maximum.at(out['max'], ids, parts['max'])
+        for name in ('n', 'sum', 'sumsq', 'weight', 'wsum', 'wsumsq'):
+            out[name] = np.bincount(ids, parts[name], minlength=len(tstarts))
+    return out
+
+
+def _aggregate_msids(MSIDs, basedir, tstarts, tstops):
+    """
+    Get the merged moments of each window for ``MSIDs``.  This is run in each
+    worker process.
+
+    :returns: list of structured arrays of MOMENTS_DTYPE
+    """
+    out = []
+    for MSID in MSIDs:
+        context = fetch.FetchContext(MSID, 'tlm', basedir)
+        try:
+            out.append(_aggregate_msid(context, tstarts, tstops))
+        except OSError:
+            # No archive files for this MSID
+            out.append(None)
+    return out
+
+
+def _aggregate_table(MSID, moments, tstarts, tstops, funcs, units):
+    """Make the output table of one MSID from the merged moments of the windows"""
+    dtype = [('tstart', np.float64), ('tstop', np.float64)]
+    dtype += [(func, np.int64 if func == 'n' else np.float64) for func in funcs]
+    out = np.zeros(len(tstarts), dtype=dtype)
+    out['tstart'] = tstarts
+    out['tstop'] = tstops
+    if moments is None:
+        moments = np.zeros(len(tstarts), dtype=pyramid.MOMENTS_DTYPE)
+
+    empty = moments['n'] == 0
+    with np.errstate(invalid='ignore', divide='ignore'):
+        stats = pyramid.moment_stats(moments)
+    for func in funcs:
+        if func == 'n':
+            out['n'] = moments['n']
+            continue
+        vals = stats[func] if func in stats else moments[func]
+        vals = np.where(empty, np.nan, vals)
+        out[func] = units.convert(MSID, vals, delta_val=(func == 'std'))
+    return out
+
+
+def aggregate(msids, intervals=None, start=None, stop=None, bin=None, funcs=None,
+              workers=None):
+    """
+    Get aggregates of ``msids`` over many time windows.  See
+    ``fetch.aggregate()``.
+
+    :param msids: MSID name or list of names (case-insensitive, may include globs)
+    :param intervals: windows as a list of (start, stop) or a table with
+                      tstart/tstop or datestart/datestop columns
+    :param start: start of consecutive windows of ``bin`` (if no intervals)
+    :param stop: stop of the last window (current time if not supplied)
+    :param bin: width of consecutive windows in sec or a key of fetch.STATS_DT
+    :param funcs: list of aggregates from FUNCS (default=DEFAULT_FUNCS)
+    :param workers: number of worker processes (default=number of CPUs, with
+                    at least MSIDS_PER_WORKER MSIDs per worker)
+    :returns: structured array with 'tstart', 'tstop' (CXC seconds) and a
+              column per aggregate for a single MSID name, or an OrderedDict
+              of these arrays keyed by MSID name
+    """
+    funcs = list(DEFAULT_FUNCS if funcs is None else funcs)
+    bad_funcs = [func for func in funcs if func not in FUNCS]
+    if bad_funcs:
+        raise ValueError('funcs must be in {}, not {}'.format(FUNCS, bad_funcs))
+
+    single = isinstance(msids, six.string_types) and not GLOB_CHARS.search(msids)
+    if isinstance(msids, six.string_types):
+        msids = [msids]
+    MSIDs = fetch.msid_glob_bulk(msids)[1]
+
+    tstarts, tstops = _windows(intervals, start, stop, bin)
+    tstart = tstarts.min() if len(tstarts) else timeconv.unix_to_cxcsec(time.time())
+    basedir = fetch._get_basedir(timeconv.secs2date(tstart), fetch.msid_files.basedir)
+
+    moments = map_msids(_aggregate_msids, MSIDs, (basedir, tstarts, tstops),
+                        workers if len(tstarts) else 1, MSIDS_PER_WORKER)
+
+    units = fetch.Units(fetch.MSID.units['system'])
+    out = collections.OrderedDict(
+        (MSID, _aggregate_table(MSID, msid_moments, tstarts, tstops, funcs, units))
+        for MSID, msid_moments in zip(MSIDs, moments))
+    return out[MSIDs[0]] if single and MSIDs else out
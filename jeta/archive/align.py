@@ -0,0 +1,139 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Sampling of telemetry onto a shared time grid.
+
+``GridSampler`` takes the samples of one MSID as a stream of time-ordered
+blocks and writes nearest-neighbor or linearly interpolated values for each
+grid time directly into an output array, which is normally one column of a
+preallocated 2-D matrix.  Only the last sample of the previous block is kept
+between blocks, so the full-resolution data are never held in memory.
+
+Grid times outside the time range of the samples have no value: they are set
+to NaN and flagged in the bad-mask.
+"""
+from __future__ import print_function, division, absolute_import
+
+import numpy as np
+
+METHODS = ('nearest', 'linear')
+
+
+class GridSampler(object):
+    """
+    Sample a stream of time-ordered blocks onto a time grid.
+
+    :param grid: sorted grid times
+    :param out: float array of length ``len(grid)`` for the sampled values
+    :param bads: bool array of length ``len(grid)`` for the bad-mask
+    :param method: 'nearest' (default) or 'linear'
+    """
+    def __init__(self, grid, out, bads, method='nearest'):
+        if method not in METHODS:
+            raise ValueError('sampling method must be one of {}'.format(METHODS))
+        self.grid = grid
+        self.out = out
+        self.bads = bads
+        self.method = method
+        self._next = 0  # Index of the next grid time to be sampled
+        self._prev = None  # Last (time, value) sample of the previous block
+
+    def update(self, times, vals):
+        """
+        Sample the next block of the stream.
+
+        :param times: sample times, sorted and after those of previous blocks
+        :param vals: sample values
+        """
+        if len(times) == 0:
+            return
+
+        grid = self.grid
+        k0 = self._next
+        if self._prev is None:
+            # Grid times before the first sample have no value
+            k_first = max(np.searchsorted(grid, times[0], side='left'), k0)
+            self._set_bad(k0, k_first)
+            k0 = k_first
+        else:
+            times = np.concatenate([[self._prev[0]], times])
+            vals = np.concatenate([[self._prev[1]], vals])
+
+        # Grid times up to the last sample of this block can be sampled now
+        k1 = max(np.searchsorted(grid, times[-1], side='right'), k0)
+        if k1 > k0:
+            self.out[k0:k1] = self._sample(grid[k0:k1], times, vals)
+            self.bads[k0:k1] = False
+
+        self._prev = (times[-1], vals[-1])
+        self._next = k1
+
+    def _sample(self, grid, times, vals):
+        """Sample ``grid`` times that are within the range of ``times``"""
+        if len(times) == 1:
+            return vals[0]
+
+        # times[idx - 1] < grid <= times[idx]
+        idx = np.clip(np.searchsorted(times, grid, side='left'), 1, len(times) - 1)
+        t0 = times[idx - 1]
+        t1 = times[idx]
+        v0 = vals[idx - 1]
+        v1 = vals[idx]
+
+        if self.method == 'nearest':
+            # Ties go to the earlier sample
+            return np.where(t1 - grid < grid - t0, v1, v0)
+
+        dt = t1 - t0
+        frac = np.divide(grid - t0, dt, out=np.zeros_like(dt), where=dt > 0)
+        return v0 + (v1 - v0) * frac
+
+    def _set_bad(self, k0, k1):
+        self.out[k0:k1] = np.nan
+        self.bads[k0:k1] = True
+
+    def finish(self):
+        """
+        Finish the stream.  Grid times after the last sample have no value.
+        """
+        self._set_bad(self._next, len(self.grid))
+        self._next = len(self.grid)
+
+
+class AlignedMSIDs(object):
+    """
+    MSIDs sampled onto a shared time grid, as returned by ``fetch.aligned()``.
+
+    :param times: grid times (unix seconds)
+    :param msids: list of MSID names, one per column
+    :param vals: 2-D float64 array (n_times, n_msids) of values, NaN where bad
+    :param bads: 2-D bool array (n_times, n_msids) which is True where the
+                 MSID has no value at the grid time
+    """
+    def __init__(self, times, msids, vals, bads):
+        self.times = times
+        self.msids = list(msids)
+        self.vals = vals
+        self.bads = bads
+
+    def __repr__(self):
+        return '<{} n_times={} msids={}>'.format(self.__class__.__name__,
+                                                 len(self.times), self.msids)
+
+    def __len__(self):
+        return len(self.times)
+
+    def __getitem__(self, msid):
+        """Get the column of values for ``msid``"""
+        return self.vals[:, self.msids.index(msid)]
+
+    def to_dataframe(self):
+        """
+        Get the values as a pandas DataFrame indexed by time (unix seconds)
+        with one column per MSID.  The DataFrame shares memory with ``vals``.
+
+        :returns: pandas.DataFrame
+        """
+        import pandas as pd
+
+        return pd.DataFrame(self.vals, index=pd.Index(self.times, name='times'),
+                            columns=self.msids, copy=False)
@@ -0,0 +1,190 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Vectorized kernels for the statistics of telemetry in time bins.
+
+The samples of a bin are a contiguous segment of the time-ordered telemetry,
+given by the start row and number of rows of each segment.  All segments are
+computed at once with ``np.ufunc.reduceat`` over the segment starts instead of
+a Python loop over the bins, which matters for the ~300 5-minute bins per day
+of each of thousands of MSIDs.
+"""
+from __future__ import print_function, division, absolute_import
+
+import numpy as np
+
+# Plotting positions (alphap, betap) of scipy.stats.mstats.mquantiles
+QUANTILE_ALPHAP = 0.4
+QUANTILE_BETAP = 0.4
+
+# Range of the time weights (sec).  The low bound is just there for data with
+# identical time stamps.  The 300.0 represents 5 minutes and is the largest
+# normal time interval, so data near large gaps get a weight of 5 mins.
+MIN_DT = 0.001
+MAX_DT = 300.0
+
+# Mean rows per segment above which segments are sorted one at a time
+SORT_SEGMENT_ROWS = 4096
+
+# State values of an MSID with fewer state codes than this are mapped to codes
+# by comparing with each state, otherwise by a binary search of the states
+STATE_SEARCH_CODES = 4
+
+
+def segment_ids(ns):
+    """Get the segment number of each row of segments with ``ns`` rows"""
+    return np.repeat(np.arange(len(ns)), ns)
+
+
+def time_weights(times, starts, ns):
+    """
+    Get the time weight of each sample, which is the mean of the intervals to
+    the previous and next samples of the segment (one interval at the ends of
+    the segment), clipped to MIN_DT to MAX_DT.  Samples of segments with at
+    most two samples have unit weight.
+
+    :param times: times of the contiguous segments (sec)
+    :param starts: start row of each non-empty segment
+    :param ns: number of rows of each segment
+    :returns: tuple (dts, negs, neg_dts) of the weights, a bool mask of the
+              samples with a negative weight before clipping and those weights
+    """
+    times = np.asarray(times, dtype=np.float64)
+    dts = np.ones(len(times), dtype=np.float64)
+    weighted = np.repeat(ns > 2, ns)
+    if not np.any(weighted):
+        return dts, np.zeros(len(times), dtype=bool), dts[:0]
+
+    diffs = np.diff(times)
+    dts[1:-1] = (diffs[:-1] + diffs[1:]) / 2.0
+    big = ns > 2
+    dts[starts[big]] = diffs[starts[big]]
+    ends = starts[big] + ns[big] - 1
+    dts[ends] = diffs[ends - 1]
+
+    negs = weighted & (dts < 0.0)
+    neg_dts = dts[negs]
+    dts[weighted] = dts[weighted].clip(MIN_DT, MAX_DT)
+    dts[~weighted] = 1.0
+    return dts, negs, neg_dts
+
+
+def segment_quantiles(vals, starts, ns, probs):
+    """
+    Get quantiles of each segment, matching ``scipy.stats.mstats.mquantiles``
+    with the default plotting positions.  The values of all segments are
+    sorted together (by segment then value) and the quantiles of all segments
+    are interpolated together.
+
+    :param vals: values of the segments
+    :param starts: start row of each non-empty segment
+    :param ns: number of rows of each segment
+    :param probs: quantile probabilities (0 to 1)
+    :returns: (n_segments, n_probs) float64 array
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    x = np.array(vals, dtype=np.float64)
+
+    if len(ns) * SORT_SEGMENT_ROWS <= len(x):
+        # Few long segments (e.g. daily bins) are fastest sorted in place
+        for start, n in zip(starts, ns):
+            x[start:start + n].sort()
+    else:
+        # Sort by value, then stable sort by segment.  The segment numbers use
+        # the smallest unsigned type so the stable sort is a radix sort for up
+        # to 65536 segments, which is much faster than np.lexsort.
+        order = np.argsort(x)
+        seg_ids = segment_ids(ns).astype(np.min_scalar_type(max(len(ns) - 1, 0)))
+        x = x[order[np.argsort(seg_ids[order], kind='stable')]]
+
+    n = ns[:, np.newaxis].astype(np.float64)
+    m = QUANTILE_ALPHAP + probs * (1.0 - QUANTILE_ALPHAP - QUANTILE_BETAP)
+    aleph = n * probs + m
+    k = np.floor(np.clip(aleph, 1, np.maximum(n - 1, 1))).astype(np.int64)
+    gamma = np.clip(aleph - k, 0.0, 1.0)
+
+    # Rows of the samples on either side of each quantile (a single sample
+    # gives its value for every quantile)
+    starts = starts[:, np.newaxis]
+    single = ns[:, np.newaxis] == 1
+    row_lo = np.where(single, starts, starts + k - 1)
+    row_hi = np.where(single, starts, starts + k)
+    return (1.0 - gamma) * x[row_lo] + gamma * x[row_hi]
+
+
+def segment_stats(times, vals, starts, ns, std=False):
+    """
+    Get the min, max, time-weighted mean and optionally the time-weighted
+    (biased) standard deviation of each segment.
+
+    :param times: times of the segments (sec)
+    :param vals: numeric values of the segments
+    :param starts: start row of each non-empty segment
+    :param ns: number of rows of each segment
+    :param std: compute the standard deviation
+    :returns: dict of 'min', 'max', 'mean' (float32) and 'std' (float64)
+              arrays, and the 'negs' mask and 'neg_dts' of samples with a
+              negative weight (see ``time_weights``)
+    """
+    dts, negs, neg_dts = time_weights(times, starts, ns)
+    sum_dts = np.add.reduceat(dts, starts)
+    fvals = np.asarray(vals, dtype=np.float64)
+
+    out = {'min': np.minimum.reduceat(vals, starts),
+           'max': np.maximum.reduceat(vals, starts),
+           'mean': (np.add.reduceat(dts * fvals, starts) / sum_dts).astype(np.float32),
+           'negs': negs,
+           'neg_dts': neg_dts}
+    if std:
+        # biased weighted estimator of variance (N should be big enough)
+        # http://en.wikipedia.org/wiki/Mean_square_weighted_deviation
+        means = np.repeat(out['mean'].astype(np.float64), ns)
+        sigma_sq = np.add.reduceat(dts * (fvals - means) ** 2, starts) / sum_dts
+        out['std'] = np.sqrt(sigma_sq)
+
+    return out
+
+
+def state_code_indexes(vals, state_codes):
+    """
+    Map state values to integer codes, which are the position of each state
+    in ``state_codes``, or ``len(state_codes)`` for any other value.  The
+    values can have trailing spaces to fill out to a uniform length, so the
+    state codes are right padded accordingly.
+
+    :param vals: string (or bytes) values of a state-valued MSID
+    :param state_codes: list of (raw_count, state_code)
+    :returns: int64 array of codes
+    """
+    max_len = max(len(state_code) for raw_count, state_code in state_codes)
+    fmtstr = '{:' + str(max_len) + 's}'
+    states = np.array([fmtstr.format(state_code) for raw_count, state_code in state_codes],
+                      dtype=vals.dtype.kind)
+
+    if len(states) < STATE_SEARCH_CODES:
+        codes = np.full(len(vals), len(states), dtype=np.int64)
+        for code in reversed(range(len(states))):
+            codes[vals == states[code]] = code
+        return codes
+
+    order = np.argsort(states, kind='stable')
+    idx = np.searchsorted(states[order], vals).clip(0, len(states) - 1)
+    found = states[order][idx] == vals
+    return np.where(found, order[idx], len(states)).astype(np.int64)
+
+
+def segment_state_counts(vals, ns, state_codes):
+    """
+    Count the values of each segment in each state.  The values are mapped
+    once to integer state codes (see ``state_code_indexes``) and the counts of
+    all segments and states come from a single bincount over (segment, code).
+
+    :param vals: string (or bytes) values of the contiguous segments
+    :param ns: number of rows of each segment
+    :param state_codes: list of (raw_count, state_code)
+    :returns: (n_segments, n_states) int64 array of counts
+    """
+    n_codes = len(state_codes) + 1
+    keys = np.repeat(np.arange(len(ns), dtype=np.int64) * n_codes, ns)
+    keys += state_code_indexes(vals, state_codes)
+    counts = np.bincount(keys, minlength=len(ns) * n_codes).reshape(len(ns), n_codes)
+    return counts[:, :-1]
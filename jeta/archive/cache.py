@@ -2,6 +2,7 @@
 # Licensed under a 3-clause BSD style license - see LICENSE.rst
 import collections
 import functools
+import threading
 import six
 from six.moves import filterfalse
 from heapq import nsmallest
@@ -17,7 +18,8 @@ def lru_cache(maxsize=30):
 
     Arguments to the cached function must be hashable.
     Cache performance statistics stored in f.hits and f.misses.
-    Clear the cache with f.clear().
+    Clear the cache with f.clear().  The cache bookkeeping is thread safe but
+    the function may be called concurrently for the same arguments.
     http://en.wikipedia.org/wiki/Cache_algorithms#Least_Recently_Used
 
     '''
@@ -29,6 +31,7 @@ def lru_cache(maxsize=30):
         refcount = Counter()        # times each key is in the queue
         sentinel = object()         # marker for looping around the queue
         kwd_mark = object()         # separate positional and keyword args
+        lock = threading.RLock()    # guards cache, queue and refcount
 
         # lookup optimizations (ugly but fast)
         queue_append, queue_popleft = queue.append, queue.popleft
@@ -41,46 +44,60 @@ def lru_cache(maxsize=30):
             #if kwds:
             #    key += (kwd_mark,) + tuple(sorted(kwds.items()))
 
-            # record recent use of this key
-            queue_append(key)
-            refcount[key] += 1
-
-            # get cache entry or compute if not found
-            try:
-                result = cache[key]
-                wrapper.hits += 1
-            except KeyError:
+            with lock:
+                # record recent use of this key
+                queue_append(key)
+                refcount[key] += 1
+
+                # get cache entry
+                try:
+                    result = cache[key]
+                    wrapper.hits += 1
+                    found = True
+                except KeyError:
+                    found = False
+
+            # compute if not found, without holding the lock
+            if not found:
                 result = user_function(*args, **kwds)
-                cache[key] = result
-                wrapper.misses += 1
-
-                # purge least recently used cache entry
-                if len(cache) > maxsize:
-                    key = queue_popleft()
-                    refcount[key] -= 1
-                    while refcount[key]:
-                        key = queue_popleft()
-                        refcount[key] -= 1
-                    del cache[key], refcount[key]
-
-            # periodically compact the queue by eliminating duplicate keys
-            # while preserving order of most recent access
-            if len(queue) > maxqueue:
-                refcount.clear()
-                queue_appendleft(sentinel)
-                for key in filterfalse(refcount.__contains__,
-                                        iter(queue_pop, sentinel)):
-                    queue_appendleft(key)
-                    refcount[key] = 1
 
+            with lock:
+                if not found:
+                    # record the use again, since a purge by another call
+                    # while computing may have dropped it from the queue
+                    queue_append(key)
+                    refcount[key] += 1
+                    cache[key] = result
+                    wrapper.misses += 1
+
+                    # purge least recently used cache entries
+                    while len(cache) > maxsize:
+                        old_key = queue_popleft()
+                        refcount[old_key] -= 1
+                        while refcount[old_key]:
+                            old_key = queue_popleft()
+                            refcount[old_key] -= 1
+                        cache.pop(old_key, None)
+                        del refcount[old_key]
+
+                # periodically compact the queue by eliminating duplicate keys
+                # while preserving order of most recent access
+                if len(queue) > maxqueue:
+                    refcount.clear()
+                    queue_appendleft(sentinel)
+                    for key in filterfalse(refcount.__contains__,
+                                            iter(queue_pop, sentinel)):
+                        queue_appendleft(key)
+                        refcount[key] = 1
 
             return result
 
         def clear():
-            cache.clear()
-            queue.clear()
-            refcount.clear()
-            wrapper.hits = wrapper.misses = 0
+            with lock:
+                cache.clear()
+                queue.clear()
+                refcount.clear()
+                wrapper.hits = wrapper.misses = 0
 
         wrapper.hits = wrapper.misses = 0
         wrapper.clear = clear
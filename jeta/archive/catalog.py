@@ -0,0 +1,130 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Compiled catalog of MSID names for fast glob and regex resolution.
+
+The names of a data source are held as a sorted array.  A glob pattern is only
+matched against the names that share its literal prefix (e.g. ``AOATTQT`` for
+``AOATTQT[1234]``), which are located by binary search, and resolved patterns
+are cached.  Resolving many patterns at once with ``MsidCatalog.resolve`` has
+no limit on the number of matches.
+"""
+from __future__ import print_function, division, absolute_import
+
+import re
+import fnmatch
+
+import numpy as np
+
+from jeta.archive import cache
+
+# Characters that start a glob wildcard
+GLOB_CHARS = re.compile(r'[*?\[]')
+
+# Maximum number of resolved patterns cached per catalog
+MAX_CACHED_PATTERNS = 10000
+
+
+@cache.lru_cache(1000)
+def _compile_glob(pattern):
+    """Compile glob ``pattern`` to a regex match function"""
+    return re.compile(fnmatch.translate(pattern)).match
+
+
+@cache.lru_cache(1000)
+def _compile_regex(pattern):
+    """Compile ``pattern`` to a case-insensitive regex full-match function"""
+    return re.compile(pattern, re.IGNORECASE).fullmatch
+
+
+class MsidCatalog(object):
+    """
+    Sorted catalog of the (upper case) MSID names of a data source.
+
+    :param names: iterable of MSID names
+    """
+    def __init__(self, names):
+        self.names = np.array(sorted(set(names)), dtype=str)
+        self.name_set = frozenset(self.names.tolist())
+        self._cache = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self.name_set
+
+    def _cache_result(self, key, names):
+        if len(self._cache) >= MAX_CACHED_PATTERNS:
+            self._cache.clear()
+        self._cache[key] = names
+
+    def _prefix_range(self, prefix):
+        """Get the slice of ``names`` that start with ``prefix``"""
+        if not prefix:
+            return 0, len(self.names)
+        stop_prefix = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+        i0, i1 = np.searchsorted(self.names, [prefix, stop_prefix])
+        return i0, i1
+
+    def glob(self, pattern):
+        """
+        Get the names matching glob ``pattern`` (case-sensitive) in sorted order.
+
+        :param pattern: glob pattern
+        :returns: list of names
+        """
+        key = ('glob', pattern)
+        if key not in self._cache:
+            match = GLOB_CHARS.search(pattern)
+            if match is None:
+                out = [pattern] if pattern in self.name_set else []
+            else:
+                i0, i1 = self._prefix_range(pattern[:match.start()])
+                matcher = _compile_glob(pattern)
+                out = [name for name in self.names[i0:i1].tolist() if matcher(name)]
+            self._cache_result(key, out)
+
+        return list(self._cache[key])
+
+    def regex(self, pattern):
+        """
+        Get the names fully matching regular expression ``pattern`` (case-insensitive)
+        in sorted order.
+
+        :param pattern: regular expression
+        :returns: list of names
+        """
+        key = ('regex', pattern)
+        if key not in self._cache:
+            matcher = _compile_regex(pattern)
+            self._cache_result(key, [name for name in self.names.tolist() if matcher(name)])
+
+        return list(self._cache[key])
+
+    def resolve(self, patterns, regex=False):
+        """
+        Resolve many patterns at once with no limit on the number of matches.
+        Each pattern is tried as is and then with a ``DP_`` prefix, as for
+        ``fetch.msid_glob``.
+
+        :param patterns: iterable of glob patterns (or regexes if ``regex``)
+        :param regex: patterns are (case-insensitive) regular expressions
+        :returns: dict of list of matching names keyed by pattern
+        """
+        out = {}
+        for pattern in patterns:
+            if pattern in out:
+                continue
+            matches = []
+            for match in (pattern, 'DP_' + pattern):
+                if regex:
+                    matches = self.regex(match)
+                elif match in self.name_set:
+                    matches = [match]
+                else:
+                    matches = self.glob(match)
+                if matches:
+                    break
+            out[pattern] = matches
+
+        return out
@@ -0,0 +1,55 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Committed length of the MSID archive files.
+
+Ingest appends to the values.h5, times.h5 and index.h5 files of an MSID one
+after another, so while an ingest is running a reader can see a values file
+that is longer than the times file or an epoch record that points past the
+data written so far.  To give readers a consistent snapshot, ingest publishes
+the number of committed rows of every MSID in a small table that is written
+only after all the files of an ingest chunk are flushed and closed.  Fetch
+reads rows only up to the committed length and ignores later epoch records.
+
+The table is replaced atomically (write to a temporary file and rename), so
+readers never block the writer and always see either the previous or the new
+table.  The table is cached and is only read again when the file changes.
+"""
+from __future__ import print_function, division, absolute_import
+
+from jeta.archive.utils import read_pickle_cached, write_pickle_atomic
+
+
+def read_committed_rows(filename):
+    """
+    Read the table of committed rows.
+
+    :param filename: committed rows file
+    :returns: dict of committed rows keyed by MSID name (upper case), or None
+              if there is no table (an archive that predates it)
+    """
+    return read_pickle_cached(filename)
+
+
+def get_committed_rows(filename, msid):
+    """
+    Get the committed rows of ``msid``.
+
+    :param filename: committed rows file
+    :param msid: MSID name
+    :returns: number of committed rows, or None if there is no table in which
+              case all rows of the archive files are used
+    """
+    rows = read_committed_rows(filename)
+    if rows is None:
+        return None
+    return rows.get(msid.upper(), 0)
+
+
+def write_committed_rows(filename, rows):
+    """
+    Publish the table of committed rows, replacing the file atomically.
+
+    :param filename: committed rows file
+    :param rows: dict of committed rows keyed by MSID name
+    """
+    write_pickle_atomic(filename, {msid.upper(): int(n_rows) for msid, n_rows in rows.items()})
@@ -0,0 +1,159 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Coarse coverage map of the telemetry of every MSID.
+
+Ingest records which hourly bins (unix time // COVERAGE_DT) have telemetry
+for each MSID.  Fetch checks the map before opening any archive files, so a
+request for an interval where an MSID has no data (the common case for
+sparse MSIDs in bulk queries) returns empty without any I/O.
+
+The covered bins of each MSID are stored as sorted runs of consecutive bins
+(run-length encoded bitmap), which is compact for both continuous and sparse
+telemetry.  Coverage is only known from the first ingest after the map was
+started for an MSID that was already in the archive, and any earlier bin (or
+an MSID not in the map) is taken to be covered.
+"""
+from __future__ import print_function, division, absolute_import
+
+import numpy as np
+
+from jeta.archive.utils import read_pickle_cached, write_pickle_atomic
+
+# Width (sec) of the coverage bins
+COVERAGE_DT = 3600
+
+# Coverage is not known before this bin for an MSID with no ingest since the
+# map was started
+UNKNOWN = np.iinfo(np.int64).max
+
+
+def _merge_runs(starts, stops):
+    """Merge runs [start, stop) of bins into sorted, non-overlapping runs"""
+    order = np.argsort(starts, kind='stable')
+    starts = starts[order]
+    stops = stops[order]
+    max_stops = np.maximum.accumulate(stops)
+    new_run = np.ones(len(starts), dtype=bool)
+    new_run[1:] = starts[1:] > max_stops[:-1]
+    i_runs = np.flatnonzero(new_run)
+    i_ends = np.append(i_runs[1:], len(starts)) - 1
+    return starts[i_runs], max_stops[i_ends]
+
+
+def times_to_runs(times):
+    """
+    Get the runs of coverage bins with telemetry at ``times``.
+
+    :param times: unix times (sec)
+    :returns: tuple (starts, stops) of int64 arrays, each run is [start, stop)
+    """
+    bins = np.unique(np.floor_divide(times, COVERAGE_DT).astype(np.int64))
+    if len(bins) == 0:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    new_run = np.ones(len(bins), dtype=bool)
+    new_run[1:] = np.diff(bins) > 1
+    ends = np.append(np.flatnonzero(new_run)[1:], len(bins)) - 1
+    return bins[new_run], bins[ends] + 1
+
+
+class CoverageTable(object):
+    """
+    Coverage map of every MSID.
+
+    :param coverage: dict of (known_from, starts, stops) keyed by MSID name,
+                     where bins before ``known_from`` are taken as covered
+    """
+    def __init__(self, coverage=None):
+        self.coverage = {} if coverage is None else coverage
+
+    def __len__(self):
+        return len(self.coverage)
+
+    def __contains__(self, msid):
+        return msid.upper() in self.coverage
+
+    def start(self, msids):
+        """
+        Start the map for ``msids`` that are already in the archive, for which
+        coverage is only known from their next ingest.
+
+        :param msids: MSID names
+        """
+        empty = np.zeros(0, dtype=np.int64)
+        for msid in msids:
+            self.coverage.setdefault(msid.upper(), (UNKNOWN, empty, empty))
+
+    def update(self, samples):
+        """
+        Add the coverage of newly ingested telemetry.
+
+        :param samples: dict of times (unix sec) keyed by MSID name
+        """
+        for msid, times in samples.items():
+            starts, stops = times_to_runs(np.asarray(times, dtype=np.float64))
+            if len(starts) == 0:
+                continue
+            msid = msid.upper()
+            # An MSID not in the map is new to the archive so is fully known
+            known_from, old_starts, old_stops = self.coverage.get(
+                msid, (np.iinfo(np.int64).min, starts[:0], stops[:0]))
+            if known_from == UNKNOWN:
+                known_from = starts[0]
+            starts, stops = _merge_runs(np.concatenate([old_starts, starts]),
+                                        np.concatenate([old_stops, stops]))
+            self.coverage[msid] = (known_from, starts, stops)
+
+    def covers(self, msid, tstart, tstop):
+        """
+        Check if ``msid`` may have telemetry between ``tstart`` and ``tstop``.
+
+        :param msid: MSID name
+        :param tstart: start time (unix sec)
+        :param tstop: stop time (unix sec)
+        :returns: False only if it is known that there is no telemetry
+        """
+        return bool(self.covers_many(msid, [tstart], [tstop])[0])
+
+    def covers_many(self, msid, tstarts, tstops):
+        """
+        Check if ``msid`` may have telemetry in each of the intervals between
+        ``tstarts`` and ``tstops``, with one search of its runs for all the
+        intervals.
+
+        :param msid: MSID name
+        :param tstarts: start times (unix sec)
+        :param tstops: stop times (unix sec)
+        :returns: bool array, False only where it is known that there is no
+                  telemetry
+        """
+        bin0s = np.floor_divide(np.asarray(tstarts, dtype=np.float64), COVERAGE_DT)
+        bin1s = np.floor_divide(np.asarray(tstops, dtype=np.float64), COVERAGE_DT)
+        entry = self.coverage.get(msid.upper())
+        if entry is None:
+            return np.ones(len(bin0s), dtype=bool)
+        known_from, starts, stops = entry
+        # Last run starting at or before bin1 is the only one that can overlap
+        i = np.searchsorted(starts, bin1s, side='right')
+        last_stops = stops[np.maximum(i - 1, 0)] if len(stops) else np.zeros(len(i))
+        return (bin0s < known_from) | ((i > 0) & (last_stops > bin0s))
+
+
+def read_coverage(filename):
+    """
+    Read the coverage map.
+
+    :param filename: coverage file
+    :returns: CoverageTable or None if there is no map
+    """
+    coverage = read_pickle_cached(filename)
+    return None if coverage is None else CoverageTable(coverage)
+
+
+def write_coverage(filename, table):
+    """
+    Publish the coverage map, replacing the file atomically.
+
+    :param filename: coverage file
+    :param table: CoverageTable
+    """
+    write_pickle_atomic(filename, table.coverage)
@@ -0,0 +1,216 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Decimation of full-resolution telemetry for visualization.
+
+Telemetry is reduced to at most ``n`` points that preserve the visual extremes
+of the data.  The reduction is done in a single streaming pass: blocks of
+(times, vals) are fed to a ``MinMaxDecimator`` which keeps only the min and max
+sample of a fixed number of fine row buckets, so memory use is bounded by the
+number of output points and not by the size of the fetch.  The surviving
+candidates are then reduced to the final ``n`` points with either a min/max
+(M4-style) selection or Largest-Triangle-Three-Buckets (MinMaxLTTB).
+"""
+from __future__ import print_function, division, absolute_import
+
+import numpy as np
+
+# Number of fine pre-selection buckets per output point
+PRESELECT_FACTOR = 32
+
+METHODS = ('minmax', 'lttb')
+
+
+def check_numeric(dtype, msid=None):
+    """
+    Check that values of ``dtype`` can be decimated.  Boolean values count as
+    numeric.
+
+    :param dtype: dtype of the values
+    :param msid: MSID name for the error message
+    :raises ValueError: for non-numeric (e.g. state) values
+    """
+    dtype = np.dtype(dtype)
+    if not issubclass(dtype.type, (np.number, np.bool_)):
+        name = '' if msid is None else '{} '.format(msid)
+        raise ValueError('decimation needs a numeric MSID, not {}with {} values'
+                         .format(name, dtype))
+
+
+class MinMaxDecimator(object):
+    """
+    Streaming min/max pre-selection of telemetry over fixed row buckets.
+
+    The archive rows ``row0:row1`` are split into ``n_buckets`` equal buckets
+    and for each bucket the first occurrence of the min and the max value is
+    retained along with its time.  Blocks can be supplied in any size but must
+    be supplied in row order.
+
+    :param row0: first archive row that may be supplied
+    :param row1: end (exclusive) of archive rows that may be supplied
+    :param n_buckets: number of pre-selection buckets
+    """
+    def __init__(self, row0, row1, n_buckets):
+        self.row0 = int(row0)
+        self.n_rows = max(int(row1) - self.row0, 1)
+        self.n_buckets = int(n_buckets)
+        self.min_vals = np.full(self.n_buckets, np.nan)
+        self.min_times = np.full(self.n_buckets, np.nan)
+        self.max_vals = np.full(self.n_buckets, np.nan)
+        self.max_times = np.full(self.n_buckets, np.nan)
+
+    def update(self, row, times, vals):
+        """
+        Add a block of contiguous samples starting at archive row ``row``.
+
+        :param row: archive row of the first sample in the block
+        :param times: sample times
+        :param vals: sample values (numeric)
+        """
+        vals = np.asarray(vals)
+        check_numeric(vals.dtype)
+        n_vals = len(vals)
+        if n_vals == 0:
+            return
+
+        vals = vals.astype(np.float64, copy=False)
+        rows = np.arange(int(row) - self.row0, int(row) - self.row0 + n_vals, dtype=np.int64)
+        buckets = np.clip(rows * self.n_buckets // self.n_rows, 0, self.n_buckets - 1)
+
+        # Rows are ordered so each bucket is a contiguous segment of the block
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(buckets)) + 1])
+        counts = np.diff(np.concatenate([starts, [n_vals]]))
+        ids = buckets[starts]
+
+        for reduce_func, vals_attr, times_attr, better in (
+                (np.fmin, 'min_vals', 'min_times', np.less),
+                (np.fmax, 'max_vals', 'max_times', np.greater)):
+            seg_vals = reduce_func.reduceat(vals, starts)
+            seg_times = np.full(len(starts), np.nan)
+
+            # Time of the first sample in each segment equal to the extreme
+            hits = np.flatnonzero(vals == np.repeat(seg_vals, counts))
+            hit_segs = np.searchsorted(starts, hits, side='right') - 1
+            segs, i_first = np.unique(hit_segs, return_index=True)
+            seg_times[segs] = times[hits[i_first]]
+
+            # Merge with the state from previous blocks.  Ties keep the earlier sample.
+            old_vals = getattr(self, vals_attr)[ids]
+            replace = ~np.isnan(seg_vals) & (np.isnan(old_vals) | better(seg_vals, old_vals))
+            getattr(self, vals_attr)[ids[replace]] = seg_vals[replace]
+            getattr(self, times_attr)[ids[replace]] = seg_times[replace]
+
+    def candidates(self):
+        """
+        Return the pre-selected (times, vals) in time order.
+        """
+        ok = ~np.isnan(self.min_vals)
+        times = np.column_stack([self.min_times[ok], self.max_times[ok]])
+        vals = np.column_stack([self.min_vals[ok], self.max_vals[ok]])
+
+        # Order the two points in each bucket by time and drop the duplicate
+        # when the min and max are the same sample.
+        swap = times[:, 1] < times[:, 0]
+        times[swap] = times[swap, ::-1]
+        vals[swap] = vals[swap, ::-1]
+        keep = np.ones(times.shape, dtype=bool)
+        keep[:, 1] = times[:, 1] != times[:, 0]
+
+        return times[keep], vals[keep]
+
+    def result(self, n_out, method='minmax'):
+        """
+        Return at most ``n_out`` decimated (times, vals) in time order.
+
+        :param n_out: maximum number of output points
+        :param method: 'minmax' or 'lttb'
+        """
+        if method not in METHODS:
+            raise ValueError('decimation method must be one of {}'.format(METHODS))
+
+        times, vals = self.candidates()
+        if len(times) <= n_out:
+            return times, vals
+
+        if method == 'lttb':
+            idxs = lttb(times, vals, n_out)
+            return times[idxs], vals[idxs]
+
+        # Coarsen the filled pre-selection buckets into n_out // 2 groups of
+        # consecutive buckets and keep the min and max of each group.
+        ok = np.flatnonzero(~np.isnan(self.min_vals))
+        n_groups = max(n_out // 2, 1)
+        starts = np.unique(np.arange(n_groups) * len(ok) // n_groups)
+        out_times = []
+        out_vals = []
+        for ext_vals, ext_times, arg_func in ((self.min_vals[ok], self.min_times[ok], np.argmin),
+                                              (self.max_vals[ok], self.max_times[ok], np.argmax)):
+            i_ext = np.array([i0 + arg_func(ext_vals[i0:i1])
+                              for i0, i1 in zip(starts, np.append(starts[1:], len(ok)))])
+            out_times.append(ext_times[i_ext])
+            out_vals.append(ext_vals[i_ext])
+
+        times = np.concatenate(out_times)
+        vals = np.concatenate(out_vals)
+        times, i_uniq = np.unique(times, return_index=True)
+        return times, vals[i_uniq]
+
+
+def lttb(times, vals, n_out):
+    """
+    Largest-Triangle-Three-Buckets downsampling.
+
+    :param times: sample times (sorted)
+    :param vals: sample values
+    :param n_out: number of output points
+    :returns: indexes of the selected samples
+    """
+    n_vals = len(times)
+    if n_out >= n_vals:
+        return np.arange(n_vals)
+    if n_out < 3:
+        return np.array([0, n_vals - 1])[:max(n_out, 0)]
+
+    # Work with times relative to the first sample to keep precision for JD times
+    times = times - times[0]
+    every = (n_vals - 2) / (n_out - 2)
+    edges = (np.arange(n_out - 1) * every).astype(np.int64) + 1
+    edges[-1] = n_vals - 1
+
+    out = np.empty(n_out, dtype=np.int64)
+    out[0] = 0
+    out[-1] = n_vals - 1
+    i_a = 0
+    for i in range(n_out - 2):
+        i0, i1 = edges[i], edges[i + 1]
+        if i + 2 < len(edges):
+            i2 = edges[i + 2]
+        else:
+            i2 = n_vals
+        avg_time = times[i1:i2].mean()
+        avg_val = vals[i1:i2].mean()
+
+        areas = np.abs((times[i_a] - avg_time) * (vals[i0:i1] - vals[i_a])
+                       - (times[i_a] - times[i0:i1]) * (avg_val - vals[i_a]))
+        i_a = i0 + np.argmax(areas)
+        out[i + 1] = i_a
+
+    return out
+
+
+def decimate(times, vals, n_out, method='minmax'):
+    """
+    Decimate in-memory ``times`` and ``vals`` to at most ``n_out`` points.
+
+    :param times: sample times (sorted)
+    :param vals: sample values (numeric)
+    :param n_out: maximum number of output points
+    :param method: 'minmax' or 'lttb'
+    :returns: times, vals
+    """
+    check_numeric(np.asarray(vals).dtype)
+    if len(times) <= n_out:
+        return times, vals
+
+    decimator = MinMaxDecimator(0, len(times), n_out * PRESELECT_FACTOR)
+    decimator.update(0, times, vals)
+    return decimator.result(n_out, method)
@@ -17,11 +17,11 @@ import warnings
 import re
 import json
 import datetime
+import tempfile
+import threading
 from datetime import timedelta
 
 import numpy as np
-from astropy.io import ascii
-from astropy.time import Time
 import pyyaks.context
 import six
 from six.moves import cPickle as pickle
@@ -30,12 +30,18 @@ from six.moves import zip
 from jeta.archive import file_defs
 from jeta.archive.units import Units
 from jeta.archive import cache
+from jeta.archive import committed
+from jeta.archive import coverage
 from jeta.archive import remote_access
+from jeta.archive import decimate as decim
+from jeta.archive import pyramid
+from jeta.archive.align import GridSampler, AlignedMSIDs
+from jeta.archive import timeconv
+from jeta.archive.catalog import MsidCatalog
+from jeta.archive.paths import ArchivePaths
 from jeta.archive.utils import get_env_variable
 from jeta.version import __version__, __git_version__
 
-from Chandra.Time import DateTime
-
 # Module-level units, defaults to CXC units (e.g. Kelvins etc)
 UNITS = Units(system='cxc')
 
@@ -73,8 +79,8 @@ IGNORE_COLNAMES = (
 # while post-2000 data starts as late as 2000:001:11:58:59.  Dates between LO
 # and HI get taken from either 1999 or post-2000.  The times are 4 millisec before
 # a minor frame boundary to avoid collisions.
-DATE2000_LO = DateTime('2000:001:00:00:00.090').date
-DATE2000_HI = DateTime('2000:003:00:00:00.234').date
+DATE2000_LO = '2000:001:00:00:00.090'
+DATE2000_HI = '2000:003:00:00:00.234'
 
 # Launch date (earliest possible date for telemetry)
 # TODO: Rename or Replace with more accurate name
@@ -89,6 +95,26 @@ LATEST_TLM_DATE = f"{tomorrow.timetuple().tm_year}:{tomorrow.timetuple().tm_yday
 # (to prevent accidentally selecting a very large number of MSIDs)
 MAX_GLOB_MATCHES = 10
 
+# Time step (sec) of the bins of each stats interval, including the levels
+# of the stats pyramid
+STATS_DT = {'5min': 328, 'daily': 86400}
+STATS_DT.update(pyramid.LEVELS)
+
+# Default number of rows read per block when streaming through full-resolution
+# archive files.  This is rounded down to a multiple of the HDF5 chunk size.
+BLOCK_ROWS = 1048576
+
+# Number of rows between records of the sparse time index that is written to
+# the MSID index.h5 file alongside the epoch table.
+SPARSE_INDEX_ROWS = 4096
+
+# Epoch records used to reconstruct absolute times.  Records from the index.h5
+# epoch table have offset=0, while records derived from the sparse time index
+# start part way through an epoch with the accumulated delta time ``offset``.
+EPOCH_DTYPE = np.dtype([('epoch', np.float64),
+                        ('index', np.uint64),
+                        ('offset', np.float64)])
+
 # Special-case state codes that override those in the TDB
 STATE_CODES = {
                # SIMDIAG
@@ -110,6 +136,10 @@ STATE_CODES = {
                '3SEARAMF': [(0, 'F'), (1, 'T')],
                }
 
+# The HDF5 library (and PyTables) is not generally built to be thread safe, so
+# all access to archive HDF5 files is serialized with this lock.
+HDF5_LOCK = threading.RLock()
+
 # Cached version (by content type) of first and last available times in archive
 CONTENT_TIME_RANGES = {}
 
@@ -124,6 +154,7 @@ class _DataSource(object):
     """
     _data_sources = (DEFAULT_DATA_SOURCE,)
     _allowed = ('cxc', 'maude', 'test-drop-half', 'jwst')
+    _catalogs = {}
 
     def __init__(self, *data_sources):
         self._new_data_sources = data_sources
@@ -173,21 +204,36 @@ class _DataSource(object):
         Get the set of MSID names corresponding to ``source`` (e.g. 'cxc' or 'maude')
 
         :param source: str
-        :returns: set of MSIDs
+        :returns: frozenset of MSIDs
+        """
+        return cls.get_catalog(source).name_set
+
+    @classmethod
+    def get_catalog(cls, source):
+        """
+        Get the compiled catalog of MSID names corresponding to ``source``.  The
+        catalog is cached and rebuilt only if the names of the source change.
+
+        :param source: str
+        :returns: MsidCatalog
         """
         source = source.split()[0]
 
-        if source == 'cxc':
-            out = list(content.keys())
+        if source in ('cxc', 'jwst'):
+            names = _get_metadata('content')
         elif source == 'maude':
             import maude
-            out = list(maude.MSIDS.keys())
-        elif source == 'jwst':
-            out = list(content.keys())
+            names = maude.MSIDS
         else:
             raise ValueError('source must be "cxc" or "msid" or jwst')
 
-        return set(out)
+        # MSID names are only ever added so the number of names identifies the version
+        catalog = cls._catalogs.get(source)
+        if catalog is None or len(catalog) != len(names):
+            catalog = MsidCatalog(names.keys())
+            cls._catalogs[source] = catalog
+
+        return catalog
 
     @classmethod
     def options(cls):
@@ -292,8 +338,8 @@ def _get_start_stop_dates(times):
     if len(times) == 0:
         return {}
     else:
-        return {'start': DateTime(times[0]).date,
-                'stop': DateTime(times[-1]).date}
+        return {'start': timeconv.secs2date(timeconv.unix_to_cxcsec(times[0])),
+                'stop': timeconv.secs2date(timeconv.unix_to_cxcsec(times[-1]))}
 
 # Context dictionary to provide context for msid_files
 ft = pyyaks.context.ContextDict('ft')
@@ -302,23 +348,141 @@ ft = pyyaks.context.ContextDict('ft')
 msid_files = pyyaks.context.ContextDict('msid_files', basedir=ENG_ARCHIVE)
 msid_files.update(file_defs.msid_files)
 
-# Module-level values defining available content types and column (MSID) names.
-# Then convert from astropy Table to recarray for API stability.
-# Note that filetypes.as_array().view(np.recarray) does not quite work...
-filetypes = ascii.read(os.path.join(JETA_SCRIPTS, 'filetypes.dat'))
-filetypes_arr = filetypes.as_array()
-filetypes = np.recarray(len(filetypes_arr), dtype=filetypes_arr.dtype)
-filetypes[()] = filetypes_arr
+# Cached resolver of the same file paths as ``msid_files`` which does not use
+# the global ``ft`` context, e.g. msid_paths.abs('mnemonic_value', msid='aogyrct1')
+msid_paths = ArchivePaths(file_defs.msid_files, msid_files)
+
+
+class FetchContext(collections.namedtuple('FetchContext', ['msid', 'content', 'basedir'])):
+    """
+    Immutable context of a single fetch request which resolves the archive file
+    paths for the request.  This is passed through the read path instead of
+    setting the global ``ft`` and ``msid_files`` context, so concurrent fetches
+    from different threads do not interfere.
+
+    :param msid: MSID name (upper case)
+    :param content: content type
+    :param basedir: archive base directory (or ':'-separated directories)
+    """
+    __slots__ = ()
 
-content = collections.OrderedDict()
+    def abs(self, filetype, interval=None):
+        """
+        Get the absolute path of archive file ``filetype`` for this request.
 
-# Get the list of filenames (an array is built to pass all the filenames at
-# once to the remote machine since passing them one at a time is rather slow)
-all_msid_names_files = dict()
-for filetype in filetypes:
-    ft['content'] = filetype['content'].lower()
-    all_msid_names_files[str(ft['content'])] = \
-        _split_path(msid_files['colnames'].abs)
+        :param filetype: file type (e.g. 'mnemonic_value' or 'stats')
+        :param interval: stats interval ('5min' or 'daily')
+        :returns: str
+        """
+        return msid_paths.abs(filetype, self.content, self.msid, interval, basedir=self.basedir)
+
+    def committed_rows(self):
+        """
+        Get the number of rows of this MSID committed by ingest, or None if
+        the archive has no committed rows table.  See ``jeta.archive.committed``.
+
+        :returns: int or None
+        """
+        return committed.get_committed_rows(self.abs('committed'), self.msid)
+
+    def covers(self, tstart, tstop):
+        """
+        Check the coverage map of ingest for whether this MSID may have
+        telemetry between ``tstart`` and ``tstop`` (CXC seconds).  See
+        ``jeta.archive.coverage``.
+
+        :returns: False only if it is known that there is no telemetry
+        """
+        table = coverage.read_coverage(self.abs('coverage'))
+        if table is None:
+            return True
+        return table.covers(self.msid, timeconv.cxcsec_to_unix(tstart),
+                            timeconv.cxcsec_to_unix(tstop))
+
+    def covers_many(self, tstarts, tstops):
+        """
+        Check the coverage map of ingest for whether this MSID may have
+        telemetry in each of the intervals between ``tstarts`` and ``tstops``
+        (CXC seconds).  The map is read once for all the intervals.
+
+        :returns: bool array, False only where it is known that there is no
+                  telemetry
+        """
+        table = coverage.read_coverage(self.abs('coverage'))
+        if table is None:
+            return np.ones(len(tstarts), dtype=bool)
+        return table.covers_many(self.msid, timeconv.cxcsec_to_unix(np.asarray(tstarts)),
+                                 timeconv.cxcsec_to_unix(np.asarray(tstops)))
+
+
+def _get_basedir(datestart, basedir):
+    """
+    Get the archive base directory for data starting at ``datestart``, which
+    is the 1999 archive if datestart is before 2000:001:00:00:00.
+    """
+    if datestart < DATE2000_LO:
+        # Note: don't use os.path.join because ENG_ARCHIVE and basedir must
+        # use linux '/' convention but this might be running on Windows.
+        basedir = ':'.join(dir_ + '/1999' for dir_ in basedir.split(':'))
+    return basedir
+
+
+def _fetch_context(msid, datestart=None, content='tlm'):
+    """
+    Get the context of a fetch of ``msid`` starting at ``datestart``.
+
+    :param msid: MSID name
+    :param datestart: start date of the fetch (YYYY:DOY:HH:MM:SS.sss)
+    :param content: content type
+    :returns: FetchContext
+    """
+    basedir = msid_files.basedir
+    if datestart is not None:
+        basedir = _get_basedir(datestart, basedir)
+    return FetchContext(msid.upper(), content, basedir)
+
+# Binary cache of the parsed archive metadata (content types, MSID names and
+# bad times).  It is used in place of the source files (filetypes.dat, the
+# colnames pickles and msid_bad_times.dat) until any of them change.
+METADATA_CACHE = os.path.join(ENG_ARCHIVE, 'fetch_metadata.pkl')
+METADATA_CACHE_VERSION = 1
+
+# Module attributes with the archive metadata.  These are loaded on first
+# access (see ``__getattr__``) instead of at import.
+LAZY_METADATA = ('filetypes', 'all_msid_names_files', 'all_colnames', 'content',
+                 'msid_bad_times')
+
+_metadata_lock = threading.RLock()
+
+
+def __getattr__(name):
+    """
+    Load the archive metadata module attributes on first access.
+    """
+    if name in LAZY_METADATA:
+        return _get_metadata(name)
+    raise AttributeError('module {!r} has no attribute {!r}'.format(__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(LAZY_METADATA))
+
+
+def _get_metadata(name):
+    """
+    Get archive metadata module attribute ``name``, loading the metadata if
+    needed.  Attributes that have been set by the user are not replaced.
+
+    :param name: one of ``LAZY_METADATA``
+    :returns: attribute value
+    """
+    module_vars = globals()
+    if name not in module_vars:
+        with _metadata_lock:
+            if name not in module_vars:
+                for key, val in _load_metadata().items():
+                    module_vars.setdefault(key, val)
+    return module_vars[name]
 
 
 # Function to load MSID names from the files (executed remotely, if necessary)
@@ -332,13 +496,131 @@ def load_msid_names(all_msid_names_files):
         except IOError:
             pass
     return all_colnames
-# Load the MSID names
-all_colnames = load_msid_names(all_msid_names_files)
 
-# Save the names
-for k, colnames in six.iteritems(all_colnames):
-    content.update((x, k) for x in sorted(colnames)
-                   if x not in IGNORE_COLNAMES)
+
+def _read_filetypes(filename):
+    """
+    Read the table of available content types from ``filename``, converted
+    from astropy Table to recarray for API stability.
+    """
+    from astropy.io import ascii
+
+    # Note that filetypes.as_array().view(np.recarray) does not quite work...
+    filetypes_arr = ascii.read(filename).as_array()
+    filetypes = np.recarray(len(filetypes_arr), dtype=filetypes_arr.dtype)
+    filetypes[()] = filetypes_arr
+    return filetypes
+
+
+def _parse_bad_times(table):
+    """
+    Parse a table of MSID bad times (see ``read_bad_times``).
+
+    :returns: list of (MSID, start, stop) tuples
+    """
+    from astropy.io import ascii
+
+    bad_times = ascii.read(table, format='no_header',
+                           names=['msid', 'start', 'stop'])
+    return [(msid.upper(), start, stop) for msid, start, stop in bad_times]
+
+
+def _source_stamps(filenames):
+    """
+    Get the modification time and size of each file in ``filenames``, or None
+    if the file does not exist.
+
+    :returns: dict of (mtime_ns, size) keyed by file name
+    """
+    stamps = {}
+    for filename in filenames:
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            stamps[filename] = None
+        else:
+            stamps[filename] = (stat.st_mtime_ns, stat.st_size)
+    return stamps
+
+
+def _write_metadata_cache(cached):
+    """
+    Atomically write ``cached`` to ``METADATA_CACHE``.  Failure to write (e.g.
+    for a read-only archive) is not an error.
+    """
+    tmp_filename = None
+    try:
+        fd, tmp_filename = tempfile.mkstemp(dir=os.path.dirname(METADATA_CACHE),
+                                            prefix='.fetch_metadata.')
+        with os.fdopen(fd, 'wb') as fh:
+            pickle.dump(cached, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        os.chmod(tmp_filename, 0o644)
+        os.replace(tmp_filename, METADATA_CACHE)
+    except Exception as err:
+        logger.info('Unable to write metadata cache %s: %s', METADATA_CACHE, err)
+        if tmp_filename is not None and os.path.exists(tmp_filename):
+            os.unlink(tmp_filename)
+
+
+def _load_metadata():
+    """
+    Load the archive metadata, from ``METADATA_CACHE`` if it is current and
+    otherwise from the source files, in which case the cache is rebuilt.
+
+    :returns: dict of ``LAZY_METADATA`` values keyed by name
+    """
+    filetypes_file = os.path.join(JETA_SCRIPTS, 'filetypes.dat')
+    bad_times_file = os.path.join(JETA_SCRIPTS, 'msid_bad_times.dat')
+
+    # Paths are remote when accessing a remote archive, so there is no cache
+    use_cache = not remote_access.access_remotely
+    key = (METADATA_CACHE_VERSION, msid_files.basedir, JETA_SCRIPTS, IGNORE_COLNAMES)
+
+    if use_cache:
+        try:
+            with open(METADATA_CACHE, 'rb') as fh:
+                cached = pickle.load(fh)
+            if (cached['key'] == key
+                    and cached['sources'] == _source_stamps(cached['sources'])):
+                return cached['metadata']
+        except Exception:
+            pass
+
+    # Stamp the source files before reading them so that a change during the
+    # read makes the new cache stale rather than wrong.
+    sources = _source_stamps([filetypes_file, bad_times_file])
+    filetypes = _read_filetypes(filetypes_file)
+
+    # Get the list of filenames (an array is built to pass all the filenames at
+    # once to the remote machine since passing them one at a time is rather slow)
+    all_msid_names_files = dict()
+    for filetype in filetypes:
+        content_type = str(filetype['content'].lower())
+        all_msid_names_files[content_type] = _split_path(msid_paths.abs('colnames', content_type))
+    sources.update(_source_stamps(os.path.join(*msid_names_file)
+                                  for msid_names_file in all_msid_names_files.values()))
+
+    all_colnames = load_msid_names(all_msid_names_files)
+
+    content = collections.OrderedDict()
+    for k, colnames in six.iteritems(all_colnames):
+        content.update((x, k) for x in sorted(colnames)
+                       if x not in IGNORE_COLNAMES)
+
+    msid_bad_times = dict()
+    for msid, start, stop in _parse_bad_times(bad_times_file):
+        msid_bad_times.setdefault(msid, []).append((start, stop))
+
+    metadata = {'filetypes': filetypes,
+                'all_msid_names_files': all_msid_names_files,
+                'all_colnames': all_colnames,
+                'content': content,
+                'msid_bad_times': msid_bad_times}
+
+    if use_cache:
+        _write_metadata_cache({'key': key, 'sources': sources, 'metadata': metadata})
+
+    return metadata
 
 # Cache of the most-recently used TIME array and associated bad values mask.
 # The key is (content_type, tstart, tstop).
@@ -401,15 +683,9 @@ def read_bad_times(table):
     ``DateTime`` format.  Blank lines and any line starting with the #
     character are ignored.
     """
-    bad_times = ascii.read(table, format='no_header',
-                           names=['msid', 'start', 'stop'])
-
-    for msid, start, stop in bad_times:
-        msid_bad_times.setdefault(msid.upper(), []).append((start, stop))
-
-# Set up bad times dict
-msid_bad_times = dict()
-read_bad_times(os.path.join(JETA_SCRIPTS, 'msid_bad_times.dat'))
+    msid_bad_times = _get_metadata('msid_bad_times')
+    for msid, start, stop in _parse_bad_times(table):
+        msid_bad_times.setdefault(msid, []).append((start, stop))
 
 
 def msid_glob(msid):
@@ -440,6 +716,42 @@ def msid_glob(msid):
     return list(msids), list(MSIDS)
 
 
+def msid_glob_bulk(msids, regex=False):
+    """Get the archive MSIDs matching any of many ``msids`` patterns.
+
+    This is a bulk version of ``msid_glob`` for resolving large numbers of
+    MSID globs (or regular expressions) at once.  There is no limit on the
+    number of matches.  The output contains each matching MSID once, in the
+    order of the first pattern that matched it.
+
+    :param msids: list of MSID globs, or regular expressions if ``regex``
+    :param regex: patterns are (case-insensitive) regular expressions
+    :returns: tuple (msids, MSIDs)
+    """
+    msids = list(msids)
+    # Regexes are matched case-insensitively, since upper-casing a regex
+    # changes its meaning (e.g. ``\d`` to ``\D``)
+    patterns = msids if regex else [msid.upper() for msid in msids]
+    MSIDS = collections.OrderedDict()
+    missing = set(patterns)
+
+    sources = data_source.sources(include_test=False)
+    for source in sources:
+        resolved = data_source.get_catalog(source).resolve(patterns, regex=regex)
+        for pattern in patterns:
+            matches = resolved[pattern]
+            if matches:
+                missing.discard(pattern)
+                MSIDS.update((match, None) for match in matches)
+
+    if missing:
+        missing = [msid for msid, pattern in zip(msids, patterns) if pattern in missing]
+        raise ValueError('MSID(s) {} not in {} data source(s)'
+                         .format(missing, ' or '.join(x.upper() for x in sources)))
+
+    return [x.lower() for x in MSIDS], list(MSIDS)
+
+
 def _msid_glob(msid, source):
 
 
@@ -454,13 +766,13 @@ def _msid_glob(msid, source):
     :returns: tuple (msids, MSIDs)
     """
 
-    source_msids = data_source.get_msids(source)
+    catalog = data_source.get_catalog(source)
 
     MSID = msid.upper()
     # First try MSID or DP_<MSID>.  If success then return the upper
     # case version and whatever the user supplied (could be any case).
     for match in (MSID, 'DP_' + MSID):
-        if match in source_msids:
+        if match in catalog:
             return [msid], [match]
 
     # Next try as a file glob.  If there is a match then return a
@@ -468,7 +780,7 @@ def _msid_glob(msid, source):
     # input was a glob the returned msids are just lower case versions
     # of the matched upper case MSIDs.
     for match in (MSID, 'DP_' + MSID):
-        matches = fnmatch.filter(source_msids, match)
+        matches = catalog.glob(match)
         if matches:
             if len(matches) > MAX_GLOB_MATCHES:
                 raise ValueError(
@@ -497,7 +809,7 @@ def _get_table_intervals_as_list(table, check_overlaps=True):
 
     if isinstance(table, (list, tuple)):
         try:
-            intervals = [(DateTime(row[0]).secs, DateTime(row[1]).secs)
+            intervals = [(timeconv.to_secs(row[0]), timeconv.to_secs(row[1]))
                          for row in table]
         except:
             pass
@@ -506,7 +818,7 @@ def _get_table_intervals_as_list(table, check_overlaps=True):
             start = prefix + 'start'
             stop = prefix + 'stop'
             try:
-                intervals = [(DateTime(row[start]).secs, DateTime(row[stop]).secs)
+                intervals = [(timeconv.to_secs(row[start]), timeconv.to_secs(row[stop]))
                              for row in table]
             except:
                 pass
@@ -525,6 +837,456 @@ def _get_table_intervals_as_list(table, check_overlaps=True):
     return intervals
 
 
+def _get_jwst_row_range(index_filepath, times_filepath, start_jd, stop_jd,
+                        committed_rows=None):
+    """
+    Get the row range in the ``values.h5`` and ``times.h5`` files of an MSID
+    that is guaranteed to contain the interval ``start_jd`` to ``stop_jd``.
+
+    The range from the epoch index is narrowed using the sparse time index if
+    available, so only the epoch index, a few sparse index records (and the
+    length of the times file if the interval runs to the end of the archive)
+    are read.
+
+    If ``committed_rows`` is given then rows and epoch records from that row
+    on, which an ingest may still be writing, are not used.
+
+    :param index_filepath: path to the MSID index.h5 file
+    :param times_filepath: path to the MSID times.h5 file
+    :param start_jd: start of interval (JD)
+    :param stop_jd: stop of interval (JD)
+    :param committed_rows: number of committed rows (default=all rows)
+    :returns: tuple (index, row0, row1) of the epoch records (EPOCH_DTYPE)
+              spanning the rows and the row slice
+    """
+    import tables
+
+    # Assume the index.h5 file is a table with 'epoch' and 'index' columns
+    with HDF5_LOCK:
+        h5 = tables.open_file(index_filepath, 'r')
+        try:
+            index = h5.root.epoch[:]  # read the whole thing into a numpy structured array
+            if committed_rows is not None:
+                index = index[index['index'] < committed_rows]
+                if len(index) == 0:
+                    return np.zeros(0, dtype=EPOCH_DTYPE), 0, 0
+
+            # Chop down to the required time interval, roughly.  The side='right'
+            # arg to np.searchsorted is a subtletry related to a query where
+            # start or stop is *exactly* the same as the index boundary, e.g. if
+            # you use quad-zero and user asks for a time with quad-zero, then
+            # I *THINK* this gives the right answer.  Well, 70/30 confidence there,
+            # you need to check.  Probably easiest with code tests at the end.
+
+            # Interval that starts *before* start_jd, making sure to not go below 0
+            idx0 = max(np.searchsorted(index['epoch'], start_jd, side='right') - 1, 0)
+
+            # Interval that starts *after* stop_jd
+            idx1 = np.searchsorted(index['epoch'], stop_jd, side='right')
+
+            if len(index) == idx1:
+                # The interval runs past the last epoch so close the last epoch with
+                # the end of the archive.
+                last_idx = np.array([(0, _get_end_row(times_filepath, committed_rows))],
+                                    dtype=index.dtype)
+                index = np.append(index[idx0:], last_idx)
+            else:
+                index = index[idx0:idx1 + 1]  # The +1 is so that the idx1 record is included
+
+            epochs = np.zeros(len(index), dtype=EPOCH_DTYPE)
+            epochs['epoch'] = index['epoch']
+            epochs['index'] = index['index']
+
+            # Start and stop rows which are guaranteed to contain start, stop
+            row0, row1 = int(epochs['index'][0]), int(epochs['index'][-1])
+            anchors = _get_sparse_anchors(h5, row0, row1)
+        finally:
+            h5.close()
+
+    if anchors is not None and len(anchors) > 0:
+        epochs, row0, row1 = _narrow_row_range(epochs, anchors, start_jd, stop_jd)
+
+    return epochs, row0, row1
+
+
+def _get_sparse_anchors(h5, row0, row1):
+    """
+    Read the sparse time index records of an open index.h5 file for rows
+    strictly between ``row0`` and ``row1``.
+
+    Records are normally written every ``rows_per_anchor`` rows from the first
+    record, so the required records are located arithmetically.  If that does
+    not hold (e.g. an ingest was skipped) then the row column is searched.
+
+    :param h5: open index.h5 file
+    :param row0: first row
+    :param row1: end row
+    :returns: structured array with 'index', 'time' and 'offset' columns or
+              None if there is no sparse time index
+    """
+    if '/sparse' not in h5:
+        return None
+
+    table = h5.root.sparse
+    if table.nrows == 0:
+        return None
+
+    n_rows = table.attrs.rows_per_anchor
+    first_row = int(table[0]['index'])
+    i0 = min(max((row0 - first_row) // n_rows + 1, 0), table.nrows)
+    i1 = min(max(-((first_row - row1) // n_rows), i0), table.nrows)
+    anchors = table[i0:i1]
+    if np.any(anchors['index'] != first_row + n_rows * np.arange(i0, i1)):
+        rows = table.col('index')
+        i0, i1 = np.searchsorted(rows, [row0, row1], side='right')
+        anchors = table[i0:i1]
+
+    ok = (anchors['index'] > row0) & (anchors['index'] < row1)
+    return anchors[ok]
+
+
+def _narrow_row_range(epochs, anchors, start_jd, stop_jd):
+    """
+    Narrow the row range covered by ``epochs`` to the sparse time index
+    ``anchors`` that bracket ``start_jd`` and ``stop_jd``.
+
+    :param epochs: epoch records (EPOCH_DTYPE) spanning the rows
+    :param anchors: sparse time index records within the rows
+    :param start_jd: start of interval (JD)
+    :param stop_jd: stop of interval (JD)
+    :returns: tuple (epochs, row0, row1)
+    """
+    rows = epochs['index'].astype(np.int64)
+    row0, row1 = int(rows[0]), int(rows[-1])
+
+    # All rows before the last anchor with a time before start_jd are also
+    # before start_jd, and all rows from the first anchor at or after stop_jd
+    # are after stop_jd.
+    i0 = np.searchsorted(anchors['time'], start_jd, side='left') - 1
+    i1 = np.searchsorted(anchors['time'], stop_jd, side='left')
+    if i0 >= 0:
+        row0 = int(anchors['index'][i0])
+    if i1 < len(anchors):
+        row1 = int(anchors['index'][i1])
+
+    i_rec0 = np.searchsorted(rows, row0, side='right') - 1
+    i_rec1 = np.searchsorted(rows, row1, side='left')
+    epochs = np.concatenate([epochs[i_rec0:i_rec1], epochs[-1:]])
+    epochs['index'][-1] = row1
+    if i0 >= 0 and epochs['index'][0] != row0:
+        epochs['index'][0] = row0
+        epochs['offset'][0] = anchors['offset'][i0]
+
+    return epochs, row0, row1
+
+
+def _get_end_row(times_filepath, committed_rows=None):
+    """
+    Get the end row used to close the last epoch of an MSID, from the committed
+    rows if known and otherwise from the length of the times file.
+    """
+    import tables
+
+    if committed_rows is None:
+        times_h5 = tables.open_file(times_filepath, 'r')
+        committed_rows = times_h5.root.time.nrows
+        times_h5.close()
+
+    return committed_rows - 1
+
+
+def _get_jwst_interval_rows(index_filepath, times_filepath, start_jds, stop_jds,
+                            committed_rows=None):
+    """
+    Vectorized version of ``_get_jwst_row_range`` for many intervals.  The
+    index.h5 file is opened once and all intervals are resolved in one pass.
+
+    :param index_filepath: path to the MSID index.h5 file
+    :param times_filepath: path to the MSID times.h5 file
+    :param start_jds: interval starts (JD)
+    :param stop_jds: interval stops (JD)
+    :param committed_rows: number of committed rows (default=all rows)
+    :returns: tuple (index, row0s, row1s) of the epoch records (EPOCH_DTYPE)
+              needed to reconstruct times for any of the row ranges and the
+              row slice of each interval
+    """
+    import tables
+
+    with HDF5_LOCK:
+        h5 = tables.open_file(index_filepath, 'r')
+        try:
+            index = h5.root.epoch[:]
+            if committed_rows is not None:
+                index = index[index['index'] < committed_rows]
+                if len(index) == 0:
+                    no_rows = np.zeros(len(start_jds), dtype=np.int64)
+                    return np.zeros(0, dtype=EPOCH_DTYPE), no_rows, no_rows
+            rows = index['index'].astype(np.int64)
+
+            idx0 = np.maximum(np.searchsorted(index['epoch'], start_jds, side='right') - 1, 0)
+            idx1 = np.searchsorted(index['epoch'], stop_jds, side='right')
+
+            # Close the last epoch with the end of the archive as for a single interval
+            if np.any(idx1 == len(index)):
+                end_row = _get_end_row(times_filepath, committed_rows)
+            else:
+                end_row = rows[-1]
+            row0s = rows[idx0]
+            row1s = np.append(rows, end_row)[idx1]
+
+            anchors = _get_sparse_anchors(h5, row0s.min(), row1s.max()) if len(rows) else None
+        finally:
+            h5.close()
+
+    epochs = np.zeros(len(index) + 1, dtype=EPOCH_DTYPE)
+    epochs['epoch'][:-1] = index['epoch']
+    epochs['index'] = np.append(rows, end_row)
+
+    if anchors is not None and len(anchors) > 0:
+        # Narrow each interval to the bracketing sparse index records, as in
+        # _narrow_row_range but only using records within each row range.
+        anchor_rows = anchors['index'].astype(np.int64)
+        i0 = np.searchsorted(anchors['time'], start_jds, side='left') - 1
+        i1 = np.searchsorted(anchors['time'], stop_jds, side='left')
+        ok0 = i0 >= 0
+        ok0[ok0] = anchor_rows[i0[ok0]] > row0s[ok0]
+        ok1 = i1 < len(anchors)
+        ok1[ok1] = anchor_rows[i1[ok1]] < row1s[ok1]
+        row0s = np.where(ok0, anchor_rows[np.maximum(i0, 0)], row0s)
+        row1s = np.where(ok1, anchor_rows[np.minimum(i1, len(anchors) - 1)], row1s)
+
+        # Add epoch records for the sparse index records that start a row range
+        used = np.unique(i0[ok0])
+        used = used[~np.isin(anchor_rows[used], rows)]
+        starts = np.zeros(len(used), dtype=EPOCH_DTYPE)
+        starts['index'] = anchor_rows[used]
+        starts['offset'] = anchors['offset'][used]
+        starts['epoch'] = index['epoch'][np.searchsorted(rows, anchor_rows[used], side='right') - 1]
+        epochs = np.concatenate([epochs[:-1], starts, epochs[-1:]])
+        epochs[:-1].sort(order='index', kind='stable')
+
+    return epochs, row0s, row1s
+
+
+def _read_jwst_intervals(times_filepath, values_filepath, index, row0s, row1s,
+                         start_jds, stop_jds):
+    """
+    Read the times and values of many intervals with a single open of each
+    file.  Row ranges of the intervals that overlap or are within one HDF5 chunk
+    of each other are coalesced and read as one slice, and then only the rows
+    within each interval are gathered.
+
+    :param times_filepath: path to the MSID times.h5 file
+    :param values_filepath: path to the MSID values.h5 file
+    :param index: epoch index records from ``_get_jwst_interval_rows``
+    :param row0s: start row of each interval
+    :param row1s: end row (exclusive) of each interval
+    :param start_jds: interval starts (JD)
+    :param stop_jds: interval stops (JD)
+    :returns: tuple (jds, vals) for all intervals in order
+    """
+    out_jds = []
+    out_vals = []
+    for sel in _read_jwst_interval_list(times_filepath, values_filepath, index,
+                                        row0s, row1s, start_jds, stop_jds):
+        if sel is not None:
+            out_jds.append(sel[0])
+            out_vals.append(sel[1])
+    if not out_jds:
+        return np.array([], dtype=np.float64), np.array([], dtype=np.float64)
+
+    return np.concatenate(out_jds), np.concatenate(out_vals)
+
+
+def _read_jwst_interval_list(times_filepath, values_filepath, index, row0s, row1s,
+                             start_jds, stop_jds):
+    """
+    Read the times and values of each of many intervals.  This does the work
+    of ``_read_jwst_intervals`` (same parameters) but keeps the intervals
+    separate.
+
+    :returns: list with a tuple (jds, vals) for each interval, or None for an
+              interval without rows
+    """
+    import tables
+
+    if len(row0s) == 0:
+        return []
+
+    with HDF5_LOCK:
+        times_h5 = tables.open_file(times_filepath, 'r')
+        values_h5 = tables.open_file(values_filepath, 'r')
+        try:
+            gap_rows = times_h5.root.time.chunkshape[0]
+
+            # Coalesce row ranges into groups, relying on the intervals being in
+            # time order.
+            order = np.argsort(row0s, kind='stable')
+            ends = np.maximum.accumulate(row1s[order])
+            new_group = np.ones(len(order), dtype=bool)
+            new_group[1:] = row0s[order][1:] > ends[:-1] + gap_rows
+            group_starts = np.flatnonzero(new_group)
+            group_stops = np.append(group_starts[1:], len(order))
+
+            selected = [None] * len(row0s)
+            for g0, g1 in zip(group_starts, group_stops):
+                members = order[g0:g1]
+                row0 = int(row0s[members].min())
+                row1 = int(ends[g1 - 1])
+                if row1 <= row0:
+                    continue
+
+                jds, _ = _reconstruct_jds(times_h5.root.time[row0:row1], row0, index)
+                vals = values_h5.root.data[row0:row1]
+
+                # Final time filtering for exact user intervals within their rows
+                lo = row0s[members] - row0
+                hi = np.maximum(row1s[members] - row0, lo)
+                idx0 = np.clip(np.searchsorted(jds, start_jds[members]), lo, hi)
+                idx1 = np.clip(np.searchsorted(jds, stop_jds[members]), idx0, hi)
+                for member, i0, i1 in zip(members, idx0, idx1):
+                    selected[member] = (jds[i0:i1], vals[i0:i1])
+        finally:
+            times_h5.close()
+            values_h5.close()
+
+    return selected
+
+
+def _reconstruct_jds(dts, row0, index, carry=None):
+    """
+    Convert delta times ``dts`` for archive rows starting at ``row0`` into
+    absolute times (JD) in place.
+
+    Each epoch record in ``index`` restarts the accumulation at its epoch (plus
+    the record ``offset`` if present).  If
+    ``row0`` is not the start of an epoch then ``carry`` must be the
+    ``(epoch, offset)`` state returned for the block ending just before
+    ``row0``, which allows reconstruction to be carried across consecutive
+    blocks of rows without loss of precision.
+
+    :param dts: delta times (modified in place)
+    :param row0: archive row of dts[0]
+    :param index: epoch index records covering the rows
+    :param carry: (epoch, offset) accumulation state at row ``row0 - 1``
+    :returns: tuple (jds, carry) where jds is the dts array holding the
+              absolute times
+    """
+    row0 = int(row0)
+    row1 = row0 + len(dts)
+    rows = index['index'].astype(np.int64)
+
+    i_seg0 = max(np.searchsorted(rows, row0, side='right') - 1, 0)
+    i_seg1 = np.searchsorted(rows, row1, side='left')
+    bounds = np.concatenate([[row0], rows[i_seg0 + 1:i_seg1], [row1]]) - row0
+
+    # Apply the delta times.  This is the meat of the computation and is really
+    # just a few lines.  An accumulated offset is added to the first delta time
+    # before the cumulative sum so that the result is identical to summing
+    # from the start of the epoch.
+    for i_seg, r0, r1 in zip(range(i_seg0, i_seg1), bounds[:-1], bounds[1:]):
+        if r1 <= r0:
+            continue
+        if r0 == 0 and rows[i_seg] != row0:
+            if carry is None:
+                raise ValueError('carry is required when row0 is not an epoch row')
+            epoch, offset = carry
+        else:
+            epoch = index['epoch'][i_seg]
+            offset = index['offset'][i_seg] if 'offset' in index.dtype.names else 0.0
+        if offset != 0:
+            dts[r0] += offset
+        np.cumsum(dts[r0:r1], out=dts[r0:r1])
+        carry = (epoch, dts[r1 - 1])
+        dts[r0:r1] += epoch
+
+    return dts, carry
+
+
+def _read_jwst_times(times_filepath, index, row0, row1):
+    """
+    Read the delta times for rows ``row0:row1`` and reconstruct absolute times
+    (JD) using the epoch ``index`` records covering those rows.
+    """
+    import tables
+
+    with HDF5_LOCK:
+        h5 = tables.open_file(times_filepath, 'r')
+        dts = h5.root.time[row0:row1]
+        h5.close()
+
+    jds, _ = _reconstruct_jds(dts, row0, index)
+    return jds
+
+
+def _jwst_values_dtype(values_filepath):
+    """Get the dtype of the values of an MSID from its values.h5 file"""
+    import tables
+
+    with HDF5_LOCK:
+        with tables.open_file(values_filepath, 'r') as h5:
+            return h5.root.data.dtype
+
+
+def _iter_jwst_blocks(times_filepath, values_filepath, index, row0, row1, block_rows=None):
+    """
+    Iterate over rows ``row0:row1`` of an MSID in blocks aligned with the HDF5
+    chunk boundaries of the times file.  Time reconstruction is carried across
+    blocks so only one block is held in memory at a time.
+
+    :param times_filepath: path to the MSID times.h5 file
+    :param values_filepath: path to the MSID values.h5 file
+    :param index: epoch index records covering the rows
+    :param row0: first row
+    :param row1: end row (exclusive)
+    :param block_rows: rows per block (default=BLOCK_ROWS rounded to chunk size)
+    :returns: generator of (row, jds, vals) where ``row`` is the archive row of
+              the first sample in the block
+    """
+    import tables
+
+    # The lock is only held while reading each block, not across the yield
+    with HDF5_LOCK:
+        times_h5 = tables.open_file(times_filepath, 'r')
+        values_h5 = tables.open_file(values_filepath, 'r')
+        chunk_rows = times_h5.root.time.chunkshape[0]
+    try:
+        if block_rows is None:
+            block_rows = BLOCK_ROWS
+        block_rows = max(block_rows // chunk_rows, 1) * chunk_rows
+
+        row0 = int(row0)
+        row1 = int(row1)
+        edges = np.arange((row0 // block_rows + 1) * block_rows, row1, block_rows)
+        edges = np.concatenate([[row0], edges, [row1]])
+
+        carry = None
+        for r0, r1 in zip(edges[:-1], edges[1:]):
+            if r1 <= r0:
+                continue
+            with HDF5_LOCK:
+                dts = times_h5.root.time[r0:r1]
+                vals = values_h5.root.data[r0:r1]
+            jds, carry = _reconstruct_jds(dts, r0, index, carry)
+            yield r0, jds, vals
+    finally:
+        with HDF5_LOCK:
+            times_h5.close()
+            values_h5.close()
+
+
+def _read_jwst_values(values_filepath, row0, row1):
+    """Read rows ``row0:row1`` from the values.h5 file of an MSID"""
+    import tables
+
+    with HDF5_LOCK:
+        h5 = tables.open_file(values_filepath, 'r')
+        vals = h5.root.data[row0:row1]
+        h5.close()
+
+    return vals
+
+
 class MSID(object):
     """Fetch data from the engineering telemetry archive into an MSID object.
 
@@ -537,24 +1299,40 @@ class MSID(object):
     :param start: start date of telemetry. (YYYY:DOY)
     :param stop: stop date of telemetry default: current time. (YYYY:DOY)
     :param filter_bad: automatically filter out bad values
-    :param stat: return 5-minute or daily statistics ('5min' or 'daily')
+    :param stat: return 5-minute or daily statistics ('5min' or 'daily') or a
+                 stats pyramid level ('1min', '1h', '1d' or '27d')
+    :param lazy: resolve the archive rows now but defer reading ``times``,
+                 ``vals`` and ``bads`` until they are first accessed
+    :param decimate: return at most this many full-resolution samples, selected
+                     in a single streaming pass to preserve the visual extremes
+    :param method: decimation method, 'minmax' (default) or 'lttb'
 
     :returns: MSID instance
     """
     units = UNITS
     fetch = sys.modules[__name__]
 
-    def __init__(self, msid, start=LAUNCH_DATE, stop=LATEST_TLM_DATE, filter_bad=False, stat=None):
+    def __init__(self, msid, start=LAUNCH_DATE, stop=LATEST_TLM_DATE, filter_bad=False, stat=None,
+                 lazy=False, decimate=None, method='minmax'):
+
+        if decimate is not None:
+            if stat:
+                raise ValueError('decimate is not supported for stat={!r}'.format(stat))
+            if method not in decim.METHODS:
+                raise ValueError('decimation method must be one of {}'.format(decim.METHODS))
 
         self.msid = msid.lower()
         self.MSID = msid.upper()
+        self.lazy = lazy
+        self.decimate = decimate
+        self.method = method
 
         # Capture the current module units
         self.units = Units(self.units['system'])
         self.unit = self.units.get_msid_unit(self.MSID)
         self.stat = stat
         if stat:
-            self.dt = {'5min': 328, 'daily': 86400}[stat]
+            self.dt = STATS_DT[stat]
 
         # If ``start`` is actually a table of intervals then fetch
         # each interval separately and concatenate the results
@@ -562,13 +1340,13 @@ class MSID(object):
         if intervals is not None:
             start, stop = intervals[0][0], intervals[-1][1]
 
-        self.tstart = DateTime(start).secs
-        self.tstop = (DateTime(stop).secs if stop else
-                      DateTime(time.time(), format='unix').secs)
-        self.datestart = DateTime(self.tstart).date
-        self.datestop = DateTime(self.tstop).date
+        self.tstart = timeconv.to_secs(start)
+        self.tstop = (timeconv.to_secs(stop) if stop else
+                      timeconv.unix_to_cxcsec(time.time()))
+        self.datestart = timeconv.secs2date(self.tstart)
+        self.datestop = timeconv.secs2date(self.tstop)
         self.data_source = {}
-        self.content = content.get(self.MSID)
+        self.content = _get_metadata('content').get(self.MSID)
 
         if self.datestart < DATE2000_LO and self.datestop > DATE2000_HI:
             intervals = [(self.datestart, DATE2000_HI),
@@ -606,11 +1384,17 @@ class MSID(object):
 
     def _get_data_over_intervals(self, intervals):
         """
-        Fetch intervals separately and concatenate the results.
+        Fetch intervals and concatenate the results.  Interval fetches are
+        always read eagerly.
         """
+        if not self.stat and data_source.sources() == ('jwst',):
+            self._get_jwst_data_over_intervals(intervals)
+            return
+
         msids = []
         for start, stop in intervals:
-            msids.append(self.fetch.MSID(self.msid, start, stop, filter_bad=False, stat=self.stat))
+            msids.append(self.fetch.MSID(self.msid, start, stop, filter_bad=False, stat=self.stat,
+                                         decimate=self.decimate, method=self.method))
 
         # No bad values column for stat='5min' or 'daily', but still need this attribute.
         if self.stat:
@@ -626,60 +1410,66 @@ class MSID(object):
         logger.info('Getting data for %s between %s to %s',
                     self.msid, self.datestart, self.datestop)
 
-        # Avoid stomping on caller's filetype 'ft' values with _cache_ft()
-        with _cache_ft():
-            ft['content'] = self.content
-            ft['msid'] = self.MSID
-
-            with _set_msid_files_basedir(self.datestart):
-                if self.stat:
-                    if 'maude' in data_source.sources():
-                        raise ValueError('MAUDE data source does not support telemetry statistics')
-                    ft['interval'] = self.stat
-                    self._get_stat_data()
+        # Explicit context of this request, so no global state is changed
+        context = _fetch_context(self.MSID, self.datestart)
+
+        if self.stat:
+            if 'maude' in data_source.sources():
+                raise ValueError('MAUDE data source does not support telemetry statistics')
+            self._get_stat_data(context)
+        else:
+            self.colnames = ['vals', 'times', 'bads']
+            args = (self.content, self.tstart, self.tstop, self.MSID, self.units['system'])
+
+            if ('jwst' in data_source.sources()):  # and self.MSID in data_source.get_msids('jwst')):
+
+                if not context.covers(self.tstart, self.tstop):
+                    # No telemetry in the interval so skip opening the archive files
+                    self.vals = np.array([], dtype=np.float64)
+                    self.times = np.array([], dtype=np.float64)
+                    self.bads = None
+                elif self.decimate is not None:
+                    self._get_decimated_jwst_data(context)
+                elif self.lazy:
+                    self._init_lazy_jwst_data(context)
                 else:
-                    self.colnames = ['vals', 'times', 'bads']
-                    args = (self.content, self.tstart, self.tstop, self.MSID, self.units['system'])
-
-                    if ('jwst' in data_source.sources()):  # and self.MSID in data_source.get_msids('jwst')):
-
-                        get_msid_data = self._get_msid_data_from_jwst
-                        # get_msid_data = (self._get_msid_data_from_cxc_cached if CACHE
-                        #                  else self._get_msid_data_from_cxc)
-                        self.vals, self.times, self.bads = get_msid_data(*args)
-                        # self.data_source['cxc'] = _get_start_stop_dates(self.times)
-
-                    # if ('cxc' in data_source.sources() and
-                    #         self.MSID in data_source.get_msids('cxc')):
-                    #     # CACHE is normally True only when doing ingest processing.  Note
-                    #     # also that to support caching the get_msid_data_from_cxc_cached
-                    #     # method must be static.
-                    #     get_msid_data = (self._get_msid_data_from_cxc_cached if CACHE
-                    #                      else self._get_msid_data_from_cxc)
-                    #     self.vals, self.times, self.bads = get_msid_data(*args)
-                    #     self.data_source['cxc'] = _get_start_stop_dates(self.times)
-
-                    if 'test-drop-half' in data_source.sources() and hasattr(self, 'vals'):
-                        # For testing purposes drop half the data off the end.  This assumes another
-                        # data_source like 'cxc' has been selected.
-                        idx = len(self.vals) // 2
-                        self.vals = self.vals[:idx]
-                        self.times = self.times[:idx]
-                        self.bads = self.bads[:idx]
-                        # Following assumes only one prior data source but ok for controlled testing
-                        for source in self.data_source:
-                            self.data_source[source] = _get_start_stop_dates(self.times)
-
-                    if ('maude' in data_source.sources() and
-                            self.MSID in data_source.get_msids('maude')):
-                        # Update self.vals, times, bads in place.  This might concatenate MAUDE
-                        # telemetry to existing CXC values.
-                        self._get_msid_data_from_maude(*args)
-
-    def _get_stat_data(self):
+                    get_msid_data = self._get_msid_data_from_jwst
+                    # get_msid_data = (self._get_msid_data_from_cxc_cached if CACHE
+                    #                  else self._get_msid_data_from_cxc)
+                    self.vals, self.times, self.bads = get_msid_data(*args, context=context)
+                    # self.data_source['cxc'] = _get_start_stop_dates(self.times)
+
+            # if ('cxc' in data_source.sources() and
+            #         self.MSID in data_source.get_msids('cxc')):
+            #     # CACHE is normally True only when doing ingest processing.  Note
+            #     # also that to support caching the get_msid_data_from_cxc_cached
+            #     # method must be static.
+            #     get_msid_data = (self._get_msid_data_from_cxc_cached if CACHE
+            #                      else self._get_msid_data_from_cxc)
+            #     self.vals, self.times, self.bads = get_msid_data(*args)
+            #     self.data_source['cxc'] = _get_start_stop_dates(self.times)
+
+            if 'test-drop-half' in data_source.sources() and hasattr(self, 'vals'):
+                # For testing purposes drop half the data off the end.  This assumes another
+                # data_source like 'cxc' has been selected.
+                idx = len(self.vals) // 2
+                self.vals = self.vals[:idx]
+                self.times = self.times[:idx]
+                self.bads = self.bads[:idx]
+                # Following assumes only one prior data source but ok for controlled testing
+                for source in self.data_source:
+                    self.data_source[source] = _get_start_stop_dates(self.times)
+
+            if ('maude' in data_source.sources() and
+                    self.MSID in data_source.get_msids('maude')):
+                # Update self.vals, times, bads in place.  This might concatenate MAUDE
+                # telemetry to existing CXC values.
+                self._get_msid_data_from_maude(*args)
+
+    def _get_stat_data(self, context):
         """Do the actual work of getting stats values for an MSID from HDF5
         files"""
-        filename = msid_files['stats'].abs
+        filename = context.abs('stats', interval=self.stat)
         logger.info('Opening %s', filename)
 
         @local_or_remote_function("Getting stat data for " + self.MSID +
@@ -699,15 +1489,24 @@ class MSID(object):
             import tables
             open_file = getattr(tables, 'open_file', None) or tables.openFile
             print(os.path.join(*filename))
-            h5 = open_file(os.path.join(*filename))
-            table = h5.root.data
-            times = (table.col('index') + 0.5) * dt
+            # Range of bin indexes with times within tstart to tstop, with a bin
+            # of margin for the time conversion.  The rows of the range are
+            # found from a few rows of the index column (pyramid.search_index),
+            # so only these rows are read and their times converted.
+            index0 = int(np.floor(timeconv.cxcsec_to_unix(tstart) / dt)) - 1
+            index1 = int(np.ceil(timeconv.cxcsec_to_unix(tstop) / dt)) + 1
+            with HDF5_LOCK:
+                h5 = open_file(os.path.join(*filename))
+                table = h5.root.data
+                row0 = pyramid.search_index(table, index0)
+                row1 = pyramid.search_index(table, index1)
+                table_rows = table[row0:row1]  # returns np.ndarray (structured array)
+                h5.close()
+            times = (table_rows['index'] + 0.5) * dt
             # These times are stored as unix times.
-            times = Time(times, format="unix").cxcsec
-            row0, row1 = np.searchsorted(times, [tstart, tstop])
-            table_rows = table[row0:row1]  # returns np.ndarray (structured array)
-            h5.close()
-            return (times[row0:row1], table_rows, row0, row1)
+            timeconv.unix_to_cxcsec(times, out=times)
+            i0, i1 = np.searchsorted(times, [tstart, tstop])
+            return (times[i0:i1], table_rows[i0:i1], row0 + i0, row0 + i1)
         times, table_rows, row0, row1 = \
             get_stat_data_from_server(_split_path(filename),
                                       self.dt, self.tstart, self.tstop)
@@ -734,10 +1533,20 @@ class MSID(object):
             setattr(self, colname_out, vals)
             self.colnames.append(colname_out)
 
+        if self.stat in pyramid.LEVELS:
+            # Stats pyramid levels have moments, from which the time-weighted
+            # mean and std are computed.  The moment columns are in the
+            # original units.
+            stats = pyramid.moment_stats(table_rows)
+            self.means = self.units.convert(self.MSID, stats['mean'])
+            self.stds = self.units.convert(self.MSID, stats['std'], delta_val=True)
+            self.vals = self.means
+            self.colnames.extend(['means', 'stds', 'vals'])
+
         # Redefine the 'vals' attribute to be 'means' if it exists.  This is a
         # more consistent use of the 'vals' attribute and there is little use
         # for the original sampled version.
-        if hasattr(self, 'means'):
+        elif hasattr(self, 'means'):
             # Create new attribute midvals and add as a column (fixes kadi#17)
             self.colnames.append('midvals')
             self.midvals = self.vals
@@ -761,92 +1570,173 @@ class MSID(object):
         return MSID._get_msid_data_from_cxc(content, tstart, tstop, msid, unit_system)
 
     @staticmethod
-    def _get_jwst_data(start, stop, msid):
-
-        import tables
-        ft['content'] = 'tlm'
-
+    def _get_jwst_data(start, stop, msid, context=None):
         """Do the actual work of getting time and values for an MSID from HDF5
         files"""
+        if context is None:
+            context = _fetch_context(msid)
 
-        start_jd = Time(start, format='cxcsec', scale="utc").jd
-        stop_jd = Time(stop, format='cxcsec', scale="utc").jd
-
-        values_filepath = msid_files['mnemonic_value'].abs
-        times_filepath = msid_files['mnemonic_times'].abs
-        index_filepath = msid_files['mnemonic_index'].abs
-
-        # Assume the index.h5 file is a table with 'row' and 'jd' columns
-        h5 = tables.open_file(index_filepath, 'r')
-        index = h5.root.epoch[:]  # read the whole thing into a numpy structured array
-        h5.close()
-
-        # Chop down to the required time interval, roughly.  The side='right'
-        # arg to np.searchsorted is a subtletry related to a query where
-        # start or stop is *exactly* the same as the index boundary, e.g. if
-        # you use quad-zero and user asks for a time with quad-zero, then
-        # I *THINK* this gives the right answer.  Well, 70/30 confidence there,
-        # you need to check.  Probably easiest with code tests at the end.
+        start_jd = timeconv.cxcsec_to_jd(start)
+        stop_jd = timeconv.cxcsec_to_jd(stop)
 
-        # Interval that starts *before* start_jd, making sure to not go below 0
-        idx0 = max(np.searchsorted(index['epoch'], start_jd, side='right') - 1, 0)
+        values_filepath = context.abs('mnemonic_value')
+        times_filepath = context.abs('mnemonic_times')
+        index_filepath = context.abs('mnemonic_index')
 
-        # Interval that starts *after* stop_jd
-        idx1 = np.searchsorted(index['epoch'], stop_jd, side='right')
+        index, row0, row1 = _get_jwst_row_range(index_filepath, times_filepath,
+                                                start_jd, stop_jd, context.committed_rows())
+        jds = _read_jwst_times(times_filepath, index, row0, row1)
+        vals = _read_jwst_values(values_filepath, row0, row1)
 
-        if len(index) == idx1:
+        # Final time filtering for exact user interval
+        idx0, idx1 = np.searchsorted(jds, [start_jd, stop_jd])
 
-            h5 = tables.open_file(values_filepath, 'r')
-            dt = np.dtype([ ('epoch','<f8'), ('index', '<u8')])
-            last_idx = np.array([(0, len(h5.root.data[0:-1]) )], dtype=dt)
-            index = np.append(index, last_idx)
-            h5.close()
+        return jds[idx0:idx1], vals[idx0:idx1]
 
-        else:
+    def _init_lazy_jwst_data(self, context):
+        """
+        Resolve the row range for this MSID from the index file but defer
+        reading ``times``, ``vals`` and ``bads`` until they are first accessed.
+        """
+        start_jd = timeconv.cxcsec_to_jd(self.tstart)
+        stop_jd = timeconv.cxcsec_to_jd(self.tstop)
+
+        times_filepath = context.abs('mnemonic_times')
+        index, row0, row1 = _get_jwst_row_range(context.abs('mnemonic_index'),
+                                                times_filepath, start_jd, stop_jd,
+                                                context.committed_rows())
+
+        self._lazy = {'values_filepath': context.abs('mnemonic_value'),
+                      'times_filepath': times_filepath,
+                      'index': index,
+                      'row0': row0,
+                      'row1': row1,
+                      'start_jd': start_jd,
+                      'stop_jd': stop_jd}
+
+    def _get_jwst_data_over_intervals(self, intervals):
+        """
+        Fetch full-resolution data for all ``intervals`` in a single pass.  The
+        intervals are resolved against the index together and the rows are read
+        from coalesced row ranges with one open of each file.
+        """
+        logger.info('Getting data for %s over %d intervals', self.msid, len(intervals))
 
-            index = index[idx0:idx1 + 1]  # The +1 is so that the idx1 record is included
+        tstarts = np.array([timeconv.to_secs(start) for start, stop in intervals])
+        tstops = np.array([timeconv.to_secs(stop) for start, stop in intervals])
 
-        # Start and stop rows which are guaranteed to contain start, stop
-        row0 = index['index'][0]
-        row1 = index['index'][-1]
+        # Drop the intervals without telemetry in the coverage map
+        context = _fetch_context(self.MSID, self.datestart)
+        ok = context.covers_many(tstarts, tstops)
+        self.colnames = ['vals', 'times', 'bads']
+        self.bads = None
+        if not np.any(ok):
+            self.times = np.array([], dtype=np.float64)
+            self.vals = np.array([], dtype=np.float64)
+            return
+        start_jds = timeconv.cxcsec_to_jd(tstarts[ok])
+        stop_jds = timeconv.cxcsec_to_jd(tstops[ok])
 
-        h5 = tables.open_file(values_filepath, 'r')
+        values_filepath = context.abs('mnemonic_value')
+        times_filepath = context.abs('mnemonic_times')
+        index_filepath = context.abs('mnemonic_index')
 
-        vals = h5.root.data[row0:row1]
-        h5.close()
+        index, row0s, row1s = _get_jwst_interval_rows(index_filepath, times_filepath,
+                                                      start_jds, stop_jds,
+                                                      context.committed_rows())
+        jds, vals = _read_jwst_intervals(times_filepath, values_filepath, index,
+                                         row0s, row1s, start_jds, stop_jds)
 
-        h5 = tables.open_file(times_filepath, 'r')
-        dts = h5.root.time[row0:row1]
-        h5.close()
+        if self.decimate is not None:
+            jds, vals = decim.decimate(jds, vals, self.decimate, self.method)
 
-        # Make the final time array now
-        jds = np.zeros_like(dts)
+        try:
+            vals = np.float64(vals)
+        except Exception:
+            pass
 
-        # Apply the delta times.  This is the meat of the computation and is really
-        # just a few lines.
-        for index0, index1 in zip(index[:-1], index[1:]):
-            r0 = index0['index'] - row0
-            r1 = index1['index'] - row0
+        self.times = timeconv.jd_to_unix(jds, out=jds)
+        self.vals = vals
 
-            jds[r0:r1] = index0['epoch'] + np.cumsum(dts[r0:r1])
+    def _get_decimated_jwst_data(self, context):
+        """
+        Stream the full-resolution archive rows for this MSID block by block and
+        keep at most ``self.decimate`` samples.  Memory use is bounded by the
+        block size and number of output samples, not by the fetch interval.
+        """
+        start_jd = timeconv.cxcsec_to_jd(self.tstart)
+        stop_jd = timeconv.cxcsec_to_jd(self.tstop)
+
+        times_filepath = context.abs('mnemonic_times')
+        values_filepath = context.abs('mnemonic_value')
+        index, row0, row1 = _get_jwst_row_range(context.abs('mnemonic_index'),
+                                                times_filepath, start_jd, stop_jd,
+                                                context.committed_rows())
+
+        decim.check_numeric(_jwst_values_dtype(values_filepath), self.MSID)
+        decimator = decim.MinMaxDecimator(row0, row1, self.decimate * decim.PRESELECT_FACTOR)
+        for row, jds, vals in _iter_jwst_blocks(times_filepath, values_filepath,
+                                                index, row0, row1):
+            # Final time filtering for exact user interval
+            idx0, idx1 = np.searchsorted(jds, [start_jd, stop_jd])
+            decimator.update(row + idx0, jds[idx0:idx1], vals[idx0:idx1])
+        jds, vals = decimator.result(self.decimate, self.method)
+
+        self.times = timeconv.jd_to_unix(jds, out=jds)
+        self.vals = vals
+        self.bads = None
 
-        # Final time filtering for exact user interval
-        idx0, idx1 = np.searchsorted(jds, [start_jd, stop_jd])
+    def _load_lazy_data(self, attr):
+        """Read the deferred ``attr`` ('times', 'vals' or 'bads') of a lazy MSID"""
+        lazy = self._lazy
 
-        return jds[idx0:idx1], vals[idx0:idx1]
+        if attr == 'bads':
+            # Currently no concept of bads in the JWST archive
+            self.bads = None
+        else:
+            # Reading the times gives the exact rows within the resolved row
+            # range, so values are only read for the rows that are returned.
+            if 'idx0' not in lazy:
+                jds = _read_jwst_times(lazy['times_filepath'], lazy['index'],
+                                       lazy['row0'], lazy['row1'])
+                idx0, idx1 = np.searchsorted(jds, [lazy['start_jd'], lazy['stop_jd']])
+                lazy['idx0'], lazy['idx1'] = idx0, idx1
+                self.times = timeconv.jd_to_unix(jds[idx0:idx1], out=jds[idx0:idx1])
+
+            if attr == 'vals':
+                row0 = lazy['row0'] + lazy['idx0']
+                row1 = lazy['row0'] + lazy['idx1']
+                vals = _read_jwst_values(lazy['values_filepath'], row0, row1)
+                try:
+                    vals = np.float64(vals)
+                except Exception:
+                    pass
+                self.vals = vals
+
+        if all(name in self.__dict__ for name in ('times', 'vals', 'bads')):
+            del self._lazy
+
+    def __getattr__(self, attr):
+        # Only called when normal attribute lookup fails, which for a lazy MSID
+        # means that ``attr`` has not been read from the archive yet.
+        if attr in ('times', 'vals', 'bads') and '_lazy' in self.__dict__:
+            self._load_lazy_data(attr)
+            return self.__dict__[attr]
+        raise AttributeError("'{}' object has no attribute '{}'"
+                             .format(self.__class__.__name__, attr))
 
     @staticmethod
-    def _get_msid_data_from_jwst(content, tstart, tstop, msid, unit_system):
+    def _get_msid_data_from_jwst(content, tstart, tstop, msid, unit_system, context=None):
 
         """
             Interface for JWST to the original Ska.engarchive system. Accepts the same
             parameters and then passes them to the JWST data fetching function.
         """
 
-        times, vals = MSID._get_jwst_data(tstart, tstop, msid)
+        times, vals = MSID._get_jwst_data(tstart, tstop, msid, context)
 
         # Covert to a time the original code expected
-        times = Time(times, format="jd").unix
+        times = timeconv.jd_to_unix(times, out=times)
 
         # TODO: Remome from here; add type check and conversion into the ingest process.
         try:
@@ -1080,8 +1970,8 @@ class MSID(object):
         else:
 
             dt = 328.0 if dt is None else dt
-            tstart = DateTime(start).secs if start else self.times[0]
-            tstop = DateTime(stop).secs if stop else self.times[-1]
+            tstart = timeconv.cxcsec_to_unix(timeconv.to_secs(start)) if start else self.times[0]
+            tstop = timeconv.cxcsec_to_unix(timeconv.to_secs(stop)) if stop else self.times[-1]
 
             # Legacy method for backward compatibility.  Note that the np.arange()
             # call accrues floating point error.
@@ -1170,11 +2060,12 @@ class MSID(object):
         :param copy: return a copy of MSID object with bad times filtered
         """
         if table is not None:
+            from astropy.io import ascii
             bad_times = ascii.read(table, format='no_header',
                                    names=['start', 'stop'])
         elif start is None and stop is None:
             bad_times = []
-            for msid_glob, times in msid_bad_times.items():
+            for msid_glob, times in _get_metadata('msid_bad_times').items():
                 if fnmatch.fnmatch(self.MSID, msid_glob):
                     bad_times.extend(times)
         elif start is None or stop is None:
@@ -1290,7 +2181,7 @@ class MSID(object):
         if 'EventQuery' in (cls.__name__ for cls in intervals.__class__.__mro__):
             intervals = intervals.intervals(self.datestart, self.datestop)
 
-        intervals = [(DateTime(start).secs, DateTime(stop).secs)
+        intervals = [(timeconv.to_secs(start), timeconv.to_secs(stop))
                      for start, stop in intervals]
 
         for tstart, tstop in intervals:
@@ -1492,18 +2383,28 @@ class MSID(object):
         from .plot import MsidPlot
         self._iplot = MsidPlot(self, fmt, fmt_minmax, **plot_kwargs)
 
-    def get_telemetry_as_json(self):
+    def get_telemetry_as_json(self, decimate=None, method='minmax'):
+        """
+        Return the telemetry as a JSON string.
 
+        :param decimate: if set then return at most this many samples selected
+                         to preserve the visual extremes of the data
+        :param method: decimation method, 'minmax' (default) or 'lttb'
+        """
         minValue = min(self.vals)
         maxValue = max(self.vals)
 
+        times, vals = self.times, self.vals
+        if decimate is not None:
+            times, vals = decim.decimate(times, vals, decimate, method)
+
         telemetry = {
             'mnenmonic': {
                 'level': 1,
                 'minValue': minValue,
                 'maxValue': maxValue,
-                'datetimes': self.times,
-                'values': self.vals,
+                'datetimes': times,
+                'values': vals,
             }
         }
 
@@ -1513,10 +2414,7 @@ class MSID(object):
 
         import tables
 
-        ft['msid'] = msid
-        ft['interval'] = interval
-
-        filename = msid_files['stats'].abs
+        filename = msid_paths.abs('stats', msid=msid, interval=interval)
 
         h5 = tables.open_file(filename)
         table = h5.root.data
@@ -1565,23 +2463,28 @@ class MSIDset(collections.OrderedDict):
     :param start: start date of telemetry (Chandra.Time compatible)
     :param stop: stop date of telemetry (current time if not supplied)
     :param filter_bad: automatically filter out bad values
-    :param stat: return 5-minute or daily statistics ('5min' or 'daily')
+    :param stat: return 5-minute or daily statistics ('5min' or 'daily') or a
+                 stats pyramid level ('1min', '1h', '1d' or '27d')
+    :param lazy: defer reading MSID values until they are first accessed
+    :param decimate: return at most this many full-resolution samples per MSID
+    :param method: decimation method, 'minmax' (default) or 'lttb'
 
     :returns: Dict-like object containing MSID instances keyed by MSID name
     """
     MSID = MSID
 
-    def __init__(self, msids, start=LAUNCH_DATE, stop=None, filter_bad=False, stat=None):
+    def __init__(self, msids, start=LAUNCH_DATE, stop=None, filter_bad=False, stat=None,
+                 lazy=False, decimate=None, method='minmax'):
         super(MSIDset, self).__init__()
 
         intervals = _get_table_intervals_as_list(start, check_overlaps=True)
         if intervals is not None:
             start, stop = intervals[0][0], intervals[-1][1]
 
-        self.tstart = DateTime(start).secs
-        self.tstop = (DateTime(stop).secs if stop else DateTime().secs)
-        self.datestart = DateTime(self.tstart).date
-        self.datestop = DateTime(self.tstop).date
+        self.tstart = timeconv.to_secs(start)
+        self.tstop = (timeconv.to_secs(stop) if stop else timeconv.unix_to_cxcsec(time.time()))
+        self.datestart = timeconv.secs2date(self.tstart)
+        self.datestop = timeconv.secs2date(self.tstop)
 
         # Input ``msids`` may contain globs, so expand each and add to new list
         new_msids = []
@@ -1590,9 +2493,11 @@ class MSIDset(collections.OrderedDict):
         for msid in new_msids:
             if intervals is None:
                 self[msid] = self.MSID(msid, self.tstart, self.tstop,
-                                       filter_bad=False, stat=stat)
+                                       filter_bad=False, stat=stat, lazy=lazy,
+                                       decimate=decimate, method=method)
             else:
-                self[msid] = self.MSID(msid, intervals, filter_bad=False, stat=stat)
+                self[msid] = self.MSID(msid, intervals, filter_bad=False, stat=stat,
+                                       decimate=decimate, method=method)
 
         if filter_bad:
             self.filter_bad()
@@ -1766,8 +2671,8 @@ class MSIDset(collections.OrderedDict):
             # Get the nominal tstart / tstop range
             dt = 328.0 if dt is None else dt
 
-            tstart = DateTime(start).secs if start else Time(obj.tstart, format="cxcsec").unix
-            tstop = DateTime(stop).secs if stop else Time(obj.tstop, format="cxcsec").unix
+            tstart = timeconv.cxcsec_to_unix(timeconv.to_secs(start) if start else obj.tstart)
+            tstop = timeconv.cxcsec_to_unix(timeconv.to_secs(stop) if stop else obj.tstop)
 
             tstart = max(tstart, max_fetch_tstart)
             tstop = min(tstop, min_fetch_tstop)
@@ -1841,16 +2746,22 @@ class Msid(MSID):
     :param start: start date of telemetry (Chandra.Time compatible)
     :param stop: stop date of telemetry (current time if not supplied)
     :param filter_bad: automatically filter out bad values
-    :param stat: return 5-minute or daily statistics ('5min' or 'daily')
+    :param stat: return 5-minute or daily statistics ('5min' or 'daily') or a
+                 stats pyramid level ('1min', '1h', '1d' or '27d')
     :param unit_system: Unit system (cxc|eng|sci, default=current units)
+    :param lazy: defer reading values until they are first accessed
+    :param decimate: return at most this many full-resolution samples
+    :param method: decimation method, 'minmax' (default) or 'lttb'
 
     :returns: MSID instance
     """
     units = UNITS
 
-    def __init__(self, msid, start=LAUNCH_DATE, stop=None, filter_bad=True, stat=None):
+    def __init__(self, msid, start=LAUNCH_DATE, stop=None, filter_bad=True, stat=None,
+                 lazy=False, decimate=None, method='minmax'):
         super(Msid, self).__init__(msid, start=start, stop=stop,
-                                   filter_bad=filter_bad, stat=stat)
+                                   filter_bad=filter_bad, stat=stat, lazy=lazy,
+                                   decimate=decimate, method=method)
 
 
 class Msidset(MSIDset):
@@ -1861,16 +2772,22 @@ class Msidset(MSIDset):
     :param start: start date of telemetry (Chandra.Time compatible)
     :param stop: stop date of telemetry (current time if not supplied)
     :param filter_bad: automatically filter out bad values
-    :param stat: return 5-minute or daily statistics ('5min' or 'daily')
+    :param stat: return 5-minute or daily statistics ('5min' or 'daily') or a
+                 stats pyramid level ('1min', '1h', '1d' or '27d')
     :param unit_system: Unit system (cxc|eng|sci, default=current units)
+    :param lazy: defer reading MSID values until they are first accessed
+    :param decimate: return at most this many full-resolution samples per MSID
+    :param method: decimation method, 'minmax' (default) or 'lttb'
 
     :returns: Dict-like object containing MSID instances keyed by MSID name
     """
     MSID = MSID
 
-    def __init__(self, msids, start=LAUNCH_DATE, stop=None, filter_bad=True, stat=None):
+    def __init__(self, msids, start=LAUNCH_DATE, stop=None, filter_bad=True, stat=None,
+                 lazy=False, decimate=None, method='minmax'):
         super(Msidset, self).__init__(msids, start=start, stop=stop,
-                                      filter_bad=filter_bad, stat=stat)
+                                      filter_bad=filter_bad, stat=stat, lazy=lazy,
+                                      decimate=decimate, method=method)
 
 
 class HrcSsMsid(Msid):
@@ -1882,7 +2799,8 @@ class HrcSsMsid(Msid):
     :param start: start date of telemetry (Chandra.Time compatible)
     :param stop: stop date of telemetry (current time if not supplied)
     :param filter_bad: automatically filter out bad values
-    :param stat: return 5-minute or daily statistics ('5min' or 'daily')
+    :param stat: return 5-minute or daily statistics ('5min' or 'daily') or a
+                 stats pyramid level ('1min', '1h', '1d' or '27d')
     :param unit_system: Unit system (cxc|eng|sci, default=current units)
 
     :returns: MSID instance
@@ -1955,28 +2873,34 @@ def get_time_range(msid, format=None):
     """
 
     MSID = msid.upper()
-    with _cache_ft():
-
-        content[msid] = ""
-        ft['content'] = 'tlm'
-        ft['msid'] = msid
+    _get_metadata('content')[msid] = ""
 
-        times_filepath = msid_files['mnemonic_times'].abs
-        index_filepath = msid_files['mnemonic_index'].abs
+    context = _fetch_context(MSID)
+    times_filepath = context.abs('mnemonic_times')
+    index_filepath = context.abs('mnemonic_index')
+    committed_rows = context.committed_rows()
 
-        logger.info('Reading %s', times_filepath)
+    logger.info('Reading %s', times_filepath)
 
-        import tables
-        print(f"Index File Path: {index_filepath}")
+    import tables
+    print(f"Index File Path: {index_filepath}")
+    with HDF5_LOCK:
         times_h5 = tables.open_file(times_filepath)
         index_h5 = tables.open_file(index_filepath)
 
-        sp_idx = int(index_h5.root.epoch[-1][1]) - 1
+        # Only use the rows and epochs committed by ingest
+        epochs = index_h5.root.epoch[:]
+        end_row = times_h5.root.time.nrows
+        if committed_rows is not None:
+            epochs = epochs[epochs['index'] < committed_rows]
+            end_row = min(committed_rows, end_row)
+
+        sp_idx = int(epochs[-1][1]) - 1
 
-        tstart = index_h5.root.epoch[0][0] + np.cumsum(times_h5.root.time[0])[0]
+        tstart = epochs[0][0] + np.cumsum(times_h5.root.time[0])[0]
 
         try:
-            tstop =  index_h5.root.epoch[-1][0] + np.cumsum(times_h5.root.time[sp_idx:-1])[-1]
+            tstop = epochs[-1][0] + np.cumsum(times_h5.root.time[sp_idx:end_row - 1])[-1]
         except Exception as err:
             tstop = tstart
             #raise
@@ -1984,17 +2908,326 @@ def get_time_range(msid, format=None):
         index_h5.close()
         times_h5.close()
 
-        if format == 'iso':
-            tstart = Time(tstart, format='jd').iso
-            if tstop is not None:
-                tstop = Time(tstop, format='jd').iso
+    if format == 'iso':
+        from astropy.time import Time
+        tstart = Time(tstart, format='jd').iso
+        if tstop is not None:
+            tstop = Time(tstop, format='jd').iso
+
+    if format == 'date':
+        tstart = timeconv.secs2date(timeconv.jd_to_cxcsec(tstart))
+        if tstop is not None:
+            tstop = timeconv.secs2date(timeconv.jd_to_cxcsec(tstop))
+
+    return tstart, tstop
+
+
+def iter_msid(msid, start=LAUNCH_DATE, stop=None, chunk_rows=None):
+    """
+    Iterate over full-resolution telemetry for ``msid`` in successive blocks.
+
+    Blocks are read directly at the HDF5 chunk boundaries of the archive files
+    and time reconstruction is carried from one block to the next, so only one
+    block is held in memory at a time.  This allows processing of arbitrarily
+    long intervals in bounded memory, for example::
+
+      n = 0
+      total = 0.0
+      for times, vals in fetch.iter_msid('aogyrct1', '2010:001', '2020:001'):
+          n += len(vals)
+          total += vals.sum()
+
+    :param msid: MSID name (case-insensitive, must match exactly one MSID)
+    :param start: start date of telemetry (Chandra.Time compatible)
+    :param stop: stop date of telemetry (current time if not supplied)
+    :param chunk_rows: approximate number of rows per block, rounded to a
+                       multiple of the HDF5 chunk size (default=BLOCK_ROWS)
+    :returns: generator of (times, vals) where times are unix seconds
+    """
+    MSIDs = msid_glob(msid)[1]
+    if len(MSIDs) > 1:
+        raise ValueError('MSID {!r} matches more than one MSID: {}'.format(msid, MSIDs))
+    MSID = MSIDs[0]
+
+    tstart = timeconv.to_secs(start)
+    tstop = timeconv.to_secs(stop) if stop else timeconv.unix_to_cxcsec(time.time())
+    start_jd = timeconv.cxcsec_to_jd(tstart)
+    stop_jd = timeconv.cxcsec_to_jd(tstop)
+
+    context = _fetch_context(MSID, timeconv.secs2date(tstart))
+    if not context.covers(tstart, tstop):
+        return iter(())
+    values_filepath = context.abs('mnemonic_value')
+    times_filepath = context.abs('mnemonic_times')
+    index_filepath = context.abs('mnemonic_index')
+
+    return _iter_msid_blocks(values_filepath, times_filepath, index_filepath,
+                             start_jd, stop_jd, chunk_rows, context.committed_rows())
+
+
+def _iter_msid_blocks(values_filepath, times_filepath, index_filepath, start_jd, stop_jd,
+                      chunk_rows=None, committed_rows=None):
+    """Generator body of ``iter_msid``"""
+    index, row0, row1 = _get_jwst_row_range(index_filepath, times_filepath, start_jd, stop_jd,
+                                            committed_rows)
+
+    for _, jds, vals in _iter_jwst_blocks(times_filepath, values_filepath,
+                                          index, row0, row1, chunk_rows):
+        # Final time filtering for exact user interval
+        idx0, idx1 = np.searchsorted(jds, [start_jd, stop_jd])
+        if idx1 <= idx0:
+            continue
+
+        try:
+            vals = np.float64(vals[idx0:idx1])
+        except Exception:
+            vals = vals[idx0:idx1]
+
+        yield timeconv.jd_to_unix(jds[idx0:idx1], out=jds[idx0:idx1]), vals
+
 
-        if format == 'date':
-            tstart = Time(tstart, format='jd').yday
-            if tstop is not None:
-                tstop = Time(tstop, format='jd', out_subfmt='date_hms').yday
+def iter_msidset(msids, start=LAUNCH_DATE, stop=None, chunk_rows=None):
+    """
+    Iterate over full-resolution telemetry for a set of MSIDs in successive
+    blocks.  Each MSID is streamed in turn as for ``iter_msid``.
+
+    :param msids: list of MSID names (case-insensitive, may include globs)
+    :param start: start date of telemetry (Chandra.Time compatible)
+    :param stop: stop date of telemetry (current time if not supplied)
+    :param chunk_rows: approximate number of rows per block (default=BLOCK_ROWS)
+    :returns: generator of (msid, times, vals) where times are unix seconds
+    """
+    new_msids = []
+    for msid in msids:
+        new_msids.extend(msid_glob(msid)[0])
+
+    for msid in new_msids:
+        for times, vals in iter_msid(msid, start, stop, chunk_rows):
+            yield msid, times, vals
+
+
+def aligned(msids, start=None, stop=None, dt=None, times=None, method='nearest',
+            as_dataframe=False):
+    """
+    Sample a set of MSIDs onto a common time grid as one 2-D array.
+
+    Each MSID is streamed from the archive as for ``iter_msid`` and its
+    nearest-neighbor or linearly interpolated values are written directly into
+    a column of a preallocated ``(n_times, n_msids)`` float64 array, so memory
+    use is set by the size of the grid and not by the amount of full-resolution
+    telemetry, for example::
+
+      dat = fetch.aligned(['aogyrct*'], '2020:001', '2020:010', dt=60)
+      dat.vals  # (n_times, 4) array
+      dat.bads  # (n_times, 4) bad-mask
+      df = dat.to_dataframe()  # pandas DataFrame sharing memory with dat.vals
+
+    The time grid steps uniformly by ``dt`` seconds from ``start`` to ``stop``,
+    as for ``MSIDset.interpolate``, unless ``times`` is provided.  Telemetry
+    within one grid step of the grid is used.  Grid times before the first or
+    after the last sample of an MSID have no value: they are set to NaN and
+    are True in the bad-mask.
+
+    :param msids: list of MSID names (case-insensitive, may include globs)
+    :param start: start date of grid (Chandra.Time compatible)
+    :param stop: stop date of grid (current time if not supplied)
+    :param dt: grid time step (sec, default=328.0)
+    :param times: sorted array of grid times (unix seconds) to use instead of
+                  ``start``, ``stop`` and ``dt``
+    :param method: 'nearest' (default) or 'linear'
+    :param as_dataframe: return a pandas DataFrame instead of ``AlignedMSIDs``
+    :returns: AlignedMSIDs (or pandas.DataFrame if ``as_dataframe``)
+    """
+    if isinstance(msids, six.string_types):
+        msids = [msids]
+
+    if times is not None:
+        if any(kwarg is not None for kwarg in (dt, start, stop)):
+            raise ValueError('If "times" keyword is set then "dt", "start", '
+                             'and "stop" cannot be set')
+        times = np.asarray(times, dtype=np.float64)
+        if times.ndim != 1 or len(times) == 0:
+            raise ValueError('"times" must be a non-empty 1-d array')
+        steps = np.diff(times)
+        if np.any(steps < 0):
+            raise ValueError('"times" must be sorted')
+        pad = steps.max() if len(steps) else 0.0
+    else:
+        dt = 328.0 if dt is None else float(dt)
+        if dt <= 0:
+            raise ValueError('"dt" must be positive')
+        tstart = timeconv.to_secs(start if start is not None else LAUNCH_DATE)
+        tstop = timeconv.to_secs(stop) if stop else timeconv.unix_to_cxcsec(time.time())
+        tstart = timeconv.cxcsec_to_unix(tstart)
+        tstop = timeconv.cxcsec_to_unix(tstop)
+        if tstop < tstart:
+            raise ValueError('"stop" must be after "start"')
+        times = np.arange((tstop - tstart) // dt + 1) * dt + tstart
+        pad = dt
+
+    MSIDs = []
+    for msid in msids:
+        MSIDs.extend(name for name in msid_glob(msid)[1] if name not in MSIDs)
+
+    # Column-major so that each MSID column is contiguous
+    vals = np.empty((len(times), len(MSIDs)), dtype=np.float64, order='F')
+    bads = np.empty((len(times), len(MSIDs)), dtype=bool, order='F')
+
+    # Include any sample exactly at the padded stop time
+    start_jd = timeconv.unix_to_jd(times[0] - pad)
+    stop_jd = np.nextafter(timeconv.unix_to_jd(times[-1] + pad), np.inf)
+    datestart = timeconv.secs2date(timeconv.unix_to_cxcsec(times[0] - pad))
+
+    for col, MSID in enumerate(MSIDs):
+        logger.info('Sampling %s onto %d times', MSID, len(times))
+        sampler = GridSampler(times, vals[:, col], bads[:, col], method)
+
+        context = _fetch_context(MSID, datestart)
+        if not context.covers(timeconv.unix_to_cxcsec(times[0] - pad),
+                              timeconv.unix_to_cxcsec(times[-1] + pad)):
+            sampler.finish()
+            continue
+        for block_times, block_vals in _iter_msid_blocks(context.abs('mnemonic_value'),
+                                                         context.abs('mnemonic_times'),
+                                                         context.abs('mnemonic_index'),
+                                                         start_jd, stop_jd,
+                                                         committed_rows=context.committed_rows()):
+            sampler.update(block_times, block_vals)
+        sampler.finish()
+
+    out = AlignedMSIDs(times, MSIDs, vals, bads)
+    return out.to_dataframe() if as_dataframe else out
+
+
+def plan(msids, start, stop=None, stat=None, interpolate_dt=None):
+    """
+    Explain what a fetch of ``msids`` between ``start`` and ``stop`` would do
+    without reading any telemetry.  The plan is made from the archive indexes
+    and HDF5 metadata and gives for each MSID the number of rows to read, the
+    files to open, the bytes of HDF5 chunks to decompress and the predicted
+    memory of the fetched data, for example::
+
+      >>> p = fetch.plan(['aogyrct*'], '2020:001', '2021:001')
+      >>> print(p)  # explain-style table
+      >>> p.fetch_Mb
+
+    :param msids: list of MSID names or a single MSID (may include globs)
+    :param start: start date of telemetry (Chandra.Time compatible)
+    :param stop: stop date of telemetry (current time if not supplied)
+    :param stat: fetch stat (None|'5min'|'daily', default=None)
+    :param interpolate_dt: interpolate the output to uniform time steps (default=None)
+    :returns: FetchPlan
+    """
+    from .plan import plan
+    return plan(msids, start, stop, stat, interpolate_dt)
+
+
+def latest(msids='*', n=1, content='tlm'):
+    """
+    Get the latest samples (time and value) of ``msids`` for real-time
+    monitoring.  These come from the table of latest samples of every MSID that
+    is kept by ingest, so thousands of MSIDs are answered in one call without
+    opening any MSID archive files, for example::
+
+      >>> dat = fetch.latest(['aogyrct1', 'tephin'])
+      >>> dat['msid'], dat['times'], dat['vals']
+      >>> dat = fetch.latest('aogyrct*', n=5)  # times and vals are (4, 5)
+
+    If the archive has no table then the samples are read from the end of the
+    MSID archive files.
+
+    :param msids: MSID name or list of names (case-insensitive, may include globs,
+                  default='*' for all MSIDs)
+    :param n: number of latest samples per MSID, oldest first (default=1)
+    :param content: content type (default='tlm')
+    :returns: structured array with 'msid', 'times' (unix seconds) and 'vals'
+              columns, which are NaN for MSIDs without data
+    """
+    from .latest import latest
+    return latest(msids, n, content)
+
+
+def snapshot(time, msids='*', tolerance=None, method='nearest', workers=None):
+    """
+    Get the value of every MSID (or of ``msids``) at ``time``, for example::
+
+      >>> dat = fetch.snapshot('2021:001:12:00:00', tolerance=60)
+      >>> dat['msid'], dat['times'], dat['vals']
+
+    The sample of each MSID nearest to ``time`` within ``tolerance`` seconds
+    (or with ``method='previous'`` the last sample at or before ``time``) is
+    located from the MSID epoch and sparse time indexes, so only a few rows are
+    read per MSID.  Many MSIDs are split between worker processes.
+
+    :param time: snapshot time (Chandra.Time compatible)
+    :param msids: MSID name or list of names (case-insensitive, may include globs,
+                  default='*' for all MSIDs)
+    :param tolerance: maximum time (sec) between ``time`` and a sample (default=3600)
+    :param method: 'nearest' (default) or 'previous'
+    :param workers: number of worker processes (default=number of CPUs)
+    :returns: structured array with 'msid', 'times' (unix seconds) and 'vals'
+              columns, which are NaN for MSIDs without a sample
+    """
+    from .snapshot import snapshot
+    return snapshot(time, msids, tolerance, method, workers)
+
+
+def percentiles(msid, start, stop=None, q=50):
+    """
+    Estimate percentiles of ``msid`` between ``start`` and ``stop`` from the
+    quantile sketches of the stats pyramid, for example::
+
+      >>> fetch.percentiles('tephin', '2020:001', '2021:001', q=[1, 50, 99])
 
-        return tstart, tstop
+    The interval is covered by the coarsest pyramid bins that fit inside it
+    and only the edges that are not covered by a bin are read at full
+    resolution, so long intervals are fast.  The percentiles are estimates
+    (t-digest), which are most accurate near the min and max.
+
+    :param msid: MSID name
+    :param start: start date of telemetry (Chandra.Time compatible)
+    :param stop: stop date of telemetry (current time if not supplied)
+    :param q: percentile or sequence of percentiles (0 to 100, default=50)
+    :returns: percentile (float) or array of percentiles like ``q``, NaN if
+              there are no samples
+    """
+    from .percentiles import percentiles
+    return percentiles(msid, start, stop, q)
+
+
+def aggregate(msids, intervals=None, start=None, stop=None, bin=None, funcs=None,
+              workers=None):
+    """
+    Get aggregates (number of samples, min, max, mean, std) of ``msids`` over
+    many time windows, given as a list of intervals or as consecutive bins
+    from ``start`` to ``stop``, for example::
+
+      >>> dat = fetch.aggregate('tephin', start='2020:001', stop='2021:001', bin='1d')
+      >>> dat['tstart'], dat['mean'], dat['max']
+      >>> dats = fetch.aggregate(['aogyrct*', 'tephin'], intervals=orbits, funcs=['mean'])
+
+    Each window is covered by the coarsest bins of the stats pyramid that fit
+    inside it and only the ragged edges are read at full resolution, so
+    thousands of windows and hundreds of MSIDs are fast.  The mean and std are
+    time-weighted as for the stats.  Windows starting at a bin boundary (e.g.
+    ``bin='1d'`` from midnight) are single pyramid bins.
+
+    :param msids: MSID name or list of names (case-insensitive, may include globs)
+    :param intervals: windows as a list of (start, stop) or a table with
+                      tstart/tstop or datestart/datestop columns
+    :param start: start of consecutive windows of ``bin`` (if no intervals)
+    :param stop: stop of the last window (current time if not supplied)
+    :param bin: width of consecutive windows in sec or a key of STATS_DT
+    :param funcs: list of 'n', 'min', 'max', 'mean', 'std'
+                  (default=['mean', 'min', 'max', 'std'])
+    :param workers: number of worker processes (default=number of CPUs)
+    :returns: structured array with 'tstart', 'tstop' (CXC seconds) and a
+              column per aggregate (NaN for windows without samples) for a
+              single MSID name, or an OrderedDict of these arrays keyed by
+              MSID name
+    """
+    from .aggregate import aggregate
+    return aggregate(msids, intervals, start, stop, bin, funcs, workers)
 
 
 def get_telem(msids, start=None, stop=None, sampling='full', unit_system='eng',
@@ -2107,11 +3340,7 @@ def _set_msid_files_basedir(datestart, msid_files=msid_files):
     """
     try:
         cache_basedir = msid_files.basedir
-        if datestart < DATE2000_LO:
-            # Note: don't use os.path.join because ENG_ARCHIVE and basedir must
-            # use linux '/' convention but this might be running on Windows.
-            dirs = msid_files.basedir.split(':')
-            msid_files.basedir = ':'.join(dir_ + '/1999' for dir_ in dirs)
+        msid_files.basedir = _get_basedir(datestart, cache_basedir)
         yield
     finally:
         msid_files.basedir = cache_basedir
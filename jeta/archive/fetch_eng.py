@@ -3,6 +3,9 @@ from .fetch import *
 from . import fetch
 from .version import version as __version__
 
+# Archive metadata (e.g. ``content``) is loaded lazily by the fetch module
+__getattr__ = fetch.__getattr__
+
 # Module-level units, defaults to CXC units (e.g. Kelvins etc)
 UNITS = Units('eng')
 
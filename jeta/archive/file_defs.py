@@ -30,6 +30,10 @@ msid_files = {
     'archfiles':    'archive.meta.info.db3',
     'colnames':     'colnames.pickle',
     'colnames_all': 'colnames_all.pickle',
+    'committed':    'data/{{ft.content}}/committed.pickle',
+    'latest':       'data/{{ft.content}}/latest.pickle',
+    'coverage':     'data/{{ft.content}}/coverage.pickle',
+    'open_bins':    'data/{{ft.content}}/stats_open_bins.pickle',
     'msid':         'data/{{ft.content}}/{{ft.msid | upper}}',
     'data':         'data/{{ft.content}}/{{ft.msid | upper}}.h5',
     'statsdir':     'data/{{ft.content}}/stats/{{ft.interval}}/',
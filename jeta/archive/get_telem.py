@@ -33,7 +33,7 @@ import six
 import numpy as np
 
 from Chandra.Time import DateTime
-from . import fetch, utils
+from . import fetch
 
 
 def sanitize_event_expression(expr):
@@ -185,8 +185,10 @@ def get_telem(msids, start=None, stop=None, sampling='full', unit_system='eng',
 
     # Make sure that the dataset being fetched is reasonable (if checking requested)
     if max_fetch_Mb is not None or max_output_Mb is not None:
-        fetch_Mb, output_Mb = utils.get_fetch_size(msids, start, stop, stat=stat,
-                                                   interpolate_dt=interpolate_dt, fast=True)
+        fetch_plan = fetch.plan(msids, start.secs, stop.secs, stat=stat,
+                                interpolate_dt=interpolate_dt)
+        logger.info('Fetch plan:\n{}'.format(fetch_plan))
+        fetch_Mb, output_Mb = fetch_plan.fetch_Mb, fetch_plan.output_Mb
         if max_fetch_Mb is not None and fetch_Mb > max_fetch_Mb:
             raise MemoryError('Requested fetch requires {:.2f} Mb vs. limit of {:.2f} Mb'
                               .format(fetch_Mb, max_fetch_Mb))
@@ -0,0 +1,247 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Latest values of every MSID for real-time monitoring.
+
+Ingest keeps a compact table of the last ``n_samples`` samples (times and
+values) of every MSID and publishes it with the committed rows after each
+ingest chunk.  ``fetch.latest()`` answers "latest value and time" queries for
+thousands of MSIDs from this one cached table, without opening any of the
+MSID archive files, for example::
+
+  >>> dat = fetch.latest(['aogyrct1', 'tephin'])
+  >>> dat['msid'], dat['times'], dat['vals']
+
+The table is seeded from the end of the MSID archive files when ingest first
+starts it.  For an archive without the table, and for MSIDs not in it, the
+latest samples are read from the end of the MSID archive files instead.
+"""
+from __future__ import print_function, division, absolute_import
+
+import numpy as np
+import six
+
+from jeta.archive import fetch
+from jeta.archive import timeconv
+from jeta.archive.catalog import GLOB_CHARS, MsidCatalog
+from jeta.archive.utils import read_pickle_cached, write_pickle_atomic
+
+# Default number of latest samples kept per MSID
+LATEST_SAMPLES = 10
+
+
+class LatestTable(object):
+    """
+    Table of the latest samples of every MSID.  The samples of each MSID are
+    a row of the ``times`` and ``vals`` arrays, oldest first, padded with NaN
+    at the start when fewer than ``n_samples`` samples are known.
+
+    :param msids: sorted array of MSID names (upper case)
+    :param times: (n_msids, n_samples) array of times (unix seconds)
+    :param vals: (n_msids, n_samples) array of values
+    """
+    def __init__(self, msids, times, vals):
+        self.msids = np.asarray(msids, dtype=str)
+        self.times = times
+        self.vals = vals
+        self._catalog = None
+
+    @classmethod
+    def empty(cls, n_samples=LATEST_SAMPLES):
+        """Make a table with no MSIDs that keeps ``n_samples`` samples per MSID"""
+        nans = np.full((0, n_samples), np.nan)
+        return cls(np.array([], dtype=str), nans, nans.copy())
+
+    @property
+    def n_samples(self):
+        return self.times.shape[1]
+
+    def __len__(self):
+        return len(self.msids)
+
+    def index(self, msids):
+        """
+        Get the row of each of ``msids`` (upper case) or -1 if not in the table.
+
+        :param msids: array of MSID names
+        :returns: int array
+        """
+        msids = np.asarray(msids, dtype=str)
+        idx = np.searchsorted(self.msids, msids)
+        idx[idx == len(self.msids)] = 0
+        found = (self.msids[idx] == msids) if len(self.msids) else np.zeros(len(msids), bool)
+        return np.where(found, idx, -1)
+
+    def update(self, samples):
+        """
+        Update the table with newly ingested samples.
+
+        :param samples: dict of (times, vals) keyed by MSID name, where times
+                        are unix seconds in archive order
+        """
+        new_msids = sorted(set(msid.upper() for msid in samples) - set(self.msids.tolist()))
+        if new_msids:
+            msids = np.concatenate([self.msids, np.array(new_msids, dtype=str)])
+            order = np.argsort(msids, kind='stable')
+            nans = np.full((len(new_msids), self.n_samples), np.nan)
+            self.msids = msids[order]
+            self.times = np.concatenate([self.times, nans])[order]
+            self.vals = np.concatenate([self.vals, nans])[order]
+            self._catalog = None
+
+        n_samples = self.n_samples
+        rows = self.index([msid.upper() for msid in samples])
+        for row, (times, vals) in zip(rows, samples.values()):
+            times = np.asarray(times, dtype=np.float64)[-n_samples:]
+            vals = np.asarray(vals, dtype=np.float64)[-n_samples:]
+            n_new = len(times)
+            if n_new == 0:
+                continue
+            self.times[row, :n_samples - n_new] = self.times[row, n_new:]
+            self.vals[row, :n_samples - n_new] = self.vals[row, n_new:]
+            self.times[row, n_samples - n_new:] = times
+            self.vals[row, n_samples - n_new:] = vals
+
+    def glob(self, pattern):
+        """Get the MSIDs in the table matching glob ``pattern``"""
+        if self._catalog is None:
+            self._catalog = MsidCatalog(self.msids.tolist())
+        return self._catalog.resolve([pattern])[pattern]
+
+    def to_dict(self):
+        return {'msids': self.msids, 'times': self.times, 'vals': self.vals}
+
+
+def read_latest(filename):
+    """
+    Read the table of latest samples.
+
+    :param filename: latest samples file
+    :returns: LatestTable or None if there is no table
+    """
+    dat = read_pickle_cached(filename)
+    return None if dat is None else LatestTable(**dat)
+
+
+def write_latest(filename, table):
+    """
+    Publish the table of latest samples, replacing the file atomically.
+
+    :param filename: latest samples file
+    :param table: LatestTable
+    """
+    write_pickle_atomic(filename, table.to_dict())
+
+
+def seed_latest(msids, n_samples=LATEST_SAMPLES):
+    """
+    Make the table of latest samples from the end of the archive files of
+    ``msids``.  This starts the table for an archive that does not have one.
+
+    :param msids: MSID names
+    :param n_samples: number of samples kept per MSID
+    :returns: LatestTable
+    """
+    table = LatestTable.empty(n_samples)
+    samples = {}
+    for MSID in (msid.upper() for msid in msids):
+        try:
+            samples[MSID] = _read_latest_from_archive(MSID, n_samples)
+        except OSError:
+            # No archive files for this MSID
+            continue
+    table.update(samples)
+    return table
+
+
+def _read_latest_from_archive(MSID, n):
+    """
+    Read the latest ``n`` samples of ``MSID`` from the end of its archive
+    files.  The times are reconstructed from the start of the last epoch (one
+    ingest chunk), so at most the rows of that epoch are returned.
+
+    :returns: tuple (times, vals) with times in unix seconds
+    """
+    import tables
+
+    context = fetch._fetch_context(MSID)
+    committed_rows = context.committed_rows()
+    with fetch.HDF5_LOCK:
+        with tables.open_file(context.abs('mnemonic_index'), 'r') as h5:
+            index = h5.root.epoch[:]
+        with tables.open_file(context.abs('mnemonic_times'), 'r') as h5:
+            end_row = h5.root.time.nrows
+    if committed_rows is not None:
+        index = index[index['index'] < committed_rows]
+        end_row = min(end_row, committed_rows)
+    if len(index) == 0:
+        return np.array([]), np.array([])
+
+    epochs = np.zeros(1, dtype=fetch.EPOCH_DTYPE)
+    epochs['epoch'] = index['epoch'][-1]
+    epochs['index'] = index['index'][-1]
+    row0 = int(epochs['index'][0])
+    jds = fetch._read_jwst_times(context.abs('mnemonic_times'), epochs, row0, end_row)[-n:]
+    vals = fetch._read_jwst_values(context.abs('mnemonic_value'), end_row - len(jds), end_row)
+
+    return timeconv.jd_to_unix(jds), np.asarray(vals, dtype=np.float64)
+
+
+def latest(msids='*', n=1, content='tlm'):
+    """
+    Get the latest samples of ``msids``.  See ``fetch.latest()``.
+
+    :param msids: MSID name or list of names (case-insensitive, may include globs)
+    :param n: number of latest samples per MSID (default=1)
+    :param content: content type
+    :returns: structured array with 'msid', 'times' and 'vals' columns, which
+              are NaN for MSIDs without data
+    """
+    if isinstance(msids, six.string_types):
+        msids = [msids]
+    if n < 1:
+        raise ValueError('n must be at least 1')
+
+    table = read_latest(fetch.msid_paths.abs('latest', content))
+    if table is not None and n > table.n_samples:
+        raise ValueError('only the latest {} samples are kept'.format(table.n_samples))
+
+    names = []
+    for msid in msids:
+        msid = msid.upper()
+        if GLOB_CHARS.search(msid):
+            names.extend(table.glob(msid) if table is not None else fetch.msid_glob(msid)[1])
+        else:
+            names.append(msid)
+
+    shape = () if n == 1 else (n,)
+    msid_len = max([len(name) for name in names] + [1])
+    out = np.zeros(len(names), dtype=[('msid', 'U{}'.format(msid_len)),
+                                      ('times', np.float64, shape),
+                                      ('vals', np.float64, shape)])
+    out['msid'] = names
+
+    times = np.full((len(names), n), np.nan)
+    vals = np.full((len(names), n), np.nan)
+    if table is not None:
+        rows = table.index(out['msid'])
+        found = rows >= 0
+        times[found] = table.times[rows[found], -n:]
+        vals[found] = table.vals[rows[found], -n:]
+    else:
+        found = np.zeros(len(names), dtype=bool)
+
+    # MSIDs that are not in the table (e.g. first archived after the table
+    # was last published) are read from the archive files
+    for i in np.flatnonzero(~found):
+        MSID = names[i]
+        try:
+            msid_times, msid_vals = _read_latest_from_archive(MSID, n)
+        except OSError:
+            # No archive files for this MSID
+            continue
+        times[i, n - len(msid_times):] = msid_times
+        vals[i, n - len(msid_vals):] = msid_vals
+
+    out['times'] = times.reshape((len(names),) + shape)
+    out['vals'] = vals.reshape((len(names),) + shape)
+    return out
@@ -0,0 +1,272 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Mergeable state of the open stats bins of ingested telemetry.
+
+Ingest updates the stats of each MSID from the samples of each ingest chunk.
+The last bin of a stats interval is not complete until a sample in a later
+bin is ingested, so the state of this open bin is carried to the next chunk
+instead of its samples: the moments of the stats pyramid
+(``pyramid.MOMENTS_DTYPE``), optionally a quantile sketch (see
+``jeta.archive.sketch``), the last sample (whose time weight depends on the
+next sample) and the sample nearest the middle of the bin.  A chunk then only
+needs its own samples, and the completed bins are the same as computed from
+all the samples of the bins, except for the sketch and the middle sample:
+
+* The time weights of the moments are those of ``binstats.time_weights``.
+* The sketch of a bin is compressed from the sketch of the open bin and the
+  new samples, as for merging sketches up the pyramid.
+* The middle sample (``val`` of the 5min and daily stats) is the first
+  sample at or after the middle of the bin, or the last sample of a bin with
+  no samples after its middle.  For evenly sampled telemetry this is the
+  middle sample of ``update.calc_stats_vals``.
+
+The open bins of every MSID are kept in an ``OpenBinTable`` that ingest
+publishes with the committed rows.
+"""
+from __future__ import print_function, division, absolute_import
+
+from collections import namedtuple
+
+import numpy as np
+
+from jeta.archive import binstats
+from jeta.archive import pyramid
+from jeta.archive import sketch
+from jeta.archive.utils import read_pickle_cached, write_pickle_atomic
+
+# State of an open bin.  ``moments`` is a MOMENTS_DTYPE record of all the
+# samples of the bin, except that the time weight and weighted sums do not
+# include the last sample.  ``sketch`` is a sketch record (or None).
+# ``prev_time`` is the time of the sample before the last (NaN if the last
+# sample is the first of the bin).
+OpenBin = namedtuple('OpenBin', ['moments', 'sketch', 'prev_time', 'last_time', 'last_val',
+                                 'val_time', 'val'])
+
+# Completed bins: moments (MOMENTS_DTYPE), sketches (sketch records or None)
+# and middle sample values
+Bins = namedtuple('Bins', ['moments', 'sketches', 'vals'])
+
+
+def _weight(dts):
+    """Get the time weight of a sample from the intervals to its neighbours in the bin"""
+    dts = [x for x in dts if not np.isnan(x)]
+    return float(np.mean(dts)) if dts else None
+
+
+def _settle(moments, weight, val):
+    """Add a sample with ``weight`` to the weighted sums of ``moments``"""
+    weight = 1.0 if weight is None else np.clip(weight, binstats.MIN_DT, binstats.MAX_DT)
+    moments['weight'] += weight
+    moments['wsum'] += weight * val
+    moments['wsumsq'] += weight * val ** 2
+
+
+def _finish(moments):
+    """Use unit weights for bins with at most two samples, as for ``binstats.time_weights``"""
+    few = moments['n'] <= 2
+    moments['weight'][few] = moments['n'][few]
+    moments['wsum'][few] = moments['sum'][few]
+    moments['wsumsq'][few] = moments['sumsq'][few]
+    return moments
+
+
+def add_samples(state, times, vals, dt, size=None):
+    """
+    Add samples to an open bin and get the bins that they complete.
+
+    :param state: OpenBin of the open bin, or None if there is none
+    :param times: sample times (unix sec), in order and not before the start
+                  of the open bin
+    :param vals: numeric sample values
+    :param dt: bin width (sec)
+    :param size: number of centroids of the sketches, or None for no sketches
+    :returns: tuple (bins, state, neg_times) of the completed Bins, the
+              OpenBin of the new open bin and the times of samples with a
+              negative time weight (before clipping)
+    """
+    times = np.asarray(times, dtype=np.float64)
+    vals = np.asarray(vals, dtype=np.float64)
+    n = len(times)
+    sketch_dtype = None if size is None else sketch.sketch_dtype(size)
+    if n == 0:
+        bins = Bins(np.zeros(0, dtype=pyramid.MOMENTS_DTYPE),
+                    None if size is None else np.zeros(0, dtype=sketch_dtype),
+                    np.zeros(0))
+        return bins, state, times
+
+    indexes = np.floor_divide(times, dt).astype(np.int64)
+    joined = state is not None and int(state.moments['index'][0]) == indexes[0]
+    neg_times = []
+
+    # Settle the last sample of the open bin now that its next sample is known
+    if state is not None:
+        moments = state.moments.copy()
+        next_dt = times[0] - state.last_time if joined else np.nan
+        weight = _weight([state.last_time - state.prev_time, next_dt])
+        if weight is not None and weight < 0:
+            neg_times.append(state.last_time)
+        _settle(moments[0], weight, state.last_val)
+        state = state._replace(moments=moments)
+
+    # Bins of the new samples, where the last bin is the new open bin
+    new_bin = np.ones(n, dtype=bool)
+    new_bin[1:] = indexes[1:] != indexes[:-1]
+    starts = np.flatnonzero(new_bin)
+    ns = np.diff(np.append(starts, n))
+    ends = starts + ns
+
+    # Time weights from the intervals to the previous and next samples of the
+    # bin (including the last sample of the open bin).  The last sample is
+    # not weighted until its next sample is known.
+    diffs = np.diff(times)
+    has_prev = ~new_bin
+    prev_dts = np.full(n, np.nan)
+    prev_dts[1:] = diffs
+    if joined:
+        has_prev[0] = True
+        prev_dts[0] = times[0] - state.last_time
+    has_next = np.append(~new_bin[1:], False)
+    next_dts = np.append(diffs, np.nan)
+    prev_dts[~has_prev] = np.nan
+    next_dts[~has_next] = np.nan
+    dts = np.where(has_prev & has_next, (prev_dts + next_dts) / 2.0,
+                   np.where(has_prev, prev_dts, next_dts))
+    weighted = has_prev | has_next
+    neg_times.extend(times[weighted & (dts < 0.0)])
+    dts[weighted] = dts[weighted].clip(binstats.MIN_DT, binstats.MAX_DT)
+    dts[~weighted] = 1.0
+    dts[-1] = 0.0
+
+    moments = np.zeros(len(starts), dtype=pyramid.MOMENTS_DTYPE)
+    moments['index'] = indexes[starts]
+    moments['n'] = ns
+    moments['min'] = np.minimum.reduceat(vals, starts)
+    moments['max'] = np.maximum.reduceat(vals, starts)
+    moments['sum'] = np.add.reduceat(vals, starts)
+    moments['sumsq'] = np.add.reduceat(vals ** 2, starts)
+    moments['weight'] = np.add.reduceat(dts, starts)
+    moments['wsum'] = np.add.reduceat(dts * vals, starts)
+    moments['wsumsq'] = np.add.reduceat(dts * vals ** 2, starts)
+
+    # Middle sample: the first at or after the middle of the bin, else the last
+    centers = (moments['index'] + 0.5) * dt
+    mids = np.minimum(np.searchsorted(times, centers), ends - 1)
+    val_times = times[mids]
+    mid_vals = vals[mids]
+
+    if size is not None:
+        means = vals
+        weights = np.ones(n)
+        groups = np.repeat(np.arange(len(starts)), ns)
+        if joined:
+            means = np.concatenate([state.sketch['mean'][0], means])
+            weights = np.concatenate([state.sketch['weight'][0], weights])
+            groups = np.concatenate([np.zeros(size, dtype=groups.dtype), groups])
+        sketches = np.zeros(len(starts), dtype=sketch_dtype)
+        sketches['index'] = moments['index']
+        sketches['mean'], sketches['weight'] = sketch.compress(means, weights, groups,
+                                                               len(starts), size)
+
+    if joined:
+        old = state.moments[0]
+        first = moments[0]
+        first['n'] += old['n']
+        first['min'] = min(first['min'], old['min'])
+        first['max'] = max(first['max'], old['max'])
+        for name in ('sum', 'sumsq', 'weight', 'wsum', 'wsumsq'):
+            first[name] += old[name]
+        if state.val_time >= centers[0]:
+            val_times[0] = state.val_time
+            mid_vals[0] = state.val
+
+    if size is not None:
+        sketches['min'] = moments['min']
+        sketches['max'] = moments['max']
+
+    # Completed bins, starting with the open bin if no new sample is in it
+    done_moments = [moments[:-1]]
+    done_sketches = None if size is None else [sketches[:-1]]
+    done_vals = [mid_vals[:-1]]
+    if state is not None and not joined:
+        done_moments.insert(0, state.moments)
+        if size is not None:
+            done_sketches.insert(0, state.sketch)
+        done_vals.insert(0, [state.val])
+    bins = Bins(_finish(np.concatenate(done_moments)),
+                None if size is None else np.concatenate(done_sketches),
+                np.concatenate(done_vals).astype(np.float64))
+
+    if ns[-1] > 1:
+        prev_time = times[-2]
+    elif joined and len(starts) == 1:
+        prev_time = state.last_time
+    else:
+        prev_time = np.nan
+    state = OpenBin(moments[-1:].copy(),
+                    None if size is None else sketches[-1:].copy(),
+                    prev_time, times[-1], vals[-1], val_times[-1], mid_vals[-1])
+
+    return bins, state, np.array(neg_times, dtype=np.float64)
+
+
+class OpenBinTable(object):
+    """
+    Open stats bins of every MSID and stats interval.
+
+    :param bins: dict of OpenBin keyed by (MSID, interval)
+    """
+    def __init__(self, bins=None):
+        self.bins = {} if bins is None else bins
+        self.changed = False
+
+    def __len__(self):
+        return len(self.bins)
+
+    def __contains__(self, key):
+        return key in self.bins
+
+    def index(self, msid, interval):
+        """Get the bin index of the open bin of ``msid`` and ``interval`` (None if none)"""
+        state = self.bins.get((msid, interval))
+        return None if state is None else int(state.moments['index'][0])
+
+    def discard(self, msid, interval):
+        """Drop the open bin of ``msid`` and ``interval``"""
+        if self.bins.pop((msid, interval), None) is not None:
+            self.changed = True
+
+    def add(self, msid, interval, times, vals, dt, size=None):
+        """
+        Add samples to the open bin of ``msid`` and ``interval``.  See
+        ``add_samples``.
+
+        :returns: tuple (bins, neg_times) of the completed Bins and the times
+                  of samples with a negative time weight
+        """
+        if len(times) == 0:
+            return add_samples(None, times, vals, dt, size)[0], np.zeros(0)
+        key = (msid, interval)
+        bins, self.bins[key], neg_times = add_samples(self.bins.get(key), times, vals, dt, size)
+        self.changed = True
+        return bins, neg_times
+
+
+def read_open_bins(filename):
+    """
+    Read the open stats bins.
+
+    :param filename: open bins file
+    :returns: OpenBinTable or None if there is no file
+    """
+    bins = read_pickle_cached(filename)
+    return None if bins is None else OpenBinTable(dict(bins))
+
+
+def write_open_bins(filename, table):
+    """
+    Publish the open stats bins, replacing the file atomically.
+
+    :param filename: open bins file
+    :param table: OpenBinTable
+    """
+    write_pickle_atomic(filename, table.bins)
@@ -0,0 +1,149 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Fast resolution of archive file paths.
+
+``ArchivePaths`` renders the ``file_defs`` path templates (for instance
+``data/{{ft.content}}/{{ft.msid | upper}}/values.h5``) for a given content type,
+MSID and stats interval and caches the resulting ``pathlib.Path``.  Unlike the
+pyyaks ``ContextDict`` it does not need the global ``ft`` context to be set and
+does not render a Jinja template on each call, for example::
+
+  >>> from jeta.archive import fetch
+  >>> fetch.msid_paths.abs('mnemonic_value', msid='aogyrct1')
+  '/data/jeta/archive/data/tlm/AOGYRCT1/values.h5'
+
+As for ``ContextDict`` the base directory may be several directories separated
+by ':', in which case the first one where the file exists is used.
+"""
+from __future__ import print_function, division, absolute_import
+
+import os
+import re
+import pathlib
+
+# Template variable such as ``{{ft.msid | upper}}``
+RE_TEMPLATE_VAR = re.compile(r'{{\s*ft\.(\w+)\s*(\|\s*upper\s*)?}}')
+
+# Maximum number of resolved paths cached per resolver
+MAX_CACHED_PATHS = 1000000
+
+
+def compile_template(template):
+    """
+    Compile a ``file_defs`` path template into a list of literal strings and
+    (name, upper) template variables.
+
+    :param template: path template
+    :returns: list of parts
+    """
+    parts = []
+    pos = 0
+    for match in RE_TEMPLATE_VAR.finditer(template):
+        parts.append(template[pos:match.start()])
+        parts.append((match.group(1), match.group(2) is not None))
+        pos = match.end()
+    parts.append(template[pos:])
+
+    if any(isinstance(part, str) and ('{{' in part or '{%' in part) for part in parts):
+        raise ValueError('unsupported path template {!r}'.format(template))
+
+    return parts
+
+
+def render_template(parts, **ft):
+    """
+    Render compiled template ``parts`` with the template variables ``ft``.
+
+    :param parts: compiled template from ``compile_template``
+    :param **ft: template variable values (e.g. content, msid, interval)
+    :returns: str
+    """
+    out = []
+    for part in parts:
+        if isinstance(part, str):
+            out.append(part)
+        else:
+            name, upper = part
+            val = ft.get(name)
+            if val is None:
+                raise ValueError('path template variable {!r} is undefined'.format(name))
+            val = str(val)
+            out.append(val.upper() if upper else val)
+
+    return ''.join(out)
+
+
+class ArchivePaths(object):
+    """
+    Resolver of archive file paths.
+
+    :param templates: dict of path templates keyed by file type (e.g.
+                      ``file_defs.msid_files``)
+    :param basedir: base directory, or an object such as a pyyaks ContextDict
+                    with a ``basedir`` attribute that is read on each call
+    """
+    def __init__(self, templates, basedir):
+        self.templates = {filetype: compile_template(template)
+                          for filetype, template in templates.items()}
+        self._basedir = basedir
+        self._cache = {}
+
+    @property
+    def basedir(self):
+        basedir = self._basedir
+        return basedir if isinstance(basedir, str) else basedir.basedir
+
+    def path(self, filetype, content='tlm', msid=None, interval=None, basedir=None):
+        """
+        Get the absolute path of an archive file.
+
+        :param filetype: file type (key of ``templates``, e.g. 'mnemonic_value')
+        :param content: content type
+        :param msid: MSID name
+        :param interval: stats interval ('5min' or 'daily')
+        :param basedir: base directory to use instead of ``self.basedir``
+        :returns: pathlib.Path
+        """
+        if basedir is None:
+            basedir = self.basedir
+        key = (basedir, filetype, content, msid, interval)
+        try:
+            return self._cache[key]
+        except KeyError:
+            pass
+
+        relpath = render_template(self.templates[filetype],
+                                  content=content, msid=msid, interval=interval)
+        basedirs = basedir.split(':')
+        for dirname in basedirs:
+            path = pathlib.Path(os.path.abspath(os.path.join(dirname, relpath)))
+            exists = len(basedirs) == 1 or path.exists()
+            if exists:
+                break
+
+        # With several base directories the path depends on which files exist,
+        # so only a path to an existing file is cached.
+        if exists:
+            if len(self._cache) >= MAX_CACHED_PATHS:
+                self._cache.clear()
+            self._cache[key] = path
+
+        return path
+
+    def abs(self, filetype, content='tlm', msid=None, interval=None, basedir=None):
+        """
+        Get the absolute path of an archive file as a string, equivalent to
+        ``msid_files[filetype].abs`` with the same ``ft`` context values.
+
+        :param filetype: file type (key of ``templates``, e.g. 'mnemonic_value')
+        :param content: content type
+        :param msid: MSID name
+        :param interval: stats interval ('5min' or 'daily')
+        :param basedir: base directory to use instead of ``self.basedir``
+        :returns: str
+        """
+        return str(self.path(filetype, content, msid, interval, basedir))
+
+    def clear(self):
+        """Clear the cache of resolved paths"""
+        self._cache.clear()
@@ -0,0 +1,147 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Percentiles of telemetry over long intervals from the quantile sketches of
+the stats pyramid.
+
+``percentiles()`` covers the interval with the coarsest pyramid bins that fit
+inside it (see ``pyramid.tile``), merges the sketches of those bins (see
+``jeta.archive.sketch``) with the full-resolution samples of the edges that
+are not covered by a bin, and estimates the percentiles from the merged
+centroids.  A year of telemetry is answered from a few hundred sketch
+records instead of tens of millions of samples, for example::
+
+  >>> fetch.percentiles('tephin', '2020:001', '2021:001', q=[1, 50, 99])
+
+The percentiles are estimates, which are most accurate near the min and max.
+"""
+from __future__ import print_function, division, absolute_import
+
+import os
+import time
+
+import numpy as np
+
+from jeta.archive import fetch
+from jeta.archive import pyramid
+from jeta.archive import sketch
+from jeta.archive import timeconv
+
+# Padding (sec) of the full-resolution reads of the edges of an interval
+EDGE_PAD = 1.0
+
+
+def _sketch_ranges(context):
+    """
+    Get the range of bin indexes of the sketches of each pyramid level.
+
+    :param context: fetch.FetchContext
+    :returns: dict of (first, stop) keyed by level, for levels with sketches
+    """
+    import tables
+
+    ranges = {}
+    for level in pyramid.LEVELS:
+        filename = context.abs('stats', interval=level)
+        if not os.path.exists(filename):
+            continue
+        with fetch.HDF5_LOCK:
+            with tables.open_file(filename, 'r') as h5:
+                if h5.__contains__('/sketch') and h5.root.sketch.nrows > 0:
+                    index = h5.root.sketch.cols.index
+                    ranges[level] = (int(index[0]), int(index[-1]) + 1)
+    return ranges
+
+
+def _read_sketches(context, level, tiles):
+    """
+    Read the sketch records of the bins of ``tiles`` of one pyramid level.
+
+    :returns: list of structured arrays of sketch records
+    """
+    import tables
+
+    out = []
+    with fetch.HDF5_LOCK:
+        with tables.open_file(context.abs('stats', interval=level), 'r') as h5:
+            table = h5.root.sketch
+            for tile in tiles:
+                row0 = pyramid.search_index(table, tile.start)
+                row1 = pyramid.search_index(table, tile.stop)
+                out.append(table[row0:row1])
+    return out
+
+
+def percentiles(msid, start, stop=None, q=50):
+    """
+    Estimate percentiles of ``msid`` between ``start`` and ``stop``.  See
+    ``fetch.percentiles()``.
+
+    :param msid: MSID name
+    :param start: start date of telemetry (Chandra.Time compatible)
+    :param stop: stop date of telemetry (current time if not supplied)
+    :param q: percentile or sequence of percentiles (0 to 100)
+    :returns: percentile (float) or array of percentiles like ``q`` in the
+              current fetch units, NaN if there are no samples
+    """
+    probs = np.asarray(q, dtype=np.float64) / 100.0
+    if np.any((probs < 0) | (probs > 1)):
+        raise ValueError('percentiles must be between 0 and 100')
+
+    MSID = msid.upper()
+    tstart = timeconv.to_secs(start)
+    tstop = timeconv.to_secs(stop) if stop else timeconv.unix_to_cxcsec(time.time())
+    context = fetch._fetch_context(MSID, timeconv.secs2date(tstart))
+
+    tstart_unix = timeconv.cxcsec_to_unix(tstart)
+    tstop_unix = timeconv.cxcsec_to_unix(tstop)
+    tiles = pyramid.tile(tstart_unix, tstop_unix, _sketch_ranges(context))
+
+    means = []
+    weights = []
+    mins = []
+    maxes = []
+    for level in pyramid.LEVELS:
+        level_tiles = [tile for tile in tiles if tile.level == level]
+        if level_tiles:
+            for records in _read_sketches(context, level, level_tiles):
+                means.append(records['mean'].ravel())
+                weights.append(records['weight'].ravel())
+                mins.append(records['min'])
+                maxes.append(records['max'])
+
+    # Full-resolution samples of the edges are centroids of unit weight.  At a
+    # boundary with a bin the samples are selected by unix time, as for the
+    # bins of the pyramid, so a sample at the boundary is in either the bin or
+    # the edge.
+    for tile in tiles:
+        if tile.level is not None:
+            continue
+        edge_start = max(tstart, timeconv.unix_to_cxcsec(tile.start) - EDGE_PAD)
+        edge_stop = min(tstop, timeconv.unix_to_cxcsec(tile.stop) + EDGE_PAD)
+        if not context.covers(edge_start, edge_stop):
+            continue
+        jds, vals = fetch.MSID._get_jwst_data(edge_start, edge_stop, MSID, context)
+        if not issubclass(vals.dtype.type, (np.number, np.bool_)):
+            raise ValueError('percentiles need a numeric MSID, not {}'.format(MSID))
+        times = timeconv.jd_to_unix(jds)
+        ok = np.ones(len(times), dtype=bool)
+        if tile.start != tstart_unix:
+            ok &= times >= tile.start
+        if tile.stop != tstop_unix:
+            ok &= times < tile.stop
+        vals = np.asarray(vals, dtype=np.float64)[ok]
+        means.append(vals)
+        weights.append(np.ones(len(vals)))
+        mins.append(vals)
+        maxes.append(vals)
+
+    if sum(len(vals) for vals in mins) == 0:
+        out = np.full(probs.shape, np.nan)
+    else:
+        out = sketch.quantiles(np.concatenate(means), np.concatenate(weights),
+                               np.min(np.concatenate(mins)), np.max(np.concatenate(maxes)),
+                               probs)
+        units = fetch.Units(fetch.MSID.units['system'])
+        out = np.asarray(units.convert(MSID, out), dtype=np.float64)
+
+    return float(out) if out.ndim == 0 else out
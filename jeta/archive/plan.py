@@ -0,0 +1,235 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Explain / dry-run of archive fetches.
+
+``plan()`` works out what a fetch of a set of MSIDs would do using only the
+epoch and sparse time indexes and the HDF5 metadata of the archive files
+(chunk shapes, data types and number of rows).  No telemetry values or times
+are read, so a plan for years of full-resolution data is cheap, for example::
+
+  >>> from jeta.archive import fetch
+from jeta.archive import pyramid
+  >>> print(fetch.plan(['aogyrct1', 'tephin'], '2020:001', '2020:031'))
+  MSID      stat     rows  files  decompress_Mb  memory_Mb  output_Mb
+  AOGYRCT1  full  2592000      3          41.94      41.47      41.47
+  TEPHIN    full   648000      3          10.49      10.37      10.37
+  TOTAL           3240000      6          52.43      51.84      51.84
+
+For full-resolution data the number of rows is the row range that would be
+read, which bounds the number of samples returned.
+"""
+from __future__ import print_function, division, absolute_import
+
+import collections
+
+import numpy as np
+import six
+
+from jeta.archive import fetch
+from jeta.archive import pyramid
+from jeta.archive import timeconv
+
+# Bytes of the times column of a fetched MSID (float64)
+TIME_BYTES = 8
+
+MsidPlan = collections.namedtuple(
+    'MsidPlan', ['msid', 'stat', 'rows', 'files', 'decompress_bytes',
+                 'memory_bytes', 'output_bytes'])
+MsidPlan.__doc__ = """
+Plan of the fetch of one MSID.
+
+:param msid: MSID name
+:param stat: None (full resolution) or a key of fetch.STATS_DT
+:param rows: number of archive rows to read
+:param files: list of files to open
+:param decompress_bytes: bytes of HDF5 chunks to read and decompress
+:param memory_bytes: bytes of the fetched arrays
+:param output_bytes: bytes of the arrays after any interpolation
+"""
+
+
+class FetchPlan(object):
+    """
+    Plan of a fetch, as returned by ``fetch.plan()``.
+
+    :param msid_plans: list of MsidPlan
+    """
+    def __init__(self, msid_plans):
+        self.msids = list(msid_plans)
+
+    def __iter__(self):
+        return iter(self.msids)
+
+    def __len__(self):
+        return len(self.msids)
+
+    @property
+    def rows(self):
+        return sum(plan.rows for plan in self.msids)
+
+    @property
+    def n_files(self):
+        return sum(len(plan.files) for plan in self.msids)
+
+    @property
+    def decompress_bytes(self):
+        return sum(plan.decompress_bytes for plan in self.msids)
+
+    @property
+    def memory_bytes(self):
+        return sum(plan.memory_bytes for plan in self.msids)
+
+    @property
+    def output_bytes(self):
+        return sum(plan.output_bytes for plan in self.msids)
+
+    @property
+    def fetch_Mb(self):
+        """Predicted memory (Mb) of the fetched data"""
+        return round(self.memory_bytes / 1e6, 2)
+
+    @property
+    def output_Mb(self):
+        """Predicted memory (Mb) of the data after any interpolation"""
+        return round(self.output_bytes / 1e6, 2)
+
+    def __str__(self):
+        rows = [(plan.msid, plan.stat or 'full', plan.rows, len(plan.files),
+                 plan.decompress_bytes, plan.memory_bytes, plan.output_bytes)
+                for plan in self.msids]
+        rows.append(('TOTAL', '', self.rows, self.n_files, self.decompress_bytes,
+                     self.memory_bytes, self.output_bytes))
+
+        names = ('MSID', 'stat', 'rows', 'files', 'decompress_Mb', 'memory_Mb', 'output_Mb')
+        cells = [names]
+        for row in rows:
+            cells.append(row[:2] + (str(row[2]), str(row[3])) +
+                         tuple('{:.2f}'.format(val / 1e6) for val in row[4:]))
+
+        widths = [max(len(row[i]) for row in cells) for i in range(len(names))]
+        lines = []
+        for row in cells:
+            lines.append('  '.join(val.ljust(width) if i < 2 else val.rjust(width)
+                                   for i, (val, width) in enumerate(zip(row, widths))))
+        return '\n'.join(line.rstrip() for line in lines)
+
+    def __repr__(self):
+        return '<{} n_msids={} rows={} fetch_Mb={}>'.format(
+            self.__class__.__name__, len(self), self.rows, self.fetch_Mb)
+
+
+def _chunk_bytes(dataset, row0, row1):
+    """Bytes of the HDF5 chunks of ``dataset`` spanned by rows ``row0:row1``"""
+    if row1 <= row0:
+        return 0
+    chunk_rows = dataset.chunkshape[0] if dataset.chunkshape else dataset.nrows
+    n_chunks = (row1 - 1) // chunk_rows - row0 // chunk_rows + 1
+    return int(n_chunks * chunk_rows * dataset.dtype.itemsize)
+
+
+def _plan_full(context, tstart, tstop):
+    """
+    Plan a full-resolution fetch from the epoch and sparse time indexes.
+
+    :returns: tuple (rows, files, decompress_bytes, memory_bytes)
+    """
+    import tables
+
+    index_filepath = context.abs('mnemonic_index')
+    times_filepath = context.abs('mnemonic_times')
+    values_filepath = context.abs('mnemonic_value')
+
+    start_jd = timeconv.cxcsec_to_jd(tstart)
+    stop_jd = timeconv.cxcsec_to_jd(tstop)
+    _, row0, row1 = fetch._get_jwst_row_range(index_filepath, times_filepath,
+                                              start_jd, stop_jd, context.committed_rows())
+
+    with fetch.HDF5_LOCK:
+        with tables.open_file(times_filepath, 'r') as h5:
+            times = h5.root.time
+            row1 = min(row1, times.nrows)
+            decompress_bytes = _chunk_bytes(times, row0, row1)
+        with tables.open_file(values_filepath, 'r') as h5:
+            values = h5.root.data
+            decompress_bytes += _chunk_bytes(values, row0, row1)
+            val_bytes = values.dtype.itemsize
+
+    rows = max(row1 - row0, 0)
+    files = [index_filepath, times_filepath, values_filepath]
+    return rows, files, decompress_bytes, rows * (TIME_BYTES + val_bytes)
+
+
+def _plan_stat(context, stat, tstart, tstop):
+    """
+    Plan a stats fetch.  The rows are located with a binary search of the
+    stats indexes (``pyramid.search_index``), which reads only a few rows.
+
+    :returns: tuple (rows, files, decompress_bytes, memory_bytes)
+    """
+    import tables
+
+    dt = fetch.STATS_DT[stat]
+    filename = context.abs('stats', interval=stat)
+
+    with fetch.HDF5_LOCK:
+        with tables.open_file(filename, 'r') as h5:
+            table = h5.root.data
+
+            # Stats times are the bin centers, (index + 0.5) * dt in unix seconds
+            unix0, unix1 = timeconv.cxcsec_to_unix(np.array([tstart, tstop]))
+            row0 = pyramid.search_index(table, int(np.ceil(unix0 / dt - 0.5)))
+            row1 = pyramid.search_index(table, int(np.ceil(unix1 / dt - 0.5)))
+            decompress_bytes = _chunk_bytes(table, row0, row1)
+            row_bytes = table.dtype.itemsize
+
+    rows = max(row1 - row0, 0)
+    return rows, [filename], decompress_bytes, rows * (TIME_BYTES + row_bytes)
+
+
+def plan(msids, start, stop=None, stat=None, interpolate_dt=None):
+    """
+    Plan a fetch of ``msids`` between ``start`` and ``stop`` without reading
+    any telemetry.  See ``fetch.plan()``.
+
+    :param msids: list of MSID names or a single MSID (may include globs)
+    :param start: start date of telemetry (Chandra.Time compatible)
+    :param stop: stop date of telemetry (current time if not supplied)
+    :param stat: fetch stat (None or a key of fetch.STATS_DT, default=None)
+    :param interpolate_dt: interpolate the output to uniform time steps (default=None)
+    :returns: FetchPlan
+    """
+    import time
+
+    if isinstance(msids, six.string_types):
+        msids = [msids]
+    if stat is not None and stat not in fetch.STATS_DT:
+        raise ValueError('stat must be one of {}'.format(sorted(fetch.STATS_DT)))
+
+    tstart = timeconv.to_secs(start)
+    tstop = timeconv.to_secs(stop) if stop else timeconv.unix_to_cxcsec(time.time())
+    datestart = timeconv.secs2date(tstart)
+
+    MSIDs = []
+    for msid in msids:
+        MSIDs.extend(name for name in fetch.msid_glob(msid)[1] if name not in MSIDs)
+
+    msid_plans = []
+    for MSID in MSIDs:
+        context = fetch._fetch_context(MSID, datestart)
+        if stat:
+            rows, files, decompress_bytes, memory_bytes = _plan_stat(context, stat,
+                                                                     tstart, tstop)
+        else:
+            rows, files, decompress_bytes, memory_bytes = _plan_full(context, tstart, tstop)
+
+        # Number of output rows = fetch duration / interpolate interval
+        if interpolate_dt is None or rows == 0:
+            output_bytes = memory_bytes
+        else:
+            n_rows_out = int((tstop - tstart) // interpolate_dt) + 1
+            output_bytes = memory_bytes * n_rows_out // rows
+
+        msid_plans.append(MsidPlan(MSID, stat, rows, files, decompress_bytes,
+                                   memory_bytes, output_bytes))
+
+    return FetchPlan(msid_plans)
@@ -86,8 +86,7 @@ class MsidPlot(object):
         # Make sure MSID is sampled at the correct density for initial plot
         stat = get_stat(self.tstart, self.tstop, self.npix)
         if stat != self.msid.stat:
-            self.msid = self.fetch.Msid(self.msidname, self.tstart, self.tstop,
-                                        stat=stat)
+            self.msid = self._fetch_msid(stat)
 
         self.ax.set_autoscale_on(True)
         self.draw_plot()
@@ -158,10 +157,16 @@ Interactive MSID plot keys:
             dt = self.tstop - self.tstart
             self.tstart -= dt / 4
             self.tstop += dt / 4
-            self.msid = self.fetch.Msid(self.msidname, self.tstart, self.tstop,
-                                        stat=stat)
+            self.msid = self._fetch_msid(stat)
         self.draw_plot()
 
+    def _fetch_msid(self, stat):
+        # Full-resolution data are decimated to a couple of points per pixel
+        # while streaming from the archive, which preserves the visual extremes.
+        decimate = None if stat else 2 * self.npix
+        return self.fetch.Msid(self.msidname, self.tstart, self.tstop,
+                               stat=stat, decimate=decimate)
+
     def draw_plot(self):
         msid = self.msid
         for _ in range(len(self.ax.lines)):
@@ -0,0 +1,310 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Multi-resolution pyramid of telemetry statistics.
+
+Each level of the pyramid is a stats table (``stats/<level>/<MSID>.h5``) of
+mergeable moments per time bin: the number of samples, min, max, sum and sum
+of squares of the values, and the time weight with the time-weighted sum and
+sum of squares.  The finest level is computed from the full-resolution
+samples, using the time weights of ``binstats.time_weights``, and each
+coarser level is built by merging the records of the level below it, so no
+level needs the full-resolution telemetry again.
+
+The bins of a level are ``index = unix_time // dt`` as for the 5min and
+daily stats, and the bin widths nest exactly (1min -> 1h -> 1d -> 27d).  The
+5min stats (328 sec bins) do not nest with other levels and stay separate,
+with the daily stats that also have quantiles.  Any level can be fetched with
+``fetch.MSID(msid, start, stop, stat=<level>)``, which gives the time-weighted
+mean and std computed from the moments.
+
+Each level also has a ``/sketch`` table of the quantile sketches of its bins
+(see ``jeta.archive.sketch``), which are merged up the pyramid in the same
+way.  ``tile()`` covers an interval with the coarsest bins that fit inside it,
+for queries such as ``fetch.percentiles`` that combine the bins of several
+levels with the full-resolution samples at the edges of the interval.
+"""
+from __future__ import print_function, division, absolute_import
+
+import collections
+import os
+
+import numpy as np
+
+from jeta.archive import binstats
+from jeta.archive import sketch
+from jeta.archive import timeconv
+
+# Levels of the pyramid and their bin widths (sec), finest first.  Each bin
+# width is a multiple of the one before it.
+LEVELS = collections.OrderedDict([('1min', 60),
+                                  ('1h', 3600),
+                                  ('1d', 86400),
+                                  ('27d', 27 * 86400)])
+
+MOMENTS_DTYPE = np.dtype([('index', np.int32),
+                          ('n', np.int32),
+                          ('min', np.float64),
+                          ('max', np.float64),
+                          ('sum', np.float64),
+                          ('sumsq', np.float64),
+                          ('weight', np.float64),
+                          ('wsum', np.float64),
+                          ('wsumsq', np.float64)])
+
+
+def base_level():
+    """Get the finest level, which is computed from full-resolution samples"""
+    return next(iter(LEVELS))
+
+
+def fetch_start(index0, dt, now, lookback):
+    """
+    Get the start time of the telemetry fetch that updates the stats bins from
+    ``index0``.  This is 500 sec before the start of the bin, but no more than
+    ``lookback`` before ``now``.  Stats indexes are unix time // dt, so the
+    start of the bin is converted to CXC seconds like the fetch times.
+
+    :param index0: first stats index to update
+    :param dt: bin width (sec)
+    :param now: current time (CXC seconds)
+    :param lookback: longest lookback from ``now`` (sec)
+    :returns: fetch start time (CXC seconds)
+    """
+    return max(now - lookback, timeconv.unix_to_cxcsec(index0 * dt - 500.0))
+
+
+def calc_moments(times, vals, rows, indexes):
+    """
+    Compute the moments of samples in bins.  Arguments are as for
+    ``update.calc_stats_vals``, and only bins with samples are returned.
+
+    :param times: sample times (unix sec)
+    :param vals: numeric sample values
+    :param rows: row boundaries of the bins in ``times`` and ``vals``
+    :param indexes: bin index of each row boundary
+    :returns: structured array of MOMENTS_DTYPE
+    """
+    rows = np.asarray(rows)
+    ns = np.diff(rows)
+    ok = ns > 0
+    row0 = rows[0]
+    times = np.asarray(times[row0:rows[-1]], dtype=np.float64)
+    vals = np.asarray(vals[row0:rows[-1]], dtype=np.float64)
+    starts = rows[:-1][ok] - row0
+    ns = ns[ok]
+
+    out = np.zeros(len(ns), dtype=MOMENTS_DTYPE)
+    if len(ns) == 0:
+        return out
+
+    dts, _, _ = binstats.time_weights(times, starts, ns)
+    out['index'] = np.asarray(indexes[:-1])[ok]
+    out['n'] = ns
+    out['min'] = np.minimum.reduceat(vals, starts)
+    out['max'] = np.maximum.reduceat(vals, starts)
+    out['sum'] = np.add.reduceat(vals, starts)
+    out['sumsq'] = np.add.reduceat(vals ** 2, starts)
+    out['weight'] = np.add.reduceat(dts, starts)
+    out['wsum'] = np.add.reduceat(dts * vals, starts)
+    out['wsumsq'] = np.add.reduceat(dts * vals ** 2, starts)
+    return out
+
+
+def merge_moments(moments, dt, coarse_dt):
+    """
+    Merge moments of bins of width ``dt`` into bins of width ``coarse_dt``.
+
+    :param moments: structured array of MOMENTS_DTYPE in index order
+    :param dt: bin width of ``moments`` (sec)
+    :param coarse_dt: bin width of the output, a multiple of ``dt`` (sec)
+    :returns: structured array of MOMENTS_DTYPE
+    """
+    indexes = moments['index'].astype(np.int64) * dt // coarse_dt
+    if len(indexes) == 0:
+        return np.zeros(0, dtype=MOMENTS_DTYPE)
+    new_bin = np.ones(len(indexes), dtype=bool)
+    new_bin[1:] = indexes[1:] != indexes[:-1]
+    starts = np.flatnonzero(new_bin)
+
+    out = np.zeros(len(starts), dtype=MOMENTS_DTYPE)
+
+    out['index'] = indexes[starts]
+    out['min'] = np.minimum.reduceat(moments['min'], starts)
+    out['max'] = np.maximum.reduceat(moments['max'], starts)
+    for name in ('n', 'sum', 'sumsq', 'weight', 'wsum', 'wsumsq'):
+        out[name] = np.add.reduceat(moments[name], starts)
+    return out
+
+
+def moment_stats(moments):
+    """
+    Get the time-weighted mean and std of each bin from its moments.
+
+    :param moments: structured array of MOMENTS_DTYPE
+    :returns: dict of 'mean' and 'std' arrays
+    """
+    mean = moments['wsum'] / moments['weight']
+    var = moments['wsumsq'] / moments['weight'] - mean ** 2
+    return {'mean': mean, 'std': np.sqrt(np.clip(var, 0.0, None))}
+
+
+def search_index(table, index):
+    """
+    Get the first row of a stats table with an index at or after ``index``.
+    The indexes of a stats table are increasing integers, so the first and
+    last index bound the row (a table without gaps needs no search), and
+    then only a few rows are read for a binary search.
+
+    :param table: stats table with an ``index`` column
+    :param index: bin index
+    :returns: int row
+    """
+    n_rows = table.nrows
+    if n_rows == 0:
+        return 0
+    first = int(table[0]['index'])
+    last = int(table[n_rows - 1]['index'])
+    lo = min(max(index - last + n_rows - 1, 0), n_rows)
+    hi = min(max(index - first, 0), n_rows)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if table[mid]['index'] < index:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+# Part of an interval covered by bins [start, stop) of a pyramid level, or by
+# full-resolution samples between unix times [start, stop) if level is None
+Tile = collections.namedtuple('Tile', ['level', 'start', 'stop'])
+
+
+def tile(tstart, tstop, ranges):
+    """
+    Cover an interval with the bins of the pyramid.  The coarsest bins that
+    fit inside the interval are used, then finer bins toward the edges, and
+    what is left at the edges (less than a bin of the finest level) is full
+    resolution.
+
+    :param tstart: start of the interval (unix sec)
+    :param tstop: stop of the interval (unix sec)
+    :param ranges: dict of the range (first, stop) of bin indexes with
+                   records of each level, where levels not in ``ranges`` are
+                   not used
+    :returns: list of Tile in time order
+    """
+    def _tile(t0, t1, levels):
+        if t1 <= t0:
+            return []
+        if not levels:
+            return [Tile(None, t0, t1)]
+        level, dt = levels[0]
+        if level not in ranges:
+            return _tile(t0, t1, levels[1:])
+        first, stop = ranges[level]
+        k0 = max(int(np.ceil(t0 / dt)), first)
+        k1 = min(int(np.floor(t1 / dt)), stop)
+        if k1 <= k0:
+            return _tile(t0, t1, levels[1:])
+        return (_tile(t0, k0 * dt, levels[1:]) + [Tile(level, k0, k1)]
+                + _tile(k1 * dt, t1, levels[1:]))
+
+    return _tile(tstart, tstop, list(reversed(list(LEVELS.items()))))
+
+
+def _append_node(h5, node, records, title):
+    """Append ``records`` to table ``node`` of an open stats file, creating it if needed"""
+    if h5.__contains__('/' + node):
+        getattr(h5.root, node).append(records)
+    else:
+        h5.create_table(h5.root, node, records, title)
+    getattr(h5.root, node).flush()
+
+
+def _merge_node(fine_h5, coarse_h5, node, dt, coarse_dt, merge):
+    """
+    Merge the complete bins of table ``node`` of the level below after the
+    last record of the coarse level.  See ``update_levels``.
+
+    :param coarse_h5: open coarse stats file, or None if there is none
+    :param merge: function that merges fine records into coarse records
+    :returns: structured array of the coarse records
+    """
+    fine = getattr(fine_h5.root, node)
+    row0 = 0
+    if (coarse_h5 is not None and coarse_h5.__contains__('/' + node)
+            and getattr(coarse_h5.root, node).nrows > 0):
+        next_index = int(getattr(coarse_h5.root, node).cols.index[-1]) + 1
+        row0 = search_index(fine, next_index * coarse_dt // dt)
+    records = fine[row0:]
+    if len(records) == 0:
+        return records
+
+    # The bin of the last record of the level below is not complete
+    open_index = int(records['index'][-1]) * dt // coarse_dt
+    coarse = merge(records)
+    return coarse[coarse['index'] < open_index]
+
+
+def update_levels(filename, filters=None, dry_run=False):
+    """
+    Build the coarser levels of the pyramid of one MSID from the finer
+    levels.  The complete bins of each level after its last record are
+    merged from the records of the level below.  A bin is complete once the
+    level below has a record in a later bin, so only the rows of the level
+    below since the last record are read.  The moments (``/data``) and the
+    quantile sketches (``/sketch``) are merged separately, so sketches start
+    at the first bin after they were added to an existing pyramid.
+
+    :param filename: function of the level name that gives the stats file
+    :param filters: tables.Filters for new stats files
+    :param dry_run: compute the records but do not create or write any files
+    :returns: dict of the number of moments records added for each level
+    """
+    # PyTables is only needed to update files, so it is not loaded when fetch
+    # (which imports this module) is imported
+    import tables
+
+    n_added = {}
+    levels = list(LEVELS.items())
+    for (level, dt), (coarse_level, coarse_dt) in zip(levels[:-1], levels[1:]):
+        fine_file = filename(level)
+        if not os.path.exists(fine_file):
+            break
+
+        # A dry run only reads the coarse file if it exists
+        coarse_file = filename(coarse_level)
+        if dry_run:
+            coarse_mode = 'r' if os.path.exists(coarse_file) else None
+        else:
+            coarse_mode = 'a'
+            if not os.path.exists(os.path.dirname(coarse_file)):
+                os.makedirs(os.path.dirname(coarse_file))
+
+        with tables.open_file(fine_file, mode='r') as fine_h5:
+            if not fine_h5.__contains__('/data') or fine_h5.root.data.nrows == 0:
+                break
+
+            coarse_h5 = (None if coarse_mode is None
+                         else tables.open_file(coarse_file, mode=coarse_mode, filters=filters))
+            try:
+                coarse = _merge_node(fine_h5, coarse_h5, 'data', dt, coarse_dt,
+                                     lambda records: merge_moments(records, dt, coarse_dt))
+                n_added[coarse_level] = len(coarse)
+                if len(coarse) > 0 and not dry_run:
+                    _append_node(coarse_h5, 'data', coarse, "{} moments".format(coarse_level))
+
+                if fine_h5.__contains__('/sketch'):
+                    size = sketch.SKETCH_SIZES[coarse_level]
+                    coarse = _merge_node(
+                        fine_h5, coarse_h5, 'sketch', dt, coarse_dt,
+                        lambda records: sketch.merge_sketches(records, dt, coarse_dt, size))
+                    if len(coarse) > 0 and not dry_run:
+                        _append_node(coarse_h5, 'sketch', coarse,
+                                     "{} quantile sketches".format(coarse_level))
+            finally:
+                if coarse_h5 is not None:
+                    coarse_h5.close()
+
+    return n_added
@@ -7,10 +7,6 @@ from __future__ import print_function, division, absolute_import
 import sys
 import os
 import getpass
-try:
-    import ipyparallel as parallel
-except ImportError:
-    from IPython import parallel
 from six.moves import input
 
 # To use remote access, this flag should be set True (it is true by default
@@ -38,6 +34,18 @@ _remote_client = None
 class RemoteConnectionError(Exception):
     pass
 
+
+def _parallel():
+    """
+Import the IPython parallel module on first use since it is slow to import
+"""
+    try:
+        import ipyparallel as parallel
+    except ImportError:
+        from IPython import parallel
+    return parallel
+
+
 def establish_connection():
     """
 Function to establish a connection to the remote server
@@ -66,7 +74,7 @@ Return success status (True/False)
         print('Establishing connection to ' + hostname + '...')
         sys.stdout.flush()
         try:
-            _remote_client = parallel.Client(client_key_file,
+            _remote_client = _parallel().Client(client_key_file,
                                              sshserver=username+'@'+hostname,
                                              password=password)
         except:
@@ -95,7 +103,7 @@ def execute_remotely(fcn, *args, **kwargs):
 Function for executing a function remotely
 """
     if not connection_is_established():
-        raise parallel.ConnectionError(
+        raise _parallel().ConnectionError(
                 "Connection not established to remote server")
     dview = _remote_client[0]; # Use the first (and should be only) engine
     dview.block = True
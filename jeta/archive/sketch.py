@@ -0,0 +1,173 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Mergeable quantile sketches of telemetry in time bins.
+
+The sketch of a bin is a t-digest: a fixed number of weighted centroids
+(mean value and number of samples) that summarize the distribution of the
+values of the bin.  The centroids are made by sorting the samples (or the
+centroids being merged) and grouping them by their quantile with the
+``arcsin`` scale function, so the centroids near the min and max hold few
+samples and the centroids near the median hold many.  This gives quantiles
+that are most accurate in the tails.
+
+Sketches merge like the moments of the stats pyramid: the centroids of the
+bins of a level are merged and compressed to give the sketch of a coarser
+bin.  Each level of the pyramid has a ``/sketch`` table with the index, min,
+max and centroids of each bin, from which ``fetch.percentiles`` estimates
+the percentiles of any interval.
+"""
+from __future__ import print_function, division, absolute_import
+
+import numpy as np
+
+from jeta.archive import binstats
+
+# Number of centroids of the sketches of each pyramid level.  The 1min bins
+# have few samples and are many, so their sketches are small.
+SKETCH_SIZES = {'1min': 8,
+                '1h': 32,
+                '1d': 32,
+                '27d': 32}
+
+
+def sketch_dtype(size):
+    """Get the dtype of sketch records with ``size`` centroids"""
+    return np.dtype([('index', np.int32),
+                     ('min', np.float64),
+                     ('max', np.float64),
+                     ('mean', np.float64, (size,)),
+                     ('weight', np.float32, (size,))])
+
+
+def compress(means, weights, groups, n_groups, size):
+    """
+    Compress the weighted centroids of each group to at most ``size``
+    centroids.  The centroids of all groups are sorted together (by group
+    then mean) and compressed together.
+
+    :param means: centroid means
+    :param weights: centroid weights (number of samples)
+    :param groups: group number (0 to n_groups - 1) of each centroid
+    :param n_groups: number of groups
+    :param size: number of output centroids per group
+    :returns: tuple (means, weights) of (n_groups, size) arrays, where unused
+              centroids have zero weight
+    """
+    means = np.asarray(means, dtype=np.float64)
+    weights = np.asarray(weights, dtype=np.float64)
+    groups = np.asarray(groups)
+    ok = weights > 0
+    means, weights, groups = means[ok], weights[ok], groups[ok]
+
+    # Sort by mean, then stable (radix) sort by group as for segment quantiles
+    order = np.argsort(means)
+    groups = groups.astype(np.min_scalar_type(max(n_groups - 1, 0)))
+    order = order[np.argsort(groups[order], kind='stable')]
+    means, weights, groups = means[order], weights[order], groups[order]
+
+    # Quantile of the middle of each centroid within its group
+    totals = np.bincount(groups, weights, minlength=n_groups)
+    cum_weights = np.cumsum(weights)
+    group_starts = np.concatenate([[0.0], np.cumsum(totals)[:-1]])
+    q = (cum_weights - weights / 2 - group_starts[groups]) / totals[groups]
+
+    # Quantiles are put in ``size`` buckets of equal width on the arcsin scale
+    buckets = np.floor(size * (np.arcsin(2 * q - 1) / np.pi + 0.5))
+    keys = groups.astype(np.int64) * size + np.clip(buckets, 0, size - 1).astype(np.int64)
+    out_weights = np.bincount(keys, weights, minlength=n_groups * size)
+    out_sums = np.bincount(keys, weights * means, minlength=n_groups * size)
+    out_means = np.zeros_like(out_sums)
+    np.divide(out_sums, out_weights, out=out_means, where=out_weights > 0)
+
+    return out_means.reshape(n_groups, size), out_weights.reshape(n_groups, size)
+
+
+def calc_sketches(vals, rows, indexes, size):
+    """
+    Compute the sketches of samples in bins.  Arguments are as for
+    ``pyramid.calc_moments``, and only bins with samples are returned.
+
+    :param vals: numeric sample values
+    :param rows: row boundaries of the bins in ``vals``
+    :param indexes: bin index of each row boundary
+    :param size: number of centroids per sketch
+    :returns: structured array of ``sketch_dtype(size)``
+    """
+    rows = np.asarray(rows)
+    ns = np.diff(rows)
+    ok = ns > 0
+    row0 = rows[0]
+    vals = np.asarray(vals[row0:rows[-1]], dtype=np.float64)
+    starts = rows[:-1][ok] - row0
+    ns = ns[ok]
+
+    out = np.zeros(len(ns), dtype=sketch_dtype(size))
+    if len(ns) == 0:
+        return out
+
+    out['index'] = np.asarray(indexes[:-1])[ok]
+    out['min'] = np.minimum.reduceat(vals, starts)
+    out['max'] = np.maximum.reduceat(vals, starts)
+    out['mean'], out['weight'] = compress(vals, np.ones(len(vals)),
+                                          binstats.segment_ids(ns), len(ns), size)
+    return out
+
+
+def merge_sketches(sketches, dt, coarse_dt, size):
+    """
+    Merge sketches of bins of width ``dt`` into bins of width ``coarse_dt``.
+
+    :param sketches: structured array of sketch records in index order
+    :param dt: bin width of ``sketches`` (sec)
+    :param coarse_dt: bin width of the output, a multiple of ``dt`` (sec)
+    :param size: number of centroids per output sketch
+    :returns: structured array of ``sketch_dtype(size)``
+    """
+    indexes = sketches['index'].astype(np.int64) * dt // coarse_dt
+    if len(indexes) == 0:
+        return np.zeros(0, dtype=sketch_dtype(size))
+    new_bin = np.ones(len(indexes), dtype=bool)
+    new_bin[1:] = indexes[1:] != indexes[:-1]
+    starts = np.flatnonzero(new_bin)
+
+    out = np.zeros(len(starts), dtype=sketch_dtype(size))
+    out['index'] = indexes[starts]
+    out['min'] = np.minimum.reduceat(sketches['min'], starts)
+    out['max'] = np.maximum.reduceat(sketches['max'], starts)
+
+    n_centroids = sketches['mean'].shape[1]
+    groups = np.repeat(np.cumsum(new_bin) - 1, n_centroids)
+    out['mean'], out['weight'] = compress(sketches['mean'].ravel(), sketches['weight'].ravel(),
+                                          groups, len(starts), size)
+    return out
+
+
+def quantiles(means, weights, vmin, vmax, probs):
+    """
+    Estimate quantiles from centroids.  Each centroid is taken to be centered
+    on its share of the cumulative weight, and quantiles are interpolated
+    between the centroid means, the min and the max.
+
+    :param means: centroid means
+    :param weights: centroid weights
+    :param vmin: minimum value
+    :param vmax: maximum value
+    :param probs: quantile probabilities (0 to 1)
+    :returns: float64 array like ``probs`` (NaN if there are no samples)
+    """
+    probs = np.asarray(probs, dtype=np.float64)
+    means = np.asarray(means, dtype=np.float64).ravel()
+    weights = np.asarray(weights, dtype=np.float64).ravel()
+    ok = weights > 0
+    if not np.any(ok):
+        return np.full(probs.shape, np.nan)
+
+    order = np.argsort(means[ok])
+    means = means[ok][order]
+    weights = weights[ok][order]
+    cum_weights = np.cumsum(weights)
+    total = cum_weights[-1]
+    centers = cum_weights - weights / 2
+    return np.interp(probs * total,
+                     np.concatenate([[0.0], centers, [total]]),
+                     np.concatenate([[vmin], means, [vmax]]))
@@ -0,0 +1,126 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Value of every MSID at a given time.
+
+``snapshot()`` finds the sample of each MSID nearest to (or at or before) a
+time using the epoch and sparse time indexes of the MSID, so only the few
+rows around the time are read and a single value is read per MSID.  MSIDs are
+split between worker processes, since reads from the HDF5 files in one
+process are serialized, for example::
+
+  >>> dat = fetch.snapshot('2021:001:12:00:00', tolerance=60)
+  >>> dat[dat['msid'] == 'TEPHIN']
+"""
+from __future__ import print_function, division, absolute_import
+
+import numpy as np
+import six
+
+from jeta.archive import fetch
+from jeta.archive import timeconv
+from jeta.archive.utils import map_msids
+
+# Default maximum time (sec) between the snapshot time and a sample
+SNAPSHOT_TOLERANCE = 3600.0
+
+# Minimum number of MSIDs per worker process
+MSIDS_PER_WORKER = 64
+
+METHODS = ('nearest', 'previous')
+
+
+def _snapshot_msid(context, jd, tolerance_jd, method):
+    """
+    Get the sample of one MSID for ``snapshot``.
+
+    :returns: tuple (time, val) with time in JD, or (nan, nan) if there is no
+              sample within the tolerance
+    """
+    start_jd = jd - tolerance_jd
+    stop_jd = np.nextafter(jd if method == 'previous' else jd + tolerance_jd, np.inf)
+    if not context.covers(timeconv.jd_to_cxcsec(start_jd), timeconv.jd_to_cxcsec(stop_jd)):
+        return np.nan, np.nan
+
+    times_filepath = context.abs('mnemonic_times')
+    index, row0, row1 = fetch._get_jwst_row_range(context.abs('mnemonic_index'),
+                                                  times_filepath, start_jd, stop_jd,
+                                                  context.committed_rows())
+    jds = fetch._read_jwst_times(times_filepath, index, row0, row1)
+    i0, i1 = np.searchsorted(jds, [start_jd, stop_jd])
+    if i1 <= i0:
+        return np.nan, np.nan
+
+    if method == 'previous':
+        i = i1 - 1
+    else:
+        i = i0 + np.argmin(np.abs(jds[i0:i1] - jd))
+    vals = fetch._read_jwst_values(context.abs('mnemonic_value'), row0 + i, row0 + i + 1)
+    try:
+        val = np.float64(vals[0])
+    except (TypeError, ValueError):
+        val = np.nan
+
+    return jds[i], val
+
+
+def _snapshot_msids(MSIDs, basedir, jd, tolerance_jd, method):
+    """
+    Get the samples of ``MSIDs`` for ``snapshot``.  This is run in each
+    worker process.
+
+    :returns: list of (jd, val) tuples
+    """
+    out = []
+    for MSID in MSIDs:
+        context = fetch.FetchContext(MSID, 'tlm', basedir)
+        try:
+            out.append(_snapshot_msid(context, jd, tolerance_jd, method))
+        except OSError:
+            # No archive files for this MSID
+            out.append((np.nan, np.nan))
+
+    return out
+
+
+def snapshot(time, msids='*', tolerance=None, method='nearest', workers=None):
+    """
+    Get the value of every MSID at ``time``.  See ``fetch.snapshot()``.
+
+    :param time: snapshot time (Chandra.Time compatible)
+    :param msids: MSID name or list of names (case-insensitive, may include globs,
+                  default='*' for all MSIDs)
+    :param tolerance: maximum time (sec) between ``time`` and a sample
+                      (default=SNAPSHOT_TOLERANCE)
+    :param method: 'nearest' sample or 'previous' sample at or before ``time``
+    :param workers: number of worker processes (default=number of CPUs, with
+                    at least MSIDS_PER_WORKER MSIDs per worker)
+    :returns: structured array with 'msid', 'times' (unix seconds) and 'vals'
+              columns, which are NaN for MSIDs without a sample
+    """
+    if method not in METHODS:
+        raise ValueError('method must be one of {}'.format(METHODS))
+    if isinstance(msids, six.string_types):
+        msids = [msids]
+
+    if tolerance is None:
+        tolerance = SNAPSHOT_TOLERANCE
+
+    tstart = timeconv.to_secs(time)
+    jd = float(timeconv.cxcsec_to_jd(tstart))
+    tolerance_jd = tolerance / 86400.0
+    basedir = fetch._get_basedir(timeconv.secs2date(tstart - tolerance), fetch.msid_files.basedir)
+    MSIDs = fetch.msid_glob_bulk(msids)[1]
+
+    samples = map_msids(_snapshot_msids, MSIDs, (basedir, jd, tolerance_jd, method),
+                        workers, MSIDS_PER_WORKER)
+    jds, vals = np.array(samples, dtype=np.float64).reshape(len(MSIDs), 2).T
+
+    msid_len = max([len(MSID) for MSID in MSIDs] + [1])
+    out = np.zeros(len(MSIDs), dtype=[('msid', 'U{}'.format(msid_len)),
+                                      ('times', np.float64),
+                                      ('vals', np.float64)])
+    out['msid'] = MSIDs
+    out['times'] = timeconv.jd_to_unix(jds)
+    out['vals'] = vals
+
+    return out
@@ -0,0 +1,57 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import asyncio
+import gc
+
+import numpy as np
+import pytest
+
+from .. import fetch, afetch
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_msid_matches_fetch():
+    dat = fetch.MSID('aogyrct1', '2008:291', '2008:292')
+    adat = run(afetch.msid('aogyrct1', '2008:291', '2008:292'))
+    assert np.all(adat.times == dat.times)
+    assert np.all(adat.vals == dat.vals)
+    assert adat.bads is None
+
+
+def test_msidset_concurrent():
+    dats = fetch.MSIDset(['aogyrct1', 'aogyrct2'], '2008:291', '2008:292')
+    adats = run(afetch.msidset(['aogyrct1', 'aogyrct2'], '2008:291', '2008:292'))
+    assert list(adats) == list(dats)
+    for msid in dats:
+        assert np.all(adats[msid].vals == dats[msid].vals)
+
+
+def test_cancel():
+    async def cancel_fetch():
+        task = asyncio.ensure_future(afetch.msid('aogyrct1', '2008:001', '2009:001'))
+        await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+    run(cancel_fetch())
+
+
+def test_file_semaphore_per_loop():
+    async def get_semaphores():
+        return afetch._file_semaphore('a.h5'), afetch._file_semaphore('a.h5')
+
+    sem1, sem1_again = run(get_semaphores())
+    sem2, _ = run(get_semaphores())
+    assert sem1 is sem1_again
+    assert sem1 is not sem2
+
+    # Semaphores are dropped with their (closed) loop
+    gc.collect()
+    assert len(afetch._file_semaphores) == 0
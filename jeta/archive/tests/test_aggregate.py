@@ -0,0 +1,60 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import numpy as np
+import pytest
+import tables
+
+from .. import aggregate
+from .. import pyramid
+from .test_pyramid import _moments
+
+
+def test_windows():
+    tstarts, tstops = aggregate._windows(None, 1000.0, 1250.0, 100)
+    assert tstarts.tolist() == [1000.0, 1100.0, 1200.0]
+    assert tstops.tolist() == [1100.0, 1200.0, 1250.0]
+
+    tstarts, tstops = aggregate._windows([(10.0, 20.0), (5.0, 30.0)], None, None, None)
+    assert tstarts.tolist() == [10.0, 5.0]
+    assert tstops.tolist() == [20.0, 30.0]
+
+    with pytest.raises(ValueError):
+        aggregate._windows(None, 1000.0, 1250.0, None)
+
+
+def test_span_reduce():
+    col = np.array([3.0, 1.0, 4.0, 1.0, 5.0, 9.0])
+    p0s = np.array([0, 2, 1, 5])
+    p1s = np.array([2, 6, 4, 6])
+    assert aggregate._span_reduce(np.add, col, p0s, p1s).tolist() == [4.0, 19.0, 6.0, 9.0]
+    assert aggregate._span_reduce(np.minimum, col, p0s, p1s).tolist() == [1.0, 1.0, 1.0, 9.0]
+
+
+@pytest.mark.parametrize('sparse_fraction', [0.0, 1.0])
+def test_read_level_moments(tmpdir, monkeypatch, sparse_fraction):
+    """
+    Moments of the bins of tiles read from a level table match merging the
+    records directly, for both slice and coordinate reads.
+    """
+    monkeypatch.setattr(aggregate, 'SPARSE_READ_FRACTION', sparse_fraction)
+    _, _, moments = _moments()
+    index = moments['index']
+    k0 = int(index[0])
+    tiles = [pyramid.Tile('1min', k0 + 10, k0 + 70),
+             pyramid.Tile('1min', k0 + 500, k0 + 560),
+             pyramid.Tile('1min', k0 + 30, k0 + 40),
+             pyramid.Tile('1min', k0 - 100, k0 - 50)]
+
+    with tables.open_file(str(tmpdir.join('AAA.h5')), mode='w') as h5:
+        h5.create_table(h5.root, 'data', moments)
+        out = aggregate._read_level_moments(h5.root.data, index, tiles, [0, 1, 0, 2])
+
+    # The tile without records is dropped
+    assert out['index'].tolist() == [0, 1, 0]
+    for row, tile in zip(out, tiles):
+        records = moments[(index >= tile.start) & (index < tile.stop)]
+        merged = pyramid.merge_moments(records, 60, 60 * 10 ** 6)
+        assert len(merged) == 1
+        for name in ('n', 'min', 'max'):
+            assert row[name] == merged[name][0]
+        for name in ('sum', 'weight', 'wsum', 'wsumsq'):
+            assert np.isclose(row[name], merged[name][0])
@@ -0,0 +1,70 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import numpy as np
+import pytest
+
+from ..align import GridSampler, AlignedMSIDs
+
+
+def make_data(n=10000):
+    np.random.seed(0)
+    times = np.cumsum(np.random.uniform(0.1, 3.0, size=n))
+    vals = np.random.normal(size=n)
+    grid = np.linspace(times[0] - 50.0, times[-1] + 50.0, 3001)
+    return times, vals, grid
+
+
+def sample(grid, times, vals, method, block_rows):
+    out = np.empty(len(grid))
+    bads = np.empty(len(grid), dtype=bool)
+    sampler = GridSampler(grid, out, bads, method)
+    for row0 in range(0, len(times), block_rows):
+        sampler.update(times[row0:row0 + block_rows], vals[row0:row0 + block_rows])
+    sampler.finish()
+    return out, bads
+
+
+@pytest.mark.parametrize('block_rows', [1, 7, 1000, 100000])
+def test_nearest(block_rows):
+    times, vals, grid = make_data()
+    out, bads = sample(grid, times, vals, 'nearest', block_rows)
+
+    ok = (grid >= times[0]) & (grid <= times[-1])
+    assert np.all(bads == ~ok)
+    assert np.all(np.isnan(out[bads]))
+
+    idx = np.abs(grid[ok, None] - times[None, :]).argmin(axis=1)
+    assert np.all(out[ok] == vals[idx])
+
+
+@pytest.mark.parametrize('block_rows', [1, 7, 1000, 100000])
+def test_linear(block_rows):
+    times, vals, grid = make_data()
+    out, bads = sample(grid, times, vals, 'linear', block_rows)
+
+    ok = (grid >= times[0]) & (grid <= times[-1])
+    assert np.all(bads == ~ok)
+    assert np.allclose(out[ok], np.interp(grid[ok], times, vals))
+
+
+def test_no_data():
+    grid = np.arange(10.0)
+    out, bads = sample(grid, np.array([]), np.array([]), 'nearest', 10)
+    assert np.all(bads)
+    assert np.all(np.isnan(out))
+
+    with pytest.raises(ValueError):
+        GridSampler(grid, out, bads, 'cubic')
+
+
+def test_aligned_dataframe():
+    pytest.importorskip('pandas')
+    times = np.arange(5.0)
+    vals = np.asfortranarray(np.arange(10.0).reshape(5, 2))
+    bads = np.zeros(vals.shape, dtype=bool)
+    dat = AlignedMSIDs(times, ['AAA', 'BBB'], vals, bads)
+
+    assert np.all(dat['BBB'] == vals[:, 1])
+    df = dat.to_dataframe()
+    assert list(df.columns) == ['AAA', 'BBB']
+    assert np.all(df.index == times)
+    assert np.shares_memory(df.values, vals)
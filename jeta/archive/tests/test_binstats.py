@@ -0,0 +1,106 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import numpy as np
+import pytest
+
+from .. import binstats
+
+
+def _segments(seed=1):
+    """Random segments including segments of one and two samples"""
+    rng = np.random.RandomState(seed)
+    ns = np.array([1, 2, 3, 50, 1, 7, 200, 2])
+    starts = np.concatenate([[0], np.cumsum(ns)[:-1]])
+    times = np.cumsum(rng.uniform(0.0, 400.0, ns.sum()))
+    vals = rng.normal(size=ns.sum())
+    return times, vals, starts, ns
+
+
+def test_segment_stats():
+    times, vals, starts, ns = _segments()
+    stats = binstats.segment_stats(times, vals, starts, ns, std=True)
+
+    for i, (start, n) in enumerate(zip(starts, ns)):
+        seg_times = times[start:start + n]
+        seg_vals = vals[start:start + n]
+        if n <= 2:
+            dts = np.ones(n)
+        else:
+            dts = np.empty(n)
+            dts[0] = seg_times[1] - seg_times[0]
+            dts[-1] = seg_times[-1] - seg_times[-2]
+            dts[1:-1] = (seg_times[2:] - seg_times[:-2]) / 2.0
+            dts = dts.clip(binstats.MIN_DT, binstats.MAX_DT)
+        mean = np.float32(np.sum(dts * seg_vals) / np.sum(dts))
+        std = np.sqrt(np.sum(dts * (seg_vals - mean) ** 2) / np.sum(dts))
+
+        assert stats['min'][i] == seg_vals.min()
+        assert stats['max'][i] == seg_vals.max()
+        assert np.isclose(stats['mean'][i], mean, rtol=1e-6)
+        assert np.isclose(stats['std'][i], std)
+
+    assert not np.any(stats['negs'])
+
+
+def test_time_weights_negative():
+    times = np.array([0.0, 10.0, -20.0, 30.0, 40.0])
+    dts, negs, neg_dts = binstats.time_weights(times, np.array([0]), np.array([5]))
+    assert negs.tolist() == [False, True, False, False, False]
+    assert neg_dts.tolist() == [-10.0]
+    assert dts.tolist() == [10.0, binstats.MIN_DT, 10.0, 30.0, 10.0]
+
+
+@pytest.mark.parametrize('sort_segment_rows', [1, 10 ** 9])
+def test_segment_quantiles(sort_segment_rows, monkeypatch):
+    monkeypatch.setattr(binstats, 'SORT_SEGMENT_ROWS', sort_segment_rows)
+    mquantiles = pytest.importorskip('scipy.stats.mstats').mquantiles
+    times, vals, starts, ns = _segments()
+    probs = np.array([1, 5, 16, 50, 84, 95, 99]) / 100.0
+
+    quants = binstats.segment_quantiles(vals, starts, ns, probs)
+    assert quants.shape == (len(ns), len(probs))
+    for i, (start, n) in enumerate(zip(starts, ns)):
+        assert np.allclose(quants[i], mquantiles(vals[start:start + n], probs))
+
+    # Integer values
+    ivals = np.round(vals * 10).astype(np.int16)
+    quants = binstats.segment_quantiles(ivals, starts, ns, probs)
+    for i, (start, n) in enumerate(zip(starts, ns)):
+        assert np.allclose(quants[i], mquantiles(ivals[start:start + n], probs))
+
+
+def _state_counts_loop(vals, starts, state_codes):
+    """Per-state string comparison of update.calc_stats_vals before the bincount"""
+    max_len = max(len(state_code) for raw_count, state_code in state_codes)
+    fmtstr = '{:' + str(max_len) + 's}'
+    out = []
+    for raw_count, state_code in state_codes:
+        state = fmtstr.format(state_code)
+        if vals.dtype.kind == 'S':
+            state = state.encode('ascii')
+        out.append(np.add.reduceat(vals == state, starts))
+    return np.column_stack(out)
+
+
+@pytest.mark.parametrize('kind', ['U', 'S'])
+@pytest.mark.parametrize('n_states', [2, binstats.STATE_SEARCH_CODES - 1,
+                                      binstats.STATE_SEARCH_CODES, 12])
+def test_segment_state_counts(kind, n_states):
+    rng = np.random.RandomState(n_states)
+    # States of different lengths, padded in the values to the longest state
+    state_codes = [(i, 'S' * (1 + i % 3) + str(i)) for i in range(n_states)]
+    max_len = max(len(state_code) for _, state_code in state_codes)
+    # Values not in the state codes, including a prefix of a state
+    others = ['XX', 'S', '']
+    choices = [code.ljust(max_len) for _, code in state_codes] + [x.ljust(max_len) for x in others]
+    ns = np.array([1, 2, 3, 50, 1, 7, 200, 2])
+    starts = np.concatenate([[0], np.cumsum(ns)[:-1]])
+    vals = np.array(choices, dtype=kind)[rng.randint(0, len(choices), ns.sum())]
+
+    codes = binstats.state_code_indexes(vals, state_codes)
+    is_state = np.isin(vals, np.array(choices[:n_states], dtype=kind))
+    assert np.all((codes == n_states) == ~is_state)
+
+    counts = binstats.segment_state_counts(vals, ns, state_codes)
+    assert counts.shape == (len(ns), n_states)
+    assert np.array_equal(counts, _state_counts_loop(vals, starts, state_codes))
+    assert np.array_equal(counts.sum(axis=1), np.add.reduceat(is_state, starts))
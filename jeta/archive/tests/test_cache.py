@@ -0,0 +1,36 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+from ..cache import lru_cache
+
+
+def test_lru_cache_evicts():
+    @lru_cache(maxsize=3)
+    def f(x):
+        return x * 2
+
+    for x in range(10):
+        assert f(x) == x * 2
+    assert f(9) == 18
+    assert (f.hits, f.misses) == (1, 10)
+    f(0)
+    assert f.misses == 11
+
+
+def test_lru_cache_purge_while_computing():
+    """A key purged from the queue while its value is computed is still evicted later"""
+    computed = []
+
+    @lru_cache(maxsize=2)
+    def f(x):
+        if x == 0 and not computed:
+            # Other calls (e.g. from other threads) fill the cache and purge
+            # the queue entry of this key
+            for y in range(1, 5):
+                f(y)
+        computed.append(x)
+        return x
+
+    f(0)
+    for y in range(10, 20):
+        f(y)
+    f(0)
+    assert computed.count(0) == 2
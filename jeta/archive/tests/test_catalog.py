@@ -0,0 +1,41 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import fnmatch
+
+import pytest
+
+from ..catalog import MsidCatalog
+
+NAMES = ['AOATTQT1', 'AOATTQT2', 'AOATTQT3', 'AOATTQT4', 'AOPCADMD', 'AOACASEQ',
+         'DP_PITCH', 'DP_ROLL', 'TEPHIN', '1PDEAAT', '1PDEABT']
+
+
+@pytest.mark.parametrize('pattern', ['AOATTQT[1234]', 'AO*', '*PCADMD', 'DP_*', '1PDEA?T',
+                                     '*', 'Z*', 'TEPHIN', 'TEPH'])
+def test_glob_matches_fnmatch(pattern):
+    catalog = MsidCatalog(NAMES)
+    assert catalog.glob(pattern) == sorted(fnmatch.filter(NAMES, pattern))
+    # Cached result is the same and cannot be modified by the caller
+    catalog.glob(pattern).append('X')
+    assert catalog.glob(pattern) == sorted(fnmatch.filter(NAMES, pattern))
+
+
+def test_resolve_bulk():
+    catalog = MsidCatalog(NAMES)
+    out = catalog.resolve(['PITCH', 'AOATTQT[12]', 'NOPE', 'AO*'])
+    assert out == {'PITCH': ['DP_PITCH'],
+                   'AOATTQT[12]': ['AOATTQT1', 'AOATTQT2'],
+                   'NOPE': [],
+                   'AO*': sorted(x for x in NAMES if x.startswith('AO'))}
+
+    out = catalog.resolve(['AOATTQT[0-9]', 'ROLL'], regex=True)
+    assert out == {'AOATTQT[0-9]': ['AOATTQT1', 'AOATTQT2', 'AOATTQT3', 'AOATTQT4'],
+                   'ROLL': ['DP_ROLL']}
+
+
+def test_resolve_regex_escapes():
+    catalog = MsidCatalog(NAMES)
+    out = catalog.resolve([r'AOATTQT\d', r'aoattqt[12]', r'\dPDEA\wT', r'AOATTQT\D'], regex=True)
+    assert out == {r'AOATTQT\d': ['AOATTQT1', 'AOATTQT2', 'AOATTQT3', 'AOATTQT4'],
+                   r'aoattqt[12]': ['AOATTQT1', 'AOATTQT2'],
+                   r'\dPDEA\wT': ['1PDEAAT', '1PDEABT'],
+                   r'AOATTQT\D': []}
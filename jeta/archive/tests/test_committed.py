@@ -0,0 +1,24 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import os
+
+from ..committed import get_committed_rows, read_committed_rows, write_committed_rows
+
+
+def test_committed_rows(tmpdir):
+    filename = str(tmpdir.join('committed.pickle'))
+
+    # No table so all rows are used
+    assert read_committed_rows(filename) is None
+    assert get_committed_rows(filename, 'aaa') is None
+
+    write_committed_rows(filename, {'aaa': 10, 'BBB': 20})
+    assert read_committed_rows(filename) == {'AAA': 10, 'BBB': 20}
+    assert get_committed_rows(filename, 'aaa') == 10
+    # An MSID that is not in the table has no committed rows yet
+    assert get_committed_rows(filename, 'ccc') == 0
+
+    # The table is replaced atomically and read again after it changes
+    write_committed_rows(filename, {'AAA': 15, 'BBB': 20, 'CCC': 5})
+    assert get_committed_rows(filename, 'aaa') == 15
+    assert get_committed_rows(filename, 'ccc') == 5
+    assert os.listdir(str(tmpdir)) == ['committed.pickle']
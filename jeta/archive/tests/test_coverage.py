@@ -0,0 +1,84 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import numpy as np
+
+from ..coverage import (COVERAGE_DT, CoverageTable, read_coverage, times_to_runs,
+                        write_coverage)
+
+
+def test_times_to_runs():
+    times = np.array([0.5, 10, 3600, 3 * 3600 + 1, 4 * 3600, 10 * 3600]) + 100 * COVERAGE_DT
+    starts, stops = times_to_runs(times)
+    assert starts.tolist() == [100, 103, 110]
+    assert stops.tolist() == [102, 105, 111]
+
+    starts, stops = times_to_runs(np.array([]))
+    assert len(starts) == len(stops) == 0
+
+
+def test_coverage_covers():
+    table = CoverageTable()
+    hour = COVERAGE_DT
+    table.update({'aaa': np.array([10.5, 11.5, 20.5]) * hour})
+    table.update({'AAA': np.array([12.5, 30.5]) * hour, 'bbb': np.array([])})
+
+    _, starts, stops = table.coverage['AAA']
+    assert starts.tolist() == [10, 20, 30]
+    assert stops.tolist() == [13, 21, 31]
+
+    assert table.covers('aaa', 11 * hour, 11.5 * hour)
+    assert table.covers('aaa', 5 * hour, 10.1 * hour)
+    assert table.covers('aaa', 15 * hour, 25 * hour)
+    assert not table.covers('aaa', 13 * hour, 19.9 * hour)
+    assert not table.covers('aaa', 0, 9.9 * hour)
+    assert not table.covers('aaa', 31 * hour, 100 * hour)
+
+    # MSIDs not in the map may have telemetry anywhere
+    assert table.covers('bbb', 0, hour)
+
+
+def test_coverage_covers_many():
+    hour = COVERAGE_DT
+    table = CoverageTable()
+    table.start(['ccc'])
+    table.update({'aaa': np.array([10.5, 11.5, 12.5, 20.5, 30.5]) * hour,
+                  'ccc': np.array([50.5]) * hour})
+
+    tstarts = np.array([11, 5, 15, 13, 0, 31, 30.5]) * hour
+    tstops = np.array([11.5, 10.1, 25, 19.9, 9.9, 100, 30.6]) * hour
+    assert table.covers_many('aaa', tstarts, tstops).tolist() == [
+        True, True, True, False, False, False, True]
+    assert np.all(table.covers_many('bbb', tstarts, tstops))
+    # Coverage of CCC is only known from hour 50
+    assert np.all(table.covers_many('ccc', tstarts, tstops))
+    assert table.covers_many('ccc', [50 * hour, 51 * hour], [50 * hour, 60 * hour]).tolist() == [
+        True, False]
+    assert len(table.covers_many('aaa', [], [])) == 0
+
+
+def test_coverage_started():
+    """
+    Coverage of MSIDs already in the archive when the map is started is only
+    known from their next ingest.
+    """
+    hour = COVERAGE_DT
+    table = CoverageTable()
+    table.start(['aaa'])
+    assert table.covers('aaa', 0, hour)
+
+    table.update({'aaa': np.array([50.5]) * hour})
+    assert table.covers('aaa', 0, hour)
+    assert table.covers('aaa', 50 * hour, 50 * hour)
+    assert not table.covers('aaa', 51 * hour, 60 * hour)
+
+
+def test_read_write_coverage(tmpdir):
+    filename = str(tmpdir.join('coverage.pickle'))
+    assert read_coverage(filename) is None
+
+    table = CoverageTable()
+    table.update({'AAA': np.array([10.5]) * COVERAGE_DT})
+    write_coverage(filename, table)
+
+    table = read_coverage(filename)
+    assert 'aaa' in table
+    assert not table.covers('aaa', 0, COVERAGE_DT)
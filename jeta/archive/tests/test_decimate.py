@@ -0,0 +1,79 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import numpy as np
+import pytest
+
+from ..decimate import MinMaxDecimator, decimate, lttb
+
+
+def make_data(n=100000):
+    np.random.seed(0)
+    times = np.arange(n, dtype=np.float64) * 0.25
+    vals = np.sin(times / 500.0) + np.random.normal(scale=0.1, size=n)
+    vals[n // 8] = 10.0
+    vals[n * 2 // 3] = -10.0
+    return times, vals
+
+
+@pytest.mark.parametrize('method', ['minmax', 'lttb'])
+def test_decimate_preserves_extremes(method):
+    times, vals = make_data()
+    out_times, out_vals = decimate(times, vals, 1000, method)
+
+    assert len(out_times) <= 1000
+    assert np.all(np.diff(out_times) > 0)
+    assert vals.max() in out_vals
+    assert vals.min() in out_vals
+    # Every output sample is an input sample
+    idxs = np.searchsorted(times, out_times)
+    assert np.all(vals[idxs] == out_vals)
+
+
+@pytest.mark.parametrize('method', ['minmax', 'lttb'])
+def test_decimate_streaming_matches_one_shot(method):
+    times, vals = make_data()
+    one_shot = MinMaxDecimator(0, len(times), 32000)
+    one_shot.update(0, times, vals)
+
+    streamed = MinMaxDecimator(0, len(times), 32000)
+    for row0 in range(0, len(times), 7777):
+        streamed.update(row0, times[row0:row0 + 7777], vals[row0:row0 + 7777])
+
+    for out1, out2 in zip(one_shot.result(1000, method), streamed.result(1000, method)):
+        assert np.all(out1 == out2)
+
+
+def test_decimate_short():
+    times, vals = make_data(100)
+    out_times, out_vals = decimate(times, vals, 1000)
+    assert out_times is times
+    assert out_vals is vals
+
+
+def test_lttb_endpoints():
+    times, vals = make_data(1000)
+    idxs = lttb(times, vals, 50)
+    assert len(idxs) == 50
+    assert idxs[0] == 0
+    assert idxs[-1] == 999
+    assert np.all(np.diff(idxs) > 0)
+
+
+@pytest.mark.parametrize('vals', [np.array(['ON', 'OFF'] * 500),
+                                  np.array([b'ON', b'OFF'] * 500)])
+def test_decimate_non_numeric(vals):
+    """State (string) values raise a clear error up front"""
+    times = np.arange(len(vals), dtype=np.float64)
+    with pytest.raises(ValueError, match='decimation needs a numeric MSID'):
+        decimate(times, vals, 100)
+
+    decimator = MinMaxDecimator(0, len(times), 3200)
+    with pytest.raises(ValueError, match='decimation needs a numeric MSID'):
+        decimator.update(0, times, vals)
+
+
+def test_decimate_bool():
+    times = np.arange(1000, dtype=np.float64)
+    vals = (np.arange(1000) % 7) == 0
+    out_times, out_vals = decimate(times, vals, 100)
+    assert len(out_times) <= 100
+    assert set(out_vals) == {0.0, 1.0}
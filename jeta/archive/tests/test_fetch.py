@@ -1,7 +1,11 @@
 # Licensed under a 3-clause BSD style license - see LICENSE.rst
 from __future__ import print_function, division, absolute_import
 
+import os
+import subprocess
+import sys
 from copy import deepcopy
+from concurrent.futures import ThreadPoolExecutor
 
 import numpy as np
 import pytest
@@ -404,3 +408,243 @@ def test_daily_state_bins():
 
     dat = fetch.Msid('aoacaseq', '2016:234:12:00:00', '2016:234:12:30:00', stat='5min')
     assert np.all(dat.n_BRITs == [0, 0, 51, 17, 0, 0])
+
+
+def test_lazy_msid():
+    """
+    A lazy MSID resolves the rows up front but reads times and values on
+    first access, giving the same data as an eager fetch.
+    """
+    dat = fetch.MSID('aogyrct1', '2008:291', '2008:292')
+    lazy = fetch.MSID('aogyrct1', '2008:291', '2008:292', lazy=True)
+    assert 'times' not in lazy.__dict__
+    assert 'vals' not in lazy.__dict__
+
+    assert len(lazy) == len(dat)
+    assert 'vals' not in lazy.__dict__
+    assert np.all(lazy.times == dat.times)
+    assert np.all(lazy.vals == dat.vals)
+    assert lazy.bads is None
+
+    dats = fetch.MSIDset(['aogyrct1', 'aogyrct2'], '2008:291', '2008:292', lazy=True)
+    assert all('vals' not in msid.__dict__ for msid in dats.values())
+    assert np.all(dats['aogyrct1'].vals == dat.vals)
+
+
+def test_iter_msid():
+    """
+    Iterating over an MSID in small blocks gives the same data as a single fetch.
+    """
+    dat = fetch.MSID('aogyrct1', '2008:291', '2008:292')
+    blocks = list(fetch.iter_msid('aogyrct1', '2008:291', '2008:292', chunk_rows=1000))
+    assert len(blocks) > 1
+    assert np.all(np.concatenate([times for times, vals in blocks]) == dat.times)
+    assert np.all(np.concatenate([vals for times, vals in blocks]) == dat.vals)
+
+    blocks = list(fetch.iter_msidset(['aogyrct1', 'aogyrct2'], '2008:291', '2008:292'))
+    assert set(msid for msid, times, vals in blocks) == set(['aogyrct1', 'aogyrct2'])
+    vals = np.concatenate([vals for msid, times, vals in blocks if msid == 'aogyrct1'])
+    assert np.all(vals == dat.vals)
+
+
+def test_intervals_single_pass():
+    """
+    A multi-interval fetch gives the same data as concatenating a fetch of each
+    interval.
+    """
+    intervals = [('2008:291:00:00:00', '2008:291:00:10:00'),
+                 ('2008:291:00:10:30', '2008:291:02:00:00'),
+                 ('2008:291:12:00:00', '2008:291:12:00:05'),
+                 ('2008:292:00:00:00', '2008:293:00:00:00')]
+    dat = fetch.MSID('aogyrct1', intervals)
+    dats = [fetch.MSID('aogyrct1', start, stop) for start, stop in intervals]
+    assert np.all(dat.times == np.concatenate([x.times for x in dats]))
+    assert np.all(dat.vals == np.concatenate([x.vals for x in dats]))
+
+
+def test_import_deferred():
+    """
+    Importing fetch defers loading the archive metadata and the astropy and
+    Chandra.Time packages.
+    """
+    code = ('import sys; import jeta.archive.fetch as fetch; '
+            'mods = ["astropy.io.ascii", "astropy.time", "Chandra.Time"]; '
+            'print(any(mod in sys.modules for mod in mods), "content" in vars(fetch))')
+    out = subprocess.check_output([sys.executable, '-c', code], env=os.environ.copy())
+    heavy_imported, content_loaded = out.split()[-2:]
+    assert heavy_imported == b'False'
+    assert content_loaded == b'False'
+
+
+def test_metadata_cache():
+    """
+    Archive metadata from the binary cache is the same as from the source files.
+    """
+    metadata = fetch._load_metadata()
+    assert os.path.exists(fetch.METADATA_CACHE)
+    assert fetch._load_metadata()['content'] == metadata['content']
+    assert fetch._load_metadata()['msid_bad_times'] == metadata['msid_bad_times']
+    assert 'AOGYRCT1' in fetch.content
+    assert fetch_eng.content is fetch.content
+
+
+def test_concurrent_msid():
+    """
+    Fetching MSIDs from many threads at once gives the same data as fetching
+    them one at a time and does not change the global fetch context.
+    """
+    requests = [(msid, start, stop)
+                for msid in ('aogyrct1', 'aogyrct2', 'aopcadmd', 'tephin')
+                for start, stop in (('2008:291', '2008:292'),
+                                    ('2008:291:12:00:00', '2008:293'),
+                                    ('2009:001', '2009:001:06:00:00'))]
+    expected = {request: fetch.MSID(*request) for request in requests}
+    basedir = fetch.msid_files.basedir
+    ft = dict(fetch.ft)
+
+    def fetch_msid(request):
+        return request, fetch.MSID(*request)
+
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        results = list(executor.map(fetch_msid, requests * 10))
+
+    for request, dat in results:
+        assert np.all(dat.times == expected[request].times)
+        assert np.all(dat.vals == expected[request].vals)
+    assert fetch.msid_files.basedir == basedir
+    assert dict(fetch.ft) == ft
+
+
+@pytest.mark.parametrize('method', ['nearest', 'linear'])
+def test_aligned(method):
+    """
+    Sampling MSIDs onto a grid gives the same values as sampling the
+    full-resolution fetch of each MSID.
+    """
+    msids = ['aogyrct1', 'aogyrct2', 'tephin']
+    dat = fetch.aligned(msids, '2008:291:00:00:10', '2008:292', dt=60.0, method=method)
+    assert dat.vals.shape == (len(dat.times), 3)
+    assert dat.msids == ['AOGYRCT1', 'AOGYRCT2', 'TEPHIN']
+
+    for msid in msids:
+        full = fetch.MSID(msid, '2008:290:23:00:00', '2008:292:01:00:00')
+        ok = ~dat.bads[:, dat.msids.index(msid.upper())]
+        times = dat.times[ok]
+        if method == 'linear':
+            expected = np.interp(times, full.times, full.vals)
+        else:
+            idx = np.clip(np.searchsorted(full.times, times), 1, len(full.times) - 1)
+            later = full.times[idx] - times < times - full.times[idx - 1]
+            expected = np.where(later, full.vals[idx], full.vals[idx - 1])
+        assert np.allclose(dat[msid.upper()][ok], expected)
+
+    dat2 = fetch.aligned(msids, times=dat.times[10:20], method=method)
+    assert np.all(dat2.vals == dat.vals[10:20])
+
+    with pytest.raises(ValueError):
+        fetch.aligned(msids, '2008:291', times=dat.times)
+
+
+@pytest.mark.parametrize('stat', [None, '5min', 'daily'])
+def test_plan(stat):
+    """
+    A fetch plan bounds the rows and memory of the actual fetch.
+    """
+    plan = fetch.plan(['aogyrct1', 'tephin'], '2008:291', '2008:295', stat=stat)
+    assert [msid_plan.msid for msid_plan in plan] == ['AOGYRCT1', 'TEPHIN']
+    assert plan.n_files == (2 if stat else 6)
+
+    for msid_plan in plan:
+        dat = fetch.MSID(msid_plan.msid, '2008:291', '2008:295', stat=stat)
+        assert msid_plan.rows >= len(dat.vals)
+        if stat:
+            assert msid_plan.rows == len(dat.vals)
+        assert msid_plan.decompress_bytes >= msid_plan.memory_bytes - 8 * msid_plan.rows
+    assert 'TOTAL' in str(plan)
+
+    plan = fetch.plan('aogyrct1', '2008:291', '2008:295', stat=stat, interpolate_dt=3280.0)
+    assert plan.output_Mb <= plan.fetch_Mb
+
+
+def test_committed_rows(monkeypatch):
+    """
+    Fetches only use the rows committed by ingest.
+    """
+    start, stop = '2008:291', '2008:292'
+    dat = fetch.MSID('aogyrct1', start, stop)
+    context = fetch._fetch_context('aogyrct1', start)
+    index, row0, row1 = fetch._get_jwst_row_range(context.abs('mnemonic_index'),
+                                                  context.abs('mnemonic_times'),
+                                                  fetch.timeconv.cxcsec_to_jd(dat.tstart),
+                                                  fetch.timeconv.cxcsec_to_jd(dat.tstop))
+
+    # Pretend that ingest has committed only the rows up to the middle of the fetch
+    n_rows = row0 + (row1 - row0) // 2
+    monkeypatch.setattr(fetch.committed, 'get_committed_rows',
+                        lambda filename, msid: n_rows)
+
+    for kwargs in ({}, {'lazy': True}):
+        dat2 = fetch.MSID('aogyrct1', start, stop, **kwargs)
+        assert 0 < len(dat2.vals) < len(dat.vals)
+        assert np.all(dat2.times == dat.times[:len(dat2.times)])
+
+    blocks = list(fetch.iter_msid('aogyrct1', start, stop))
+    assert sum(len(vals) for times, vals in blocks) == len(dat2.vals)
+
+    # Nothing committed yet
+    monkeypatch.setattr(fetch.committed, 'get_committed_rows', lambda filename, msid: 0)
+    assert len(fetch.MSID('aogyrct1', start, stop).vals) == 0
+
+
+def test_coverage(monkeypatch):
+    """
+    Fetches where the coverage map of ingest has no telemetry skip the archive files.
+    """
+    start, stop = '2008:291', '2008:292'
+    table = fetch.coverage.CoverageTable()
+    table.update({'AOGYRCT1': [0.0]})
+    monkeypatch.setattr(fetch.coverage, 'read_coverage', lambda filename: table)
+
+    # MSIDs that are not in the map are fetched as usual
+    assert len(fetch.MSID('aogyrct2', start, stop).vals) > 0
+
+    def no_io(*args, **kwargs):
+        raise AssertionError('archive files read')
+    monkeypatch.setattr(fetch, '_get_jwst_row_range', no_io)
+    monkeypatch.setattr(fetch, '_get_jwst_interval_rows', no_io)
+
+    for kwargs in ({}, {'lazy': True}, {'decimate': 100}):
+        dat = fetch.MSID('aogyrct1', start, stop, **kwargs)
+        assert len(dat.vals) == 0
+        assert len(dat.times) == 0
+    assert len(fetch.MSID('aogyrct1', [(start, stop)]).vals) == 0
+    assert list(fetch.iter_msid('aogyrct1', start, stop)) == []
+
+
+@pytest.mark.parametrize('method', ['nearest', 'previous'])
+def test_snapshot(method, monkeypatch):
+    """
+    A snapshot gives the sample of each MSID nearest to (or at or before) the
+    snapshot time, using worker processes for many MSIDs.
+    """
+    from .. import snapshot
+
+    msids = ['aogyrct1', 'aogyrct2', 'tephin']
+    time = fetch.timeconv.to_secs('2008:291:12:00:00.5')
+    monkeypatch.setattr(snapshot, 'MSIDS_PER_WORKER', 1)
+
+    for workers in (1, 2):
+        dat = fetch.snapshot(time, msids, tolerance=600, method=method, workers=workers)
+        assert dat['msid'].tolist() == ['AOGYRCT1', 'AOGYRCT2', 'TEPHIN']
+        for msid, row in zip(msids, dat):
+            full = fetch.MSID(msid, time - 600, time + 600)
+            unix_time = fetch.timeconv.cxcsec_to_unix(time)
+            if method == 'previous':
+                i = np.searchsorted(full.times, unix_time, side='right') - 1
+            else:
+                i = np.argmin(np.abs(full.times - unix_time))
+            assert np.isclose(row['times'], full.times[i], rtol=0, atol=1e-3)
+            assert row['vals'] == full.vals[i]
+
+    dat = fetch.snapshot('2008:291:12:00:00', ['tephin'], tolerance=1e-6)
+    assert np.isnan(dat['vals'][0])
@@ -0,0 +1,48 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import numpy as np
+
+from .. import latest
+from ..latest import LatestTable, read_latest, write_latest
+
+
+def test_latest_table_update():
+    table = LatestTable.empty(3)
+    table.update({'bbb': ([1.0, 2.0], [10.0, 20.0]), 'AAA': ([1.0], [5.0])})
+    assert table.msids.tolist() == ['AAA', 'BBB']
+    assert np.all(table.index(['BBB', 'CCC', 'AAA']) == [1, -1, 0])
+
+    # Oldest samples are dropped once n_samples are kept
+    table.update({'BBB': ([3.0, 4.0], [30.0, 40.0]), 'CCC': (np.arange(5.0), np.arange(5.0))})
+    assert table.msids.tolist() == ['AAA', 'BBB', 'CCC']
+    assert np.allclose(table.times[1], [2.0, 3.0, 4.0])
+    assert np.allclose(table.vals[1], [20.0, 30.0, 40.0])
+    assert np.allclose(table.vals[2], [2.0, 3.0, 4.0])
+    assert np.all(np.isnan(table.vals[0, :2])) and table.vals[0, 2] == 5.0
+
+    assert table.glob('?CC') == ['CCC']
+
+
+def test_read_write_latest(tmpdir):
+    filename = str(tmpdir.join('latest.pickle'))
+    assert read_latest(filename) is None
+
+    table = LatestTable.empty(2)
+    table.update({'AAA': ([1.0, 2.0], [3.0, 4.0])})
+    write_latest(filename, table)
+
+    table2 = read_latest(filename)
+    assert table2.msids.tolist() == ['AAA']
+    assert np.all(table2.vals == table.vals)
+
+
+def test_seed_latest(monkeypatch):
+    def read_latest_from_archive(MSID, n):
+        if MSID != 'AAA':
+            raise OSError('no archive files')
+        return np.arange(5.0)[-n:], np.arange(5.0)[-n:] * 10
+
+    monkeypatch.setattr(latest, '_read_latest_from_archive', read_latest_from_archive)
+    table = latest.seed_latest(['aaa', 'bbb'], 3)
+    assert table.msids.tolist() == ['AAA']
+    assert np.allclose(table.times[0], [2.0, 3.0, 4.0])
+    assert np.allclose(table.vals[0], [20.0, 30.0, 40.0])
@@ -0,0 +1,103 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import numpy as np
+import pytest
+
+from .. import openbins
+from .. import pyramid
+from .. import sketch
+
+
+def _add_chunks(times, vals, dt, size, n_chunks, rng):
+    """Add samples in random chunks and get the completed bins and open bin"""
+    splits = np.sort(rng.choice(np.arange(1, len(times)), n_chunks - 1, replace=False))
+    table = openbins.OpenBinTable()
+    out = []
+    for chunk_times, chunk_vals in zip(np.split(times, splits), np.split(vals, splits)):
+        bins, neg_times = table.add('TEST', 'X', chunk_times, chunk_vals, dt, size)
+        assert len(neg_times) == 0
+        out.append(bins)
+    moments = np.concatenate([bins.moments for bins in out])
+    sketches = None if size is None else np.concatenate([bins.sketches for bins in out])
+    vals = np.concatenate([bins.vals for bins in out])
+    return moments, sketches, vals, table.bins['TEST', 'X']
+
+
+def _bins(times, dt):
+    """Rows and indexes of the complete bins of ``times`` as for update_stats"""
+    indexes = np.arange(times[0] // dt, times[-1] // dt + 1)
+    rows = np.searchsorted(times, indexes * dt)
+    return rows, indexes.astype(np.int32)
+
+
+@pytest.mark.parametrize('n_chunks', [1, 7, 200])
+def test_add_samples_moments(n_chunks):
+    """Moments from chunks are the same as from all samples of each bin"""
+    rng = np.random.default_rng(0)
+    times = 1.6e9 + np.cumsum(rng.exponential(2.0, 5000))
+    # Gaps with empty bins and bins with one or two samples
+    times[2000:] += 500
+    times = np.concatenate([times[:3000], times[3000:3001] + 1000, times[3001:] + 2000])
+    vals = rng.normal(10.0, 3.0, len(times))
+    moments, _, mid_vals, state = _add_chunks(times, vals, 60, None, n_chunks, rng)
+
+    rows, indexes = _bins(times, 60)
+    expected = pyramid.calc_moments(times, vals, rows, indexes)
+    assert len(moments) == len(expected)
+    assert np.all(moments['index'] == expected['index'])
+    assert np.all(moments['n'] == expected['n'])
+    for name in ('min', 'max', 'sum', 'sumsq', 'weight', 'wsum', 'wsumsq'):
+        assert np.allclose(moments[name], expected[name], rtol=1e-12)
+
+    # Open bin has the samples after the last complete bin
+    assert state.moments['n'][0] == len(times) - rows[-1]
+    assert state.last_time == times[-1]
+
+    # Middle sample is the first at or after the middle of the bin
+    centers = (expected['index'] + 0.5) * 60
+    i_mids = np.minimum(np.searchsorted(times, centers), np.searchsorted(times, centers + 30) - 1)
+    assert np.all(mid_vals == vals[i_mids])
+
+
+def test_add_samples_sketches():
+    """Sketches from chunks give quantiles close to those of all samples"""
+    rng = np.random.default_rng(1)
+    times = 1.6e9 + np.arange(0, 86400 * 3, 1.0)
+    vals = rng.lognormal(0.0, 1.0, len(times))
+    _, sketches, _, _ = _add_chunks(times, vals, 86400, 32, 100, rng)
+
+    rows, indexes = _bins(times, 86400)
+    assert np.all(sketches['index'] == indexes[:-1][np.diff(rows) > 0])
+    probs = np.array([0.01, 0.16, 0.5, 0.84, 0.99])
+    for record, row0, row1 in zip(sketches, rows[:-1], rows[1:]):
+        bin_vals = np.sort(vals[row0:row1])
+        assert record['min'] == bin_vals[0]
+        assert record['max'] == bin_vals[-1]
+        assert np.isclose(record['weight'].sum(), len(bin_vals))
+        estimates = sketch.quantiles(record['mean'], record['weight'],
+                                     record['min'], record['max'], probs)
+        ranks = np.searchsorted(bin_vals, estimates) / len(bin_vals)
+        assert np.all(np.abs(ranks - probs) < 0.005)
+
+
+def test_add_samples_unit_weights():
+    """Bins of one or two samples have unit weights, as for binstats.time_weights"""
+    table = openbins.OpenBinTable()
+    table.add('TEST', 'X', [0.0, 10.0], [1.0, 2.0], 60)
+    bins0, _ = table.add('TEST', 'X', [70.0], [4.0], 60)
+    bins1, _ = table.add('TEST', 'X', [200.0], [5.0], 60)
+    assert table.index('TEST', 'X') == 3
+    moments = np.concatenate([bins0.moments, bins1.moments])
+    assert np.all(moments['index'] == [0, 1])
+    assert np.all(moments['weight'] == [2, 1])
+    assert np.all(moments['wsum'] == [3, 4])
+    assert np.all(np.concatenate([bins0.vals, bins1.vals]) == [2.0, 4.0])
+
+
+def test_open_bin_table_discard():
+    table = openbins.OpenBinTable()
+    assert not table.changed
+    table.add('TEST', 'X', [0.0, 10.0], [1.0, 2.0], 60)
+    assert ('TEST', 'X') in table and table.changed
+    table.discard('TEST', 'X')
+    assert ('TEST', 'X') not in table
+    assert table.index('TEST', 'X') is None
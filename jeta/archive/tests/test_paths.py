@@ -0,0 +1,56 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import os
+
+import pytest
+import pyyaks.context
+
+from .. import file_defs
+from ..paths import ArchivePaths, compile_template, render_template
+
+
+@pytest.mark.parametrize('filetype', sorted(file_defs.msid_files))
+def test_paths_match_context_dict(tmpdir, filetype):
+    """
+    Resolved paths are the same as rendering the msid_files ContextDict.
+    """
+    basedir = str(tmpdir)
+    ft = pyyaks.context.ContextDict('ft')
+    msid_files = pyyaks.context.ContextDict(basedir=basedir)
+    msid_files.update(file_defs.msid_files)
+    paths = ArchivePaths(file_defs.msid_files, msid_files)
+
+    with ft:
+        ft['content'] = 'tlm'
+        ft['msid'] = 'aogyrct1'
+        ft['interval'] = 'daily'
+        expected = msid_files[filetype].abs
+
+    assert paths.abs(filetype, 'tlm', 'aogyrct1', 'daily') == expected
+    assert paths.path(filetype, 'tlm', 'aogyrct1', 'daily') is \
+        paths.path(filetype, 'tlm', 'aogyrct1', 'daily')
+
+
+def test_paths_multiple_basedirs(tmpdir):
+    """
+    With several base directories the first one with an existing file is used.
+    """
+    dir1 = tmpdir.mkdir('dir1')
+    dir2 = tmpdir.mkdir('dir2')
+    paths = ArchivePaths(file_defs.msid_files, ':'.join([str(dir1), str(dir2)]))
+
+    # No file exists so the last directory is used
+    assert paths.abs('colnames') == os.path.join(str(dir2), 'colnames.pickle')
+
+    dir1.join('colnames.pickle').write('')
+    assert paths.abs('colnames') == os.path.join(str(dir1), 'colnames.pickle')
+
+
+def test_render_template():
+    parts = compile_template('data/{{ft.content}}/{{ft.msid | upper }}.h5')
+    assert render_template(parts, content='tlm', msid='tephin') == 'data/tlm/TEPHIN.h5'
+
+    with pytest.raises(ValueError):
+        render_template(parts, content='tlm')
+
+    with pytest.raises(ValueError):
+        compile_template('data/{{ft.content | lower}}')
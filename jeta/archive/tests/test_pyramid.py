@@ -0,0 +1,179 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import numpy as np
+import pytest
+import tables
+
+from .. import pyramid
+from .. import sketch
+from .. import timeconv
+
+
+def _moments(n=20000, seed=2):
+    rng = np.random.RandomState(seed)
+    times = 1.6e9 + np.cumsum(rng.exponential(20.0, n))
+    vals = rng.normal(size=n)
+    dt = pyramid.LEVELS['1min']
+    indexes = np.arange(times[0] // dt, times[-1] // dt + 2)
+    rows = np.searchsorted(times, indexes * dt)
+    return times, vals, pyramid.calc_moments(times, vals, rows, indexes)
+
+
+def test_fetch_start():
+    dt = pyramid.LEVELS['1h']
+    index0 = int(timeconv.cxcsec_to_unix(timeconv.date2secs('2021:001:00:00:00'))) // dt
+    now = timeconv.date2secs('2021:002:00:00:00')
+
+    # Stats indexes are unix time but the fetch start is CXC seconds
+    start = pyramid.fetch_start(index0, dt, now, 30 * 86400)
+    assert timeconv.secs2date(start) == '2020:366:23:51:40.000'
+
+    # No more than the lookback before now
+    start = pyramid.fetch_start(index0, dt, now, 3600)
+    assert start == now - 3600
+
+
+def test_calc_moments():
+    times, vals, moments = _moments()
+    assert np.all(moments['n'] > 0)
+    assert moments['n'].sum() == len(vals)
+    assert np.isclose(moments['sum'].sum(), vals.sum())
+    assert np.isclose(moments['sumsq'].sum(), np.sum(vals ** 2))
+    assert moments['min'].min() == vals.min()
+    assert moments['max'].max() == vals.max()
+
+    bins = times // 60
+    i = len(moments) // 2
+    in_bin = bins == moments['index'][i]
+    assert moments['n'][i] == np.count_nonzero(in_bin)
+    assert moments['min'][i] == vals[in_bin].min()
+
+
+def test_merge_moments():
+    times, vals, moments = _moments()
+    hourly = pyramid.merge_moments(moments, 60, 3600)
+    bins = (times // 3600).astype(int)
+    assert hourly['index'].tolist() == np.unique(bins).tolist()
+    for name in ('n', 'sum', 'weight', 'wsum'):
+        assert np.isclose(hourly[name].sum(), moments[name].sum())
+    for row in hourly[:5]:
+        in_bin = bins == row['index']
+        assert row['n'] == np.count_nonzero(in_bin)
+        assert np.isclose(row['sum'], vals[in_bin].sum())
+        assert row['max'] == vals[in_bin].max()
+
+    stats = pyramid.moment_stats(hourly)
+    assert np.all(np.abs(stats['mean']) < 1)
+    assert np.all(stats['std'] > 0)
+
+    # Merging levels step by step is the same as merging directly
+    daily = pyramid.merge_moments(hourly, 3600, 86400)
+    direct = pyramid.merge_moments(moments, 60, 86400)
+    assert np.array_equal(daily['n'], direct['n'])
+    assert np.allclose(daily['wsum'], direct['wsum'])
+
+
+def test_update_levels(tmpdir):
+    """
+    Coarser levels built incrementally from appends to the finest level match
+    a single build, and only complete bins are written.
+    """
+    times, vals, moments = _moments(n=50000)
+    dt = pyramid.LEVELS['1min']
+    indexes = np.arange(times[0] // dt, times[-1] // dt + 2)
+    rows = np.searchsorted(times, indexes * dt)
+    sketches = sketch.calc_sketches(vals, rows, indexes, sketch.SKETCH_SIZES['1min'])
+
+    def build(basedir, chunks):
+        def filename(level):
+            return str(basedir.join(level, 'AAA.h5'))
+        basedir.mkdir('1min')
+        for chunk in chunks:
+            with tables.open_file(filename('1min'), mode='a') as h5:
+                for node, records in zip(('data', 'sketch'), chunk):
+                    if h5.__contains__('/' + node):
+                        getattr(h5.root, node).append(records)
+                    else:
+                        h5.create_table(h5.root, node, records)
+            pyramid.update_levels(filename)
+        out = {}
+        for level in pyramid.LEVELS:
+            with tables.open_file(filename(level), mode='r') as h5:
+                out[level] = (h5.root.data[:] if h5.__contains__('/data') else None,
+                              h5.root.sketch[:] if h5.__contains__('/sketch') else None)
+        return out
+
+    once = build(tmpdir.mkdir('once'), [(moments, sketches)])
+    cuts = [0, 1000, 1001, 7000, 20000, len(moments)]
+    incremental = build(tmpdir.mkdir('incremental'),
+                        [(moments[i0:i1], sketches[i0:i1]) for i0, i1 in zip(cuts[:-1], cuts[1:])])
+
+    for level in ('1h', '1d'):
+        for node in (0, 1):
+            assert np.array_equal(once[level][node], incremental[level][node])
+        assert np.array_equal(once[level][0]['index'], once[level][1]['index'])
+        # The bin of the last record of the level below is not complete
+        dt = pyramid.LEVELS[level]
+        assert once[level][0]['index'][-1] == times[-1] // dt - 1
+
+    hourly = pyramid.merge_moments(moments, 60, 3600)[:-1]
+    assert np.array_equal(once['1h'][0]['n'], hourly['n'])
+    assert np.allclose(once['1h'][1]['weight'].sum(axis=1), hourly['n'])
+
+
+def test_update_levels_dry_run(tmpdir):
+    """A dry run computes the coarse records without creating any files"""
+    times, vals, moments = _moments()
+
+    def filename(level):
+        return str(tmpdir.join(level, 'AAA.h5'))
+
+    tmpdir.mkdir('1min')
+    with tables.open_file(filename('1min'), mode='w') as h5:
+        h5.create_table(h5.root, 'data', moments)
+
+    n_added = pyramid.update_levels(filename, dry_run=True)
+    assert n_added['1h'] == len(pyramid.merge_moments(moments, 60, 3600)) - 1
+    assert sorted(x.basename for x in tmpdir.listdir()) == ['1min']
+
+
+def test_tile():
+    ranges = {'1min': (0, 10 ** 9), '1h': (0, 10 ** 9), '1d': (0, 10 ** 9)}
+    tstart = 86400 * 10 - 3600 * 2 - 90.5
+    tstop = 86400 * 12 + 3600 + 30.0
+    tiles = pyramid.tile(tstart, tstop, ranges)
+    assert tiles == [pyramid.Tile(None, tstart, tstart + 30.5),
+                     pyramid.Tile('1min', (tstart + 30.5) // 60, 86400 * 10 // 60 - 120),
+                     pyramid.Tile('1h', 24 * 10 - 2, 24 * 10),
+                     pyramid.Tile('1d', 10, 12),
+                     pyramid.Tile('1h', 24 * 12, 24 * 12 + 1),
+                     pyramid.Tile(None, 86400 * 12 + 3600, tstop)]
+
+    # Tiles cover the interval without gaps
+    for tile0, tile1 in zip(tiles[:-1], tiles[1:]):
+        stop = tile0.stop * pyramid.LEVELS[tile0.level] if tile0.level else tile0.stop
+        start = tile1.start * pyramid.LEVELS[tile1.level] if tile1.level else tile1.start
+        assert stop == start
+
+    # Levels are only used where they have records
+    tiles = pyramid.tile(tstart, tstop, {'1h': (24 * 11, 24 * 11 + 5)})
+    assert tiles == [pyramid.Tile(None, tstart, 86400 * 11),
+                     pyramid.Tile('1h', 24 * 11, 24 * 11 + 5),
+                     pyramid.Tile(None, 86400 * 11 + 5 * 3600, tstop)]
+
+
+@pytest.mark.parametrize('gaps', [False, True])
+def test_search_index(tmpdir, gaps):
+    rng = np.random.RandomState(4)
+    step = rng.randint(1, 5, 5000) if gaps else np.ones(5000, dtype=int)
+    index = (1000 + np.cumsum(step)).astype(np.int32)
+    records = np.zeros(len(index), dtype=pyramid.MOMENTS_DTYPE)
+    records['index'] = index
+    with tables.open_file(str(tmpdir.join('AAA.h5')), mode='w') as h5:
+        table = h5.create_table(h5.root, 'data', records)
+        assert pyramid.search_index(table, 0) == 0
+        for value in [index[0], index[-1], index[-1] + 1, index[-1] + 100] + list(
+                rng.randint(index[0] - 10, index[-1] + 10, 50)):
+            assert pyramid.search_index(table, int(value)) == np.searchsorted(index, value)
+
+        empty = h5.create_table(h5.root, 'empty', records[:0])
+        assert pyramid.search_index(empty, 5) == 0
@@ -0,0 +1,63 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import numpy as np
+
+from .. import sketch
+
+
+def _sketches(n=100000, dt=3600, size=32, seed=3):
+    rng = np.random.RandomState(seed)
+    times = 27 * 86400 * 686 + np.arange(n) * 10.0
+    vals = rng.lognormal(size=n)
+    indexes = np.arange(times[0] // dt, times[-1] // dt + 2)
+    rows = np.searchsorted(times, indexes * dt)
+    return times, vals, sketch.calc_sketches(vals, rows, indexes, size)
+
+
+def test_compress():
+    means = np.array([5.0, 1.0, 3.0, 2.0, 4.0, 10.0])
+    weights = np.array([1.0, 1.0, 1.0, 0.0, 1.0, 2.0])
+    groups = np.array([0, 0, 0, 0, 0, 2])
+    out_means, out_weights = sketch.compress(means, weights, groups, 3, 4)
+    assert out_means.shape == out_weights.shape == (3, 4)
+    assert out_weights.sum(axis=1).tolist() == [4.0, 0.0, 2.0]
+    assert np.isclose(np.sum(out_means[0] * out_weights[0]), 13.0)
+    assert np.all(out_means[2][out_weights[2] > 0] == 10.0)
+
+    # Few samples keep one centroid per sample
+    assert sorted(out_means[0][out_weights[0] > 0]) == [1.0, 3.0, 4.0, 5.0]
+
+
+def test_calc_sketches():
+    times, vals, sketches = _sketches()
+    bins = times // 3600
+    assert sketches['index'].tolist() == np.unique(bins).tolist()
+    assert np.allclose(sketches['weight'].sum(axis=1),
+                       np.bincount((bins - bins[0]).astype(int)))
+    assert sketches['min'].min() == vals.min()
+    assert sketches['max'].max() == vals.max()
+
+    in_bin = bins == sketches['index'][3]
+    row = sketches[3]
+    assert np.isclose(np.sum(row['mean'] * row['weight']), vals[in_bin].sum())
+
+
+def test_quantiles():
+    """
+    Percentiles from sketches merged up to a single bin are close to the
+    percentiles of the samples.
+    """
+    times, vals, sketches = _sketches()
+    merged = sketch.merge_sketches(sketches, 3600, 86400 * 27, 32)
+    assert len(merged) == 1
+    assert merged['weight'].sum() == len(vals)
+
+    probs = np.array([0.0, 0.01, 0.05, 0.5, 0.95, 0.99, 1.0])
+    out = sketch.quantiles(merged['mean'], merged['weight'], merged['min'][0],
+                           merged['max'][0], probs)
+    assert out[0] == vals.min()
+    assert out[-1] == vals.max()
+    # Rank error of the estimates
+    ranks = np.searchsorted(np.sort(vals), out) / len(vals)
+    assert np.all(np.abs(ranks[1:-1] - probs[1:-1]) < 0.005)
+
+    assert np.all(np.isnan(sketch.quantiles([], [], np.nan, np.nan, probs)))
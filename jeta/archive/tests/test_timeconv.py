@@ -0,0 +1,53 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+import numpy as np
+import pytest
+from astropy.time import Time
+
+from .. import timeconv
+
+# Random times from 1992 to 2026 plus times around the 2016-12-31 leap second
+_rng = np.random.default_rng(0)
+LEAP_DAY = Time('2016-12-31T00:00:00', scale='utc').cxcsec
+SECS = np.concatenate([_rng.uniform(-2e8, 9e8, 10000),
+                       LEAP_DAY + _rng.uniform(-10, 86411, 1000),
+                       LEAP_DAY + 86400 + np.arange(-2, 2, 0.25)])
+
+
+def test_cxcsec_unix_jd():
+    times = Time(SECS, format='cxcsec')
+    unix = times.unix
+    jd = times.utc.jd
+
+    assert np.allclose(timeconv.cxcsec_to_unix(SECS), unix, rtol=0, atol=1e-6)
+    assert np.allclose(timeconv.unix_to_cxcsec(unix), SECS, rtol=0, atol=1e-6)
+    assert np.allclose(timeconv.cxcsec_to_jd(SECS), jd, rtol=0, atol=1e-9)
+    assert np.allclose(timeconv.jd_to_cxcsec(jd), Time(jd, format='jd').cxcsec, rtol=0, atol=1e-6)
+    assert np.allclose(timeconv.jd_to_unix(jd), Time(jd, format='jd').unix, rtol=0, atol=1e-6)
+    assert np.allclose(timeconv.unix_to_jd(unix), Time(unix, format='unix').jd, rtol=0, atol=1e-9)
+    assert np.allclose(timeconv.ms_to_jd(unix * 1000), Time(unix, format='unix').jd,
+                       rtol=0, atol=1e-9)
+
+
+def test_in_place_and_scalar():
+    secs = SECS.copy()
+    jd = timeconv.cxcsec_to_jd(secs, out=secs)
+    assert jd is secs
+    assert np.all(jd == timeconv.cxcsec_to_jd(SECS))
+
+    jd = timeconv.cxcsec_to_jd(SECS[0])
+    assert np.isscalar(jd)
+    assert jd == timeconv.cxcsec_to_jd(SECS[:1])[0]
+
+
+def test_secs2date():
+    dates = timeconv.secs2date(SECS)
+    ref = Time(SECS, format='cxcsec').utc.yday
+    # Allow for differences in rounding to the nearest millisecond
+    assert np.count_nonzero(dates != ref) < len(SECS) // 1000
+    assert timeconv.secs2date(LEAP_DAY + 86400.5) == '2016:366:23:59:60.500'
+
+
+@pytest.mark.parametrize('date', ['2010:001', '2016:366:23:59:60.500', '2020:123:01:02:03.456'])
+def test_to_secs(date):
+    assert np.isclose(timeconv.to_secs(date), Time(date).cxcsec, rtol=0, atol=1e-6)
+    assert timeconv.to_secs(12345.0) == 12345.0
@@ -1,7 +1,9 @@
 # Licensed under a 3-clause BSD style license - see LICENSE.rst
 import numpy as np
 
-from ..utils import get_fetch_size
+import os
+
+from ..utils import get_fetch_size, map_msids
 from .. import fetch
 
 
@@ -56,3 +58,23 @@ def test_get_fetch_size_accuracy():
     dat.interpolate(328.0 * 2)
     fetch_bytes = sum(getattr(dat, attr).nbytes for attr in dat.colnames)
     assert np.isclose(out_mb, fetch_bytes / 1e6, rtol=0.0, atol=0.01)
+
+
+def _name_and_pid(MSIDs, suffix):
+    return [(MSID + suffix, os.getpid()) for MSID in MSIDs]
+
+
+def test_map_msids():
+    """
+    Results of MSIDs split between worker processes are in the order of the MSIDs.
+    """
+    MSIDs = ['M{}'.format(i) for i in range(7)]
+    for workers in (1, 3):
+        out = map_msids(_name_and_pid, MSIDs, ('_X',), workers)
+        assert [name for name, pid in out] == [MSID + '_X' for MSID in MSIDs]
+        in_process = set(pid for name, pid in out) == {os.getpid()}
+        assert in_process == (workers == 1)
+
+    # At least msids_per_worker MSIDs per worker
+    out = map_msids(_name_and_pid, MSIDs, ('',), workers=3, msids_per_worker=4)
+    assert set(pid for name, pid in out) == {os.getpid()}
@@ -0,0 +1,322 @@
+# Licensed under a 3-clause BSD style license - see LICENSE.rst
+"""
+Fast vectorized conversion between the numeric time scales used by the archive.
+
+The archive stores absolute times as UTC Julian dates, MSID times are unix
+seconds and the fetch API accepts CXC seconds (seconds since 1998-01-01
+00:00:00 TT, as used by Chandra.Time ``secs`` and astropy ``cxcsec``).  The
+conversions here give the same values as the equivalent astropy ``Time``
+conversions but work directly on float64 arrays, optionally in place, without
+the overhead of constructing ``Time`` objects.
+
+As in astropy (ERFA), on a UTC day that ends with a leap second the unix and
+JD representations are scaled over the 86401 SI seconds of the day.  Leap
+seconds are taken from a built-in table, extended by the ERFA table if it is
+available.  Times before 1972 are not supported.
+"""
+from __future__ import print_function, division, absolute_import
+
+import re
+
+import numpy as np
+
+from jeta.archive import cache
+
+# Julian date of the unix epoch 1970-01-01 00:00:00 UTC
+JD_UNIX_EPOCH = 2440587.5
+
+# Unix time plus TAI-UTC for CXC seconds = 0 (1998-01-01 00:00:00 TT)
+CXCSEC_TAI_UNIX = 883612800.0 - 32.184
+
+# Leap seconds as (year, month, TAI-UTC) where TAI-UTC applies from the start
+# of the month.
+LEAP_SECONDS = (
+    (1972, 1, 10), (1972, 7, 11), (1973, 1, 12), (1974, 1, 13), (1975, 1, 14),
+    (1976, 1, 15), (1977, 1, 16), (1978, 1, 17), (1979, 1, 18), (1980, 1, 19),
+    (1981, 7, 20), (1982, 7, 21), (1983, 7, 22), (1985, 7, 23), (1988, 1, 24),
+    (1990, 1, 25), (1991, 1, 26), (1992, 7, 27), (1993, 7, 28), (1994, 7, 29),
+    (1996, 1, 30), (1997, 7, 31), (1999, 1, 32), (2006, 1, 33), (2009, 1, 34),
+    (2012, 7, 35), (2015, 7, 36), (2017, 1, 37),
+)
+
+RE_DATE = re.compile(r'^(\d{4}):(\d{3})(?::(\d{2})(?::(\d{2})(?::(\d{2}(?:\.\d*)?))?)?)?$')
+
+
+@cache.lru_cache(1)
+def leap_second_table():
+    """
+    Get the leap second table.
+
+    :returns: tuple (unix, tai_utc, leap) of arrays giving the unix time at
+              which each TAI-UTC value takes effect, the value, and whether
+              the day before ends with a leap second
+    """
+    leap_seconds = [tuple(row) for row in LEAP_SECONDS]
+    try:
+        import erfa
+        for year, month, tai_utc in erfa.leap_seconds.get():
+            if (year, month) > leap_seconds[-1][:2]:
+                leap_seconds.append((int(year), int(month), float(tai_utc)))
+    except Exception:
+        pass
+
+    months = np.array(['{:04d}-{:02d}'.format(year, month)
+                       for year, month, _ in leap_seconds], dtype='datetime64[M]')
+    unix = months.astype('datetime64[D]').astype(np.int64) * 86400.0
+    tai_utc = np.array([row[2] for row in leap_seconds], dtype=np.float64)
+    leap = np.concatenate([[False], np.diff(tai_utc) == 1])
+
+    return unix, tai_utc, leap
+
+
+def _as_array(times, out):
+    """Return float64 input array and output array for ``times``"""
+    times = np.asarray(times, dtype=np.float64)
+    if out is None:
+        out = np.empty_like(times)
+    return times, out
+
+
+def _result(out):
+    """Return a float instead of a 0-d array for scalar input"""
+    return out[()] if out.ndim == 0 else out
+
+
+def _tai_to_unix(tai, out):
+    """
+    Convert ``tai`` (unix time plus TAI-UTC) to unix time.  ``out`` may be the
+    same array as ``tai``.
+    """
+    unix0, tai_utc, leap = leap_second_table()
+    tai0 = unix0 + tai_utc
+    k = np.clip(np.searchsorted(tai0, tai, side='right') - 1, 0, None)
+
+    # Times on a day ending with a leap second, which is scaled to 86401 sec
+    k1 = np.minimum(k + 1, len(leap) - 1)
+    day_start = unix0[k1] - 86400.0
+    tai_day_start = day_start + tai_utc[k]
+    smear = leap[k1] & (k1 > k) & (tai >= tai_day_start)
+
+    if np.any(smear):
+        unix_smear = day_start[smear] + (tai[smear] - tai_day_start[smear]) * (86400.0 / 86401.0)
+        np.subtract(tai, tai_utc[k], out=out)
+        out[smear] = unix_smear
+    else:
+        np.subtract(tai, tai_utc[k], out=out)
+
+    return out
+
+
+def _unix_to_tai(unix, out):
+    """
+    Convert unix time to unix time plus TAI-UTC.  ``out`` may be the same
+    array as ``unix``.
+    """
+    unix0, tai_utc, leap = leap_second_table()
+    k = np.clip(np.searchsorted(unix0, unix, side='right') - 1, 0, None)
+
+    k1 = np.minimum(k + 1, len(leap) - 1)
+    day_start = unix0[k1] - 86400.0
+    smear = leap[k1] & (k1 > k) & (unix >= day_start)
+
+    if np.any(smear):
+        tai_smear = (day_start[smear] + tai_utc[k][smear]
+                     + (unix[smear] - day_start[smear]) * (86401.0 / 86400.0))
+        np.add(unix, tai_utc[k], out=out)
+        out[smear] = tai_smear
+    else:
+        np.add(unix, tai_utc[k], out=out)
+
+    return out
+
+
+def unix_to_jd(unix, out=None):
+    """
+    Convert unix time to UTC Julian date.
+
+    :param unix: unix time (float or array)
+    :param out: output array, which may be ``unix`` for an in-place conversion
+    :returns: JD
+    """
+    unix, out = _as_array(unix, out)
+    np.divide(unix, 86400.0, out=out)
+    out += JD_UNIX_EPOCH
+    return _result(out)
+
+
+def jd_to_unix(jd, out=None):
+    """
+    Convert UTC Julian date to unix time.
+
+    :param jd: JD (float or array)
+    :param out: output array, which may be ``jd`` for an in-place conversion
+    :returns: unix time
+    """
+    jd, out = _as_array(jd, out)
+    np.subtract(jd, JD_UNIX_EPOCH, out=out)
+    out *= 86400.0
+    return _result(out)
+
+
+def ms_to_jd(ms, out=None):
+    """
+    Convert unix time in milliseconds (as in ingest files) to UTC Julian date.
+
+    :param ms: unix time in milliseconds (float or array)
+    :param out: output array, which may be ``ms`` for an in-place conversion
+    :returns: JD
+    """
+    ms, out = _as_array(ms, out)
+    np.divide(ms, 1000.0, out=out)
+    return unix_to_jd(out, out=out)
+
+
+def ms_to_unix(ms, out=None):
+    """
+    Convert unix time in milliseconds to unix time in seconds.
+
+    :param ms: unix time in milliseconds (float or array)
+    :param out: output array, which may be ``ms`` for an in-place conversion
+    :returns: unix time
+    """
+    ms, out = _as_array(ms, out)
+    np.divide(ms, 1000.0, out=out)
+    return _result(out)
+
+
+def cxcsec_to_unix(secs, out=None):
+    """
+    Convert CXC seconds to unix time.
+
+    :param secs: CXC seconds (float or array)
+    :param out: output array, which may be ``secs`` for an in-place conversion
+    :returns: unix time
+    """
+    secs, out = _as_array(secs, out)
+    np.add(secs, CXCSEC_TAI_UNIX, out=out)
+    return _result(_tai_to_unix(out, out))
+
+
+def unix_to_cxcsec(unix, out=None):
+    """
+    Convert unix time to CXC seconds.
+
+    :param unix: unix time (float or array)
+    :param out: output array, which may be ``unix`` for an in-place conversion
+    :returns: CXC seconds
+    """
+    unix, out = _as_array(unix, out)
+    _unix_to_tai(unix, out)
+    out -= CXCSEC_TAI_UNIX
+    return _result(out)
+
+
+def cxcsec_to_jd(secs, out=None):
+    """
+    Convert CXC seconds to UTC Julian date.
+
+    :param secs: CXC seconds (float or array)
+    :param out: output array, which may be ``secs`` for an in-place conversion
+    :returns: JD
+    """
+    secs, out = _as_array(secs, out)
+    cxcsec_to_unix(secs, out=out)
+    return unix_to_jd(out, out=out)
+
+
+def jd_to_cxcsec(jd, out=None):
+    """
+    Convert UTC Julian date to CXC seconds.
+
+    :param jd: JD (float or array)
+    :param out: output array, which may be ``jd`` for an in-place conversion
+    :returns: CXC seconds
+    """
+    jd, out = _as_array(jd, out)
+    jd_to_unix(jd, out=out)
+    return unix_to_cxcsec(out, out=out)
+
+
+def secs2date(secs):
+    """
+    Format CXC seconds as UTC dates in the 'YYYY:DOY:HH:MM:SS.sss' format of
+    ``Chandra.Time.DateTime.date``.
+
+    :param secs: CXC seconds (float or array)
+    :returns: date string or array of date strings
+    """
+    secs = np.asarray(secs, dtype=np.float64)
+    unix0, tai_utc, leap = leap_second_table()
+
+    # Whole milliseconds since the unix epoch in the TAI-like scale, then split
+    # into UTC day and time of day.  During a leap second the time of day runs
+    # past 86400 sec.
+    tai_ms = np.round((secs + CXCSEC_TAI_UNIX) * 1000.0)
+    tai0_ms = (unix0 + tai_utc) * 1000.0
+    k = np.clip(np.searchsorted(tai0_ms, tai_ms, side='right') - 1, 0, None)
+    utc_ms = (tai_ms - tai_utc[k] * 1000.0).astype(np.int64)
+    days, day_ms = np.divmod(utc_ms, 86400000)
+
+    k1 = np.minimum(k + 1, len(leap) - 1)
+    in_leap = leap[k1] & (k1 > k) & (tai_ms >= tai0_ms[k1] - 1000.0)
+    days = np.where(in_leap, days - 1, days)
+    day_ms = np.where(in_leap, day_ms + 86400000, day_ms)
+
+    dates = days.astype('datetime64[D]')
+    years = dates.astype('datetime64[Y]')
+    doys = (dates - years.astype('datetime64[D]')).astype(np.int64) + 1
+    years = years.astype(np.int64) + 1970
+    hours, day_ms = np.divmod(day_ms, 3600000)
+    hours = np.where(in_leap, 23, hours)
+    mins, day_ms = np.divmod(day_ms, 60000)
+    mins = np.where(in_leap, 59, mins)
+    day_ms = np.where(in_leap, day_ms + 60000, day_ms)
+
+    out = np.array(['{:04d}:{:03d}:{:02d}:{:02d}:{:06.3f}'.format(*vals)
+                    for vals in zip(years.ravel(), doys.ravel(), hours.ravel(), mins.ravel(),
+                                    day_ms.ravel() / 1000.0)]).reshape(secs.shape)
+    return out[()] if out.ndim == 0 else out
+
+
+def date2secs(date):
+    """
+    Convert a UTC date in the 'YYYY:DOY[:HH[:MM[:SS.sss]]]' format to CXC
+    seconds.
+
+    :param date: date string
+    :returns: CXC seconds
+    """
+    match = RE_DATE.match(date.strip())
+    if match is None:
+        raise ValueError('date {!r} is not in YYYY:DOY:HH:MM:SS format'.format(date))
+
+    year, doy, hour, minute, sec = match.groups()
+    day = (np.datetime64(year, 'D') - np.datetime64('1970-01-01', 'D')).astype(np.int64)
+    unix = (day + int(doy) - 1) * 86400.0
+
+    unix0, tai_utc, _ = leap_second_table()
+    k = max(np.searchsorted(unix0, unix, side='right') - 1, 0)
+    day_secs = int(hour or 0) * 3600 + int(minute or 0) * 60 + float(sec or 0.0)
+
+    return unix + tai_utc[k] + day_secs - CXCSEC_TAI_UNIX
+
+
+def to_secs(time):
+    """
+    Convert ``time`` to CXC seconds.
+
+    Numbers are taken to already be CXC seconds and dates in the
+    'YYYY:DOY:HH:MM:SS.sss' format are converted directly.  Any other input is
+    converted with ``Chandra.Time.DateTime``.
+
+    :param time: any ``DateTime`` compatible time
+    :returns: CXC seconds
+    """
+    if isinstance(time, (int, float, np.integer, np.floating)):
+        return float(time)
+
+    if isinstance(time, str) and RE_DATE.match(time.strip()):
+        return date2secs(time)
+
+    from Chandra.Time import DateTime
+    return DateTime(time).secs
@@ -59,9 +59,9 @@ logger.propagate = False
 SYSTEMS = set(('cxc', 'eng', 'sci'))
 module_dir = os.environ['JETA_SCRIPTS']  # os.path.dirname(__file__)
 
+# Units definitions for each system are loaded on first use by load_units()
 units = {}
 units['system'] = 'cxc'
-units['cxc'] = pickle.load(open(os.path.join(module_dir, 'units_cxc.pkl'), 'rb'))
 
 
 # Equivalent unit descriptors used in 'eng' and 'cxc' units
@@ -208,11 +208,13 @@ def set_units(unit_system):
 
 def get_msid_unit(msid):
     MSID = msid.upper()
+    load_units(units['system'])
     return units[units['system']].get(MSID)
 
 
 def convert(msid, vals, delta_val=False):
     MSID = msid.upper()
+    load_units('cxc')
     conversion = (units['cxc'].get(MSID), get_msid_unit(MSID))
     try:
         vals = converters[conversion](vals, delta_val)
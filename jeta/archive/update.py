@@ -8,16 +8,17 @@ import os
 import glob
 import time
 import pickle
+import datetime
 from random import seed
 import shutil
 import argparse
 import itertools
+import traceback
+import multiprocessing
+import concurrent.futures
 
 from collections import OrderedDict, defaultdict, deque
 
-from astropy.time import Time
-from Chandra.Time import DateTime
-
 # import Ska.File
 import Ska.DBI
 import Ska.Numpy
@@ -27,10 +28,18 @@ import pyyaks.context
 import h5py
 import tables
 import numpy as np
-import scipy.stats.mstats
 
 import jeta.archive.fetch as fetch
+import jeta.archive.binstats as binstats
+import jeta.archive.pyramid as pyramid
+import jeta.archive.sketch as sketch
+import jeta.archive.committed as committed
+import jeta.archive.coverage as coverage
+import jeta.archive.latest as latest
+import jeta.archive.openbins as openbins
 import jeta.archive.file_defs as file_defs
+import jeta.archive.timeconv as timeconv
+from jeta.archive.paths import ArchivePaths
 import jeta.archive.derived as derived
 from jeta.archive.utils import get_env_variable
 
@@ -50,7 +59,7 @@ def get_options(args=None):
                         action="store_false",
                         dest="update_stats",
                         default=True,
-                        help="Do not update 5 minute and daily stats archive")
+                        help="Do not update 5 minute and daily stats archive during ingest")
     parser.add_argument("--create",
                         action="store_true",
                         help="Create the MSID H5 files from scratch")
@@ -61,7 +70,7 @@ def get_options(args=None):
                         default=60,
                         help="Maximum look back time for updating statistics (days)")
     parser.add_argument("--date-now",
-                        default=DateTime().date,
+                        default=timeconv.secs2date(timeconv.unix_to_cxcsec(time.time())),
                         help="Set effective processing date for testing (default=NOW)")
     parser.add_argument("--date-start",
                         default=None,
@@ -94,6 +103,20 @@ def get_options(args=None):
                         choices={"h5", "csv"},
                         help=("Select the format of the ingest file type \
                              as either hdf5 or csv (default = h5)"))
+    parser.add_argument("--stats-from-archive",
+                        action="store_true",
+                        help=("Update the stats by re-reading the full-resolution archive, "
+                              "e.g. after --create or --no-stats (stats are otherwise "
+                              "updated during ingest)"))
+    parser.add_argument("--stats-workers",
+                        type=int,
+                        help=("Number of worker processes for the stats update "
+                              "(default=number of CPUs)"))
+    parser.add_argument("--latest-samples",
+                        type=int,
+                        default=latest.LATEST_SAMPLES,
+                        help=("Number of latest samples per MSID kept for fetch.latest "
+                              "(default={})".format(latest.LATEST_SAMPLES)))
 
     return parser.parse_args(args)
 
@@ -135,6 +158,9 @@ ft = fetch.ft
 msid_files = pyyaks.context.ContextDict('update.msid_files',
                                         basedir=ENG_ARCHIVE)
 msid_files.update(file_defs.msid_files)
+# Cached resolver of the same file paths as ``msid_files`` for the per-MSID
+# loops, where the content type is taken from the current ``ft`` context.
+msid_paths = ArchivePaths(file_defs.msid_files, msid_files)
 arch_files = pyyaks.context.ContextDict('update.arch_files',
                                         basedir=ENG_ARCHIVE)
 arch_files.update(file_defs.arch_files)
@@ -168,7 +194,6 @@ _counts = None
 
 def _create_msid_time_dataset(msid, h5):
 
-    ft['msid'] = msid
     avg_msids_rows_per_ingest = len(_values[msid])
 
     expectedrows = (avg_msids_rows_per_ingest
@@ -193,7 +218,6 @@ def _create_msid_time_dataset(msid, h5):
 
 def _create_msid_value_dataset(msid, h5):
 
-    ft['msid'] = msid
     avg_msids_rows_per_ingest = len(_values[msid])
 
     expectedrows = (avg_msids_rows_per_ingest
@@ -228,19 +252,20 @@ def _create_msid_directories(msids):
 
     """
 
+    content = ft['content'].val
     for msid in msids:
-        ft['msid'] = msid
-        msid_directory_path = msid_files['msid'].abs
+        msid_directory_path = msid_paths.abs('msid', content, msid)
         if not os.path.exists(msid_directory_path):
             logger.info(f"Creating new archive directory for {msid} ...")
             os.makedirs(msid_directory_path)
 
 
 def _create_archive_files(msids):
+    content = ft['content'].val
     for msid in msids:
-        ft['msid'] = msid
+        values_filepath = msid_paths.abs('mnemonic_value', content, msid)
 
-        if not os.path.exists(msid_files['mnemonic_value'].abs):
+        if not os.path.exists(values_filepath):
             logger.info((
                 f"Creating new archive files"
                 f"(times.h5, values.h5) for {msid} ... "
@@ -248,11 +273,11 @@ def _create_archive_files(msids):
 
             try:
                 values_h5 = tables.open_file(
-                    msid_files['mnemonic_value'].abs,
+                    values_filepath,
                     mode='w'
                 )
                 times_h5 = tables.open_file(
-                    msid_files['mnemonic_times'].abs,
+                    msid_paths.abs('mnemonic_times', content, msid),
                     mode='w'
                 )
                 times_h5.close()
@@ -316,7 +341,7 @@ def _aggregate_dataset_samples(samples, large_sample, offset):
     return large_sample, offset
 
 
-def _update_index_file(msid, epoch, index):
+def _update_index_file(msid, epoch, index, dts=None):
     """ Update the index file
 
         Parameters
@@ -325,11 +350,15 @@ def _update_index_file(msid, epoch, index):
             the index file path
         epoch : float
             the time
+        index : int
+            the archive row of the first sample of the epoch
+        dts : np.ndarray, optional
+            the delta times appended for the epoch, used to extend the
+            sparse time index
     """
     # filters = tables.Filters(complevel=5, complib='zlib')
-    ft['msid'] = msid
     h5 = tables.open_file(
-        msid_files['mnemonic_index'].abs,
+        msid_paths.abs('mnemonic_index', ft['content'].val, msid),
         driver="H5FD_CORE",
         mode="a"
     )
@@ -349,12 +378,59 @@ def _update_index_file(msid, epoch, index):
             table.row['epoch'] = epoch
             table.row.append()
             table.flush()
+
+            if dts is not None and len(dts) > 0:
+                _append_sparse_index(h5, epoch, index, dts)
         except Exception as err:
             raise ValueError(f"Could not create epoch: {err}")
         finally:
             h5.close()
 
 
+def _append_sparse_index(h5, epoch, index, dts):
+    """ Append sparse time index records for a new epoch
+
+        A record is written for every archive row that is a multiple of
+        ``fetch.SPARSE_INDEX_ROWS`` with the absolute time (JD) of that row and
+        the accumulated delta time of the epoch up to the previous row.  Fetch
+        uses these records to narrow the rows read for short intervals.
+
+        Parameters
+        ----------
+        h5 : tables.File
+            the open index file
+        epoch : float
+            the epoch (JD) of the appended rows
+        index : int
+            the archive row of the first appended row
+        dts : np.ndarray
+            the delta times of the appended rows
+    """
+    if h5.__contains__('/sparse') is False:
+        compound_datatype = np.dtype([
+            ('index', np.uint64),
+            ('time', np.float64),
+            ('offset', np.float64),
+        ])
+        table = h5.create_table(h5.root, 'sparse', compound_datatype)
+        table.attrs.rows_per_anchor = fetch.SPARSE_INDEX_ROWS
+    else:
+        table = h5.root.sparse
+
+    n_rows = int(table.attrs.rows_per_anchor)
+    offsets = np.cumsum(dts)
+    rows = np.arange(-int(index) % n_rows, len(dts), n_rows)
+    if len(rows) == 0:
+        return
+
+    anchors = np.zeros(len(rows), dtype=table.dtype)
+    anchors['index'] = int(index) + rows
+    anchors['time'] = epoch + offsets[rows]
+    anchors['offset'] = np.where(rows > 0, offsets[rows - 1], 0.0)
+    table.append(anchors)
+    table.flush()
+
+
 def get_colnames():
     """Get column names for the current content type (defined by ft['content'])
     """
@@ -477,10 +553,8 @@ def main():
             else:
                 update_archive(filetype)
 
-        if opt.update_stats:
-            for colname in colnames:
-                msid = update_stats(colname, 'daily')
-                update_stats(colname, '5min', msid)
+        if opt.stats_from_archive:
+            update_all_stats(colnames)
 
         logger.info(f'SUCCESS: Telemetry Archive Sync Complete.')
 
@@ -583,7 +657,7 @@ def del_stats(colname, time0, interval):
     if not os.path.exists(stats_file):
         raise IOError('Stats file {} not found'.format(stats_file))
 
-    logger.info('Fixing stats file %s after time %s', stats_file, DateTime(time0).date)
+    logger.info('Fixing stats file %s after time %s', stats_file, timeconv.secs2date(time0))
 
     stats = tables.open_file(stats_file, mode='a',
                             filters=tables.Filters(complevel=5, complib='zlib'))
@@ -595,7 +669,7 @@ def del_stats(colname, time0, interval):
     else:
         n_del = stats.root.data.removeRows(row0, len(stats.root.data))
     logger.info('Deleted %d rows from row %s (%s) to end', n_del, row0,
-                DateTime(indexes[row0] * dt).date)
+                timeconv.secs2date(indexes[row0] * dt))
     stats.close()
 
 
@@ -637,71 +711,227 @@ def calc_stats_vals(msid, rows, indexes, interval):
         for raw_count, state_code in msid.state_codes:
             out['n_' + fix_state_code(state_code)] = np.zeros(n_out, dtype=np.int32)
 
-    i = 0
-    for row0, row1, index in zip(rows[:-1], rows[1:], indexes[:-1]):
-        vals = msid.vals[row0:row1]
-        times = msid.times[row0:row1]
-
-        n_vals = len(vals)
-        if n_vals > 0:
-            out['index'][i] = index
-            out['n'][i] = n_vals
-            out['val'][i] = vals[n_vals // 2]
-            if msid_is_numeric:
-                if n_vals <= 2:
-                    dts = np.ones(n_vals, dtype=np.float64)
-                else:
-                    dts = np.empty(n_vals, dtype=np.float64)
-                    dts[0] = times[1] - times[0]
-                    dts[-1] = times[-1] - times[-2]
-                    dts[1:-1] = ((times[1:-1] - times[:-2]) +
-                                 (times[2:] - times[1:-1])) / 2.0
-                    negs = dts < 0.0
-                    if np.any(negs):
-                        times_dts = [(DateTime(t).date, dt)
-                                     for t, dt in zip(times[negs], dts[negs])]
-                        logger.warning('WARNING - negative dts in {} at {}'
-                                       .format(msid.MSID, times_dts))
-
-                    # Clip to range 0.001 to 300.0.  The low bound is just there
-                    # for data with identical time stamps.  This shouldn't happen
-                    # but in practice might.  The 300.0 represents 5 minutes and
-                    # is the largest normal time interval.  Data near large gaps
-                    # will get a weight of 5 mins.
-                    dts.clip(0.001, 300.0, out=dts)
-                sum_dts = np.sum(dts)
-
-                out['min'][i] = np.min(vals)
-                out['max'][i] = np.max(vals)
-                out['mean'][i] = np.sum(dts * vals) / sum_dts
-                if interval == 'daily':
-                    # biased weighted estimator of variance (N should be big enough)
-                    # http://en.wikipedia.org/wiki/Mean_square_weighted_deviation
-                    sigma_sq = np.sum(dts * (vals - out['mean'][i]) ** 2) / sum_dts
-                    out['std'][i] = np.sqrt(sigma_sq)
-                    quant_vals = scipy.stats.mstats.mquantiles(vals, np.array(quantiles) / 100.0)
-                    for quant_val, quantile in zip(quant_vals, quantiles):
-                        out['p%02d' % quantile][i] = quant_val
-
-            if msid.state_codes:
-                # If MSID has state codes then count the number of values in each state
-                # and store.  The MSID values can have trailing spaces to fill out to a
-                # uniform length, so state_code is right padded accordingly.
-                max_len = max(len(state_code) for raw_count, state_code in msid.state_codes)
-                fmtstr = '{:' + str(max_len) + 's}'
-                for raw_count, state_code in msid.state_codes:
-                    state_count = np.count_nonzero(vals == fmtstr.format(state_code))
-                    out['n_' + fix_state_code(state_code)][i] = state_count
-
-            i += 1
+    # Only bins with data are output.  The rows of the bins are contiguous, so
+    # the non-empty bins are segments of the rows starting at row0.
+    rows = np.asarray(rows)
+    ns = np.diff(rows)
+    ok = ns > 0
+    row0 = rows[0]
+    vals = msid.vals[row0:rows[-1]]
+    times = msid.times[row0:rows[-1]]
+    starts = rows[:-1][ok] - row0
+    ns = ns[ok]
+    i = len(ns)
+
+    if i > 0:
+        out['index'][:i] = np.asarray(indexes[:-1])[ok]
+        out['n'][:i] = ns
+        out['val'][:i] = vals[starts + ns // 2]
+        if msid_is_numeric:
+            stats = binstats.segment_stats(times, vals, starts, ns, std=(interval == 'daily'))
+            negs = stats['negs']
+            if np.any(negs):
+                times_dts = list(zip(timeconv.secs2date(times[negs]), stats['neg_dts']))
+                logger.warning('WARNING - negative dts in {} at {}'
+                               .format(msid.MSID, times_dts))
+
+            out['min'][:i] = stats['min']
+            out['max'][:i] = stats['max']
+            out['mean'][:i] = stats['mean']
+            if interval == 'daily':
+                out['std'][:i] = stats['std']
+                quant_vals = binstats.segment_quantiles(vals, starts, ns,
+                                                        np.array(quantiles) / 100.0)
+                for quant_val, quantile in zip(quant_vals.T, quantiles):
+                    out['p%02d' % quantile][:i] = quant_val
+
+        if msid.state_codes and vals.dtype.kind in 'SU':
+            # If MSID has state codes then count the number of values in each state
+            # and store.
+            counts = binstats.segment_state_counts(vals, ns, msid.state_codes)
+            for code, (raw_count, state_code) in enumerate(msid.state_codes):
+                out['n_' + fix_state_code(state_code)][:i] = counts[:, code]
 
     return np.rec.fromarrays([x[:i] for x in out.values()], names=list(out.keys()))
 
 
+# Stats intervals in the order they are updated, ending with the finest
+# level of the stats pyramid from which the coarser levels are built
+STATS_INTERVALS = ('daily', '5min', pyramid.base_level())
+
+# Number of msids between progress reports of the stats update
+STATS_PROGRESS_MSIDS = 100
+
+
+def _stats_index0(dt):
+    """ Get the first stats index of a new stats file
+
+        INDEX0 is somewhat before any CXC archive data (which starts around 1999:205)
+    """
+    return timeconv.date2secs('1999:200:00:00:00') // dt
+
+
+def _stats_fetch_start(index0, dt):
+    """ Get the start time of the telemetry fetch to update stats from index0
+
+        The fetch nominally starts at 500 sec before the last available
+        record.  However some MSIDs may not be sampled for years at a time so
+        once the archive is built and kept up to date then do not look back
+        beyond a certain point.
+
+        Parameters
+        ----------
+        index0 : first stats index to update
+        dt : stats bin width (sec)
+
+        Returns
+        -------
+        float
+            The fetch start time (CXC seconds)
+    """
+    return pyramid.fetch_start(index0, dt, timeconv.to_secs(opt.date_now),
+                               opt.max_lookback_time * 86400)
+
+
+def _stats_next_index(colname, interval):
+    """ Get the next stats index of an msid without opening the stats file for writing """
+    stats_file = msid_paths.abs('stats', ft['content'].val, colname, interval)
+    if os.path.exists(stats_file):
+        with tables.open_file(stats_file, mode='r') as stats:
+            if stats.__contains__('/data') and stats.root.data.nrows > 0:
+                return stats.root.data.cols.index[-1] + 1
+    return _stats_index0(fetch.STATS_DT[interval])
+
+
+def update_msid_stats(colname):
+    """ Update the daily and 5min stats and the stats pyramid of an msid
+
+        The full-resolution telemetry is fetched once, from the earliest time
+        needed by any stats interval, and shared by all of them.
+
+        Parameters
+        ----------
+        colname : the msid name
+    """
+    time0 = min(_stats_fetch_start(_stats_next_index(colname, interval), fetch.STATS_DT[interval])
+                for interval in STATS_INTERVALS)
+    time1 = timeconv.to_secs(opt.date_now)
+    msid = fetch.MSID(colname, time0, time1, filter_bad=False)
+
+    for interval in STATS_INTERVALS:
+        update_stats(colname, interval, msid)
+    _update_stats_pyramid(colname)
+
+
+def _update_msid_stats_worker(content, colname):
+    """ Update the stats of an msid in a worker process of ``update_all_stats``
+
+        Returns
+        -------
+        tuple
+            The msid and the formatted exception or None if successful
+    """
+    ft['content'] = content
+    try:
+        update_msid_stats(colname)
+    except Exception:
+        return colname, traceback.format_exc()
+    return colname, None
+
+
+def _add_stats_columns(db):
+    """ Add the stats columns to an ingest_history table that predates them """
+    columns = [row['name'] for row in db.fetchall('PRAGMA table_info(ingest_history)')]
+    for column, sql_type in (('stats_msids', 'int'),
+                             ('stats_failures', 'int'),
+                             ('stats_status', 'text')):
+        if column not in columns:
+            db.execute(f"ALTER TABLE ingest_history ADD COLUMN {column} {sql_type}")
+    db.commit()
+
+
+def _report_stats_progress(db, ingest_id, n_msids, n_failures, status):
+    """ Report the progress of the stats update in ingest_history """
+    if opt.dry_run or ingest_id is None:
+        return
+
+    sql = (
+        "UPDATE ingest_history "
+        "SET "
+        f"stats_msids={n_msids}, "
+        f"stats_failures={n_failures}, "
+        f"stats_status='{status}' "
+        f"WHERE ingest_id={ingest_id}"
+    )
+    db.execute(sql)
+    db.commit()
+
+
+def update_all_stats(colnames):
+    """ Update the daily and 5min stats of every msid on a process pool
+
+        Each worker process updates all the stats files of one msid at a
+        time, so no two workers write to the same file.  The number of
+        workers is set with ``--stats-workers``.  Progress and the number of
+        msids that failed are reported in the stats columns of the latest
+        ingest_history record, and a failed msid does not stop the update of
+        the others.
+
+        Parameters
+        ----------
+        colnames : list of the msids to update
+    """
+    workers = opt.stats_workers or os.cpu_count() or 1
+    content = ft['content'].val
+    logger.info(f'Updating stats of {len(colnames)} msids with {workers} workers')
+
+    if workers == 1:
+        results = (_update_msid_stats_worker(content, colname) for colname in colnames)
+        executor = None
+    else:
+        # Workers are forked so they share the options and archive context
+        # of this process.  No HDF5 files are open at this point and the
+        # ingest database is only opened after the workers are started.
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('fork'))
+        futures = [executor.submit(_update_msid_stats_worker, content, colname)
+                   for colname in colnames]
+        results = (future.result() for future in concurrent.futures.as_completed(futures))
+
+    db = Ska.DBI.DBI(
+        dbi='sqlite',
+        server=msid_files['archfiles'].abs,
+        autocommit=False
+    )
+    ingest_id = db.fetchone('SELECT max(ingest_id) FROM ingest_history')['max(ingest_id)']
+    if not opt.dry_run:
+        _add_stats_columns(db)
+    _report_stats_progress(db, ingest_id, 0, 0, 'running')
+
+    n_msids = 0
+    failures = []
+    try:
+        for colname, error in results:
+            n_msids += 1
+            if error is not None:
+                logger.error(f'ERROR: stats update failed for {colname}:\n{error}')
+                failures.append(colname)
+            if n_msids % STATS_PROGRESS_MSIDS == 0:
+                logger.info(f'  Updated stats of {n_msids} of {len(colnames)} msids')
+                _report_stats_progress(db, ingest_id, n_msids, len(failures), 'running')
+    finally:
+        if executor is not None:
+            executor.shutdown()
+
+    status = 'failure' if failures else 'success'
+    _report_stats_progress(db, ingest_id, n_msids, len(failures), status)
+    if failures:
+        logger.warning(f'WARNING: stats update failed for {len(failures)} msids: {failures}')
+
+
 def update_stats(colname, interval, msid=None):
 
-    dt = {'5min': 328,
-          'daily': 86400}[interval]
+    dt = fetch.STATS_DT[interval]
 
     ft['msid'] = colname
     ft['interval'] = interval
@@ -716,23 +946,15 @@ def update_stats(colname, interval, msid=None):
     stats = tables.open_file(stats_file, mode='a',
                             filters=tables.Filters(complevel=5, complib='zlib'))
 
-    # INDEX0 is somewhat before any CXC archive data (which starts around 1999:205)
-    INDEX0 = DateTime('1999:200:00:00:00').secs // dt
+    INDEX0 = _stats_index0(dt)
     try:
         index0 = stats.root.data.cols.index[-1] + 1
     except tables.NoSuchNodeError:
         index0 = INDEX0
 
-    # Get all new data. time0 is the fetch start time which nominally starts at
-    # 500 sec before the last available record.  However some MSIDs may not
-    # be sampled for years at a time so once the archive is built and kept
-    # up to date then do not look back beyond a certain point.
     if msid is None:
-        # fetch telemetry plus a little extra
-
-        time0 = max(DateTime(opt.date_now).secs - opt.max_lookback_time * 86400,
-                    index0 * dt - 500)
-        time1 = DateTime(opt.date_now).secs
+        time0 = _stats_fetch_start(index0, dt)
+        time1 = timeconv.to_secs(opt.date_now)
 
         msid = fetch.MSID(colname, time0, time1, filter_bad=False)
 
@@ -746,21 +968,15 @@ def update_stats(colname, interval, msid=None):
 
         if len(times) > 2:
             rows = np.searchsorted(msid.times, times)
-            vals_stats = calc_stats_vals(msid, rows, indexes, interval)
-            if len(vals_stats) > 0:
+            vals_stats = _calc_stats_records(msid, rows, indexes, interval)
+            if len(vals_stats['data']) > 0:
                 # Don't change the following logic in order to add stats data
                 # on the same pass as creating the table.  Tried it and
                 # something got broken so that there was a single bad record
                 # after the first bunch.
                 if not opt.dry_run:
-                    try:
-                        stats.root.data.append(vals_stats)
-                        logger.info('  Adding %d records', len(vals_stats))
-                    except tables.NoSuchNodeError:
-                        logger.info('  Creating table with %d records ...', len(vals_stats))
-                        stats.create_table(stats.root, 'data', vals_stats,
-                                          "{} sampling".format(interval), expectedrows=2e7)
-                    stats.root.data.flush()
+                    _append_stats_table(stats, vals_stats, interval)
+                    _inline_next_indexes.pop(stats_file, None)
             else:
                 logger.info('  No stat records within available fetched values')
         else:
@@ -774,6 +990,223 @@ def update_stats(colname, interval, msid=None):
     return msid
 
 
+# Titles of the tables of stats files
+STATS_TABLE_TITLES = {'data': '{} sampling',
+                      'sketch': '{} quantile sketches'}
+
+
+def _append_stats_table(stats, vals_stats, interval):
+    """ Append stats records to the tables of an open stats file
+
+        Each table is created by its first append.
+
+        Parameters
+        ----------
+        stats : the open stats file
+        vals_stats : dict of the records of each table (``data`` and
+            optionally ``sketch``), see ``_calc_stats_records``
+        interval : stats interval
+    """
+    for node, records in vals_stats.items():
+        if len(records) == 0:
+            continue
+        try:
+            table = getattr(stats.root, node)
+            table.append(records)
+            logger.info('  Adding %d %s records', len(records), node)
+        except tables.NoSuchNodeError:
+            logger.info('  Creating %s table with %d records ...', node, len(records))
+            table = stats.create_table(stats.root, node, records,
+                                       STATS_TABLE_TITLES[node].format(interval),
+                                       expectedrows=2e7)
+        table.flush()
+
+
+# Number of centroids of the quantile sketches carried in the open bins of the
+# inline stats (None for no sketch).  The quantiles of the daily stats are
+# estimated from a sketch like that of the 1d level of the stats pyramid.
+OPEN_BIN_SKETCH_SIZES = {'daily': sketch.SKETCH_SIZES['1d'],
+                         '5min': None,
+                         pyramid.base_level(): sketch.SKETCH_SIZES[pyramid.base_level()]}
+
+# Next stats index of the stats files updated by the inline stats, which is
+# read from each file once per process.  ``update_stats`` drops the files
+# that it appends to.
+_inline_next_indexes = {}
+
+
+def _inline_next_index(colname, interval):
+    """ Get the next stats index of an msid for the inline stats """
+    stats_file = msid_paths.abs('stats', ft['content'].val, colname, interval)
+    if stats_file not in _inline_next_indexes:
+        _inline_next_indexes[stats_file] = int(_stats_next_index(colname, interval))
+    return _inline_next_indexes[stats_file]
+
+
+def _append_inline_stats(open_bins, msid, times, vals, had_rows):
+    """ Update the stats of an msid with the samples of an ingest chunk
+
+        The state of the open (last) bin of each stats interval is carried
+        between ingest chunks in ``open_bins`` (see ``jeta.archive.openbins``),
+        so only the new samples are used.  A bin is complete once there is a
+        sample in a later bin, which is the same rule as ``update_stats``.
+        The stats files are only opened to append complete bins.
+
+        If the msid already had archive rows but has no open bin yet (e.g.
+        the first ingest with inline stats), then the bin of the first new
+        sample is skipped, since its earlier samples are not known.
+
+        Parameters
+        ----------
+        open_bins : OpenBinTable of the open bins of every msid
+        msid : the msid name
+        times : times of the new samples (unix sec), in archive order
+        vals : values of the new samples
+        had_rows : the msid already had archive rows before these samples
+
+        Returns
+        -------
+        bool
+            Records were added to the finest level of the stats pyramid
+    """
+    if len(times) == 0:
+        return False
+
+    content = ft['content'].val
+    added = False
+    for interval in STATS_INTERVALS:
+        dt = fetch.STATS_DT[interval]
+        next_index = _inline_next_index(msid, interval)
+
+        # An open bin that is already in the stats table (e.g. after a crash
+        # or --stats-from-archive) is stale
+        open_index = open_bins.index(msid, interval)
+        if open_index is not None and open_index < next_index:
+            open_bins.discard(msid, interval)
+            open_index = None
+
+        if open_index is not None:
+            start_index = open_index
+        elif had_rows:
+            start_index = max(next_index, int(times[0] // dt) + 1)
+        else:
+            start_index = next_index
+
+        i0 = np.searchsorted(times, start_index * dt)
+        if i0 > 0:
+            if open_index is None and had_rows and start_index > next_index:
+                logger.info(f'  Skipping the {interval} stats bin of {msid} at '
+                            f'{timeconv.secs2date(timeconv.unix_to_cxcsec(times[0]))} '
+                            f'with earlier samples')
+            else:
+                logger.warning(f'WARNING - {i0} samples of {msid} are in {interval} '
+                               f'stats bins that are already complete')
+
+        bins, neg_times = open_bins.add(msid, interval, times[i0:], vals[i0:], dt,
+                                        OPEN_BIN_SKETCH_SIZES[interval])
+        if len(neg_times) > 0:
+            logger.warning('WARNING - negative dts in {} at {}'
+                           .format(msid, timeconv.secs2date(timeconv.unix_to_cxcsec(neg_times))))
+
+        vals_stats = _inline_stats_records(bins, interval)
+        if len(vals_stats['data']) == 0:
+            continue
+        stats_file = msid_paths.abs('stats', content, msid, interval)
+        _inline_next_indexes[stats_file] = int(vals_stats['data']['index'][-1]) + 1
+        if opt.dry_run:
+            continue
+
+        if not os.path.exists(os.path.dirname(stats_file)):
+            logger.info('Making stats dir {}'.format(os.path.dirname(stats_file)))
+            os.makedirs(os.path.dirname(stats_file))
+        with tables.open_file(stats_file, mode='a',
+                              filters=tables.Filters(complevel=5, complib='zlib')) as stats:
+            _append_stats_table(stats, vals_stats, interval)
+        added |= interval in pyramid.LEVELS
+
+    return added
+
+
+def _inline_stats_records(bins, interval):
+    """ Get the stats records of the bins completed by the inline stats
+
+        These are the moments and quantile sketches for the stats pyramid, and
+        records like those of ``calc_stats_vals`` for the 5min and daily
+        stats, where the mean and std are computed from the moments and the
+        daily quantiles are estimated from the sketches.
+
+        Parameters
+        ----------
+        bins : Bins completed by ``OpenBinTable.add``
+        interval : stats interval
+
+        Returns
+        -------
+        dict
+            The records of each table of the stats file, as for
+            ``_calc_stats_records``
+    """
+    if interval in pyramid.LEVELS:
+        return {'data': bins.moments, 'sketch': bins.sketches}
+
+    moments = bins.moments
+    stats = pyramid.moment_stats(moments)
+    out = OrderedDict()
+    out['index'] = moments['index']
+    out['n'] = moments['n']
+    out['val'] = bins.vals
+    out['min'] = moments['min']
+    out['max'] = moments['max']
+    out['mean'] = stats['mean'].astype(np.float32)
+    if interval == 'daily':
+        quantiles = (1, 5, 16, 50, 84, 95, 99)
+        out['std'] = stats['std']
+        quant_vals = np.array([sketch.quantiles(record['mean'], record['weight'],
+                                                record['min'], record['max'],
+                                                np.array(quantiles) / 100.0)
+                               for record in bins.sketches]).reshape(-1, len(quantiles))
+        for quant_val, quantile in zip(quant_vals.T, quantiles):
+            out['p%02d' % quantile] = quant_val
+
+    return {'data': np.rec.fromarrays(list(out.values()), names=list(out.keys()))}
+
+
+def _calc_stats_records(msid, rows, indexes, interval):
+    """ Compute the stats records of an interval
+
+        These are the ``calc_stats_vals`` records for the 5min and daily stats,
+        and the moments and quantile sketches of the finest level of the
+        stats pyramid, which are only computed for numeric msids.
+
+        Returns
+        -------
+        dict
+            The records of each table of the stats file: ``data`` and for the
+            stats pyramid ``sketch``
+    """
+    if interval not in pyramid.LEVELS:
+        return {'data': calc_stats_vals(msid, rows, indexes, interval)}
+
+    size = sketch.SKETCH_SIZES[interval]
+    if not issubclass(msid.vals.dtype.type, (np.number, np.bool_)):
+        return {'data': np.zeros(0, dtype=pyramid.MOMENTS_DTYPE),
+                'sketch': np.zeros(0, dtype=sketch.sketch_dtype(size))}
+    return {'data': pyramid.calc_moments(msid.times, msid.vals, rows, indexes),
+            'sketch': sketch.calc_sketches(msid.vals, rows, indexes, size)}
+
+
+def _update_stats_pyramid(colname):
+    """ Build the coarser levels of the stats pyramid of an msid from the finer levels """
+    content = ft['content'].val
+    n_added = pyramid.update_levels(
+        lambda level: msid_paths.abs('stats', content, colname, level),
+        filters=tables.Filters(complevel=5, complib='zlib'),
+        dry_run=opt.dry_run)
+    for level, n_records in n_added.items():
+        if n_records:
+            logger.info(f'  Adding {n_records} {level} stats pyramid records for {colname}')
+
+
 def update_derived(filetype):
     """Update full resolution MSID archive files for derived parameters with ``filetype``
     """
@@ -824,7 +1257,7 @@ def update_derived(filetype):
     # Read data out to either date_now or the last available time in telemetry.
     # opt.date_now could be set in the past for testing.
     index_step = int(round(archfile_time_step / time_step))
-    time1 = min(DateTime(opt.date_now).secs, last_time)
+    time1 = min(timeconv.to_secs(opt.date_now), last_time)
     index1 = int(time1 / time_step)
     indexes = np.arange(index0, index1, index_step)
 
@@ -858,8 +1291,8 @@ def update_archive(filetype):
         logger.info(
             (
                 f"Data Time Coverage (tstart, tstop): "
-                f"({Time(tstart, format='unix').iso},"
-                f"{Time(tstop, format='unix').iso})"
+                f"({timeconv.secs2date(timeconv.unix_to_cxcsec(tstart))},"
+                f"{timeconv.secs2date(timeconv.unix_to_cxcsec(tstop))})"
             )
         )
 
@@ -1017,17 +1450,23 @@ def _append_h5_col_tlm(msids):
     ----------
     msids : <class 'list'> of msids with data buffered for appending to the
             archive.
+
+    Returns
+    -------
+    dict
+        The number of rows of each msid after the append.  These rows are
+        flushed and can be published with ``_publish_committed_rows``.
     """
 
     global _times
     global _values
 
+    archive_rows = {}
+    content = ft['content'].val
     for msid in msids:
 
-        ft['msid'] = msid
-
         values_h5 = tables.open_file(
-            msid_files['mnemonic_value'].abs,
+            msid_paths.abs('mnemonic_value', content, msid),
             mode='a'
         )
 
@@ -1035,7 +1474,7 @@ def _append_h5_col_tlm(msids):
             _create_msid_value_dataset(msid, values_h5)
 
         times_h5 = tables.open_file(
-            msid_files['mnemonic_times'].abs,
+            msid_paths.abs('mnemonic_times', content, msid),
             mode='a'
         )
 
@@ -1058,23 +1497,178 @@ def _append_h5_col_tlm(msids):
         #     raise ValueError(f"ERROR: FULL STOP BECAUSE DATA IS CORRUPT, MISMATCH FOR {msid} !!!! ")
 
         # TODO: Verify epoch is correct
-        epoch = Time(_times[msid][0]/1000.0, format='unix').jd
+        epoch = timeconv.ms_to_jd(_times[msid][0])
 
         # Index should point to current number of rows
         index = values_h5.root.data.nrows
 
         _times[msid] = get_delta_times(_times[msid], epoch)
 
+        # The index (epoch and sparse time index) is only updated with the
+        # rows that it indexes
         if not opt.dry_run:
             values_h5.root.data.append(_values[msid])
             times_h5.root.time.append(_times[msid])
+            _update_index_file(msid, epoch, index, _times[msid])
 
-        _update_index_file(msid, epoch, index)
-
+        archive_rows[msid] = values_h5.root.data.nrows
         values_h5.close()
         times_h5.close()
 
-    return 0
+    return archive_rows
+
+
+def _load_committed_rows(colnames):
+    """ Load the committed rows of every msid in the archive
+
+        If the archive does not have a committed rows table yet then it is
+        started from the current length of the values file of each msid.
+        This is only done by ingest, so no rows are being appended.
+
+        Parameters
+        ----------
+        colnames : iterable of the msids in the archive
+
+        Returns
+        -------
+        dict
+            The committed rows keyed by msid
+    """
+    rows = committed.read_committed_rows(msid_paths.abs('committed', ft['content'].val))
+    if rows is not None:
+        return dict(rows)
+
+    rows = {}
+    content = ft['content'].val
+    for msid in colnames:
+        values_filepath = msid_paths.abs('mnemonic_value', content, msid)
+        if not os.path.exists(values_filepath):
+            continue
+        with tables.open_file(values_filepath, mode='r') as h5:
+            if h5.__contains__('/data'):
+                rows[msid] = h5.root.data.nrows
+
+    return rows
+
+
+def _load_latest_table(colnames):
+    """ Load the table of latest samples of every msid
+
+        The table is copied so it can be updated, and is resized if the
+        number of samples kept per msid (``--latest-samples``) has changed.
+        If the archive does not have a table yet then it is seeded from the
+        end of the archive files of each msid.
+
+        Parameters
+        ----------
+        colnames : iterable of the msids in the archive
+
+        Returns
+        -------
+        LatestTable
+    """
+    table = latest.read_latest(msid_paths.abs('latest', ft['content'].val))
+    if table is None:
+        return latest.seed_latest(colnames, opt.latest_samples)
+
+    n_samples = opt.latest_samples
+    n_keep = min(n_samples, table.n_samples)
+    times = np.full((len(table), n_samples), np.nan)
+    vals = np.full((len(table), n_samples), np.nan)
+    times[:, n_samples - n_keep:] = table.times[:, table.n_samples - n_keep:]
+    vals[:, n_samples - n_keep:] = table.vals[:, table.n_samples - n_keep:]
+
+    return latest.LatestTable(table.msids, times, vals)
+
+
+def _publish_latest_table(table):
+    """ Publish the table of latest samples of every msid
+
+        Parameters
+        ----------
+        table : LatestTable updated with the committed rows
+    """
+    if not opt.dry_run:
+        latest.write_latest(msid_paths.abs('latest', ft['content'].val), table)
+
+
+def _load_coverage_table(colnames):
+    """ Load the coverage map of every msid
+
+        The map is copied so it can be updated.  If the archive does not have
+        a coverage map yet then it is started for the msids already in the
+        archive, whose coverage is only known from their next ingest.
+
+        Parameters
+        ----------
+        colnames : iterable of the msids in the archive
+
+        Returns
+        -------
+        CoverageTable
+    """
+    table = coverage.read_coverage(msid_paths.abs('coverage', ft['content'].val))
+    if table is not None:
+        return coverage.CoverageTable(dict(table.coverage))
+
+    table = coverage.CoverageTable()
+    table.start(colnames)
+    return table
+
+
+def _publish_coverage_table(table):
+    """ Publish the coverage map of every msid
+
+        This is published before the committed rows, so the map never hides
+        committed telemetry from fetch.
+
+        Parameters
+        ----------
+        table : CoverageTable updated with the appended rows
+    """
+    if not opt.dry_run:
+        coverage.write_coverage(msid_paths.abs('coverage', ft['content'].val), table)
+
+
+def _publish_committed_rows(rows):
+    """ Publish the committed rows of every msid
+
+        This must only be called after the values, times and index files of
+        the appended rows are closed.  Fetch reads rows only up to the
+        committed rows, so readers never see a partially written append.
+
+        Parameters
+        ----------
+        rows : dict of the committed rows keyed by msid
+    """
+    if not opt.dry_run:
+        committed.write_committed_rows(msid_paths.abs('committed', ft['content'].val), rows)
+
+
+def _load_open_bins():
+    """ Load the open stats bins of every msid for the inline stats
+
+        Returns
+        -------
+        OpenBinTable
+    """
+    table = openbins.read_open_bins(msid_paths.abs('open_bins', ft['content'].val))
+    return openbins.OpenBinTable() if table is None else table
+
+
+def _publish_open_bins(table):
+    """ Publish the open stats bins of every msid if they changed
+
+        This is published after the complete bins are appended to the stats
+        files, so an open bin is never missing from both.
+
+        Parameters
+        ----------
+        table : OpenBinTable updated with the ingested samples
+    """
+    if table.changed and not opt.dry_run:
+        openbins.write_open_bins(msid_paths.abs('open_bins', ft['content'].val), table)
+        table.changed = False
 
 
 def truncate_archive(filetype, date):
@@ -1083,7 +1677,7 @@ def truncate_archive(filetype, date):
     """
     colnames = pickle.load(open(msid_files['colnames'].abs, 'rb'))
 
-    date = DateTime(date).date
+    date = timeconv.secs2date(timeconv.to_secs(date))
     year, doy = date[0:4], date[5:8]
 
     # Setup db handle with autocommit=False so that error along the way aborts insert transactions
@@ -1099,7 +1693,7 @@ def truncate_archive(filetype, date):
     if len(out) == 0:
         return
     rowstart = out['rowstart'].min()
-    time0 = DateTime("{0}:{1}:00:00:00".format(year, doy)).secs
+    time0 = timeconv.date2secs("{0}:{1}:00:00:00".format(year, doy))
 
     for colname in colnames:
         ft['msid'] = colname
@@ -1180,7 +1774,7 @@ def read_derived(i, filename, filetype, row, colnames, archfiles, db):
     # Accumlate relevant info about archfile that will be ingested into
     # MSID h5 files.  Commit info before h5 ingest so if there is a failure
     # the needed info will be available to do the repair.
-    date = DateTime(times[0]).date
+    date = timeconv.secs2date(times[0])
     year, doy = date[0:4], date[5:8]
     archfiles_row = dict(filename=filename,
                          filetime=int(index0 * time_step),
@@ -1208,8 +1802,7 @@ def get_delta_times(times, epoch=None):
         raise ValueError("Must have epoch")
     # epoch = Time(time.gmtime(0), format='unix').jd
 
-    x = [t/1000.0 for t in times]
-    jd_times = Time(x, format='unix').jd
+    jd_times = timeconv.ms_to_jd(times)
     return np.diff(np.insert(jd_times, 0, epoch))
 
 
@@ -1288,6 +1881,8 @@ def process_ingest_files(files_to_process, tstart, tstop, ingest_id, chunk=6):
     # Later tar and move out of staging the files named in this list
     processed_files = []
     chunk_group = 0
+    # Msids with new records in the finest level of the stats pyramid
+    pyramid_msids = set()
 
     db = Ska.DBI.DBI(
         dbi='sqlite',
@@ -1297,7 +1892,7 @@ def process_ingest_files(files_to_process, tstart, tstop, ingest_id, chunk=6):
 
     ingest_record = {
         'processed_files': len(processed_files),
-        'tstart': Time(Time.now(), format="datetime").unix,
+        'tstart': time.time(),
         'rowstart': None,
         'ingest_status': 'processing',
         'new_msids': 0,
@@ -1347,6 +1942,11 @@ def process_ingest_files(files_to_process, tstart, tstop, ingest_id, chunk=6):
             colnames = pickle.load(f)
             old_colnames = colnames.copy()
 
+        committed_rows = _load_committed_rows(colnames)
+        latest_table = _load_latest_table(colnames)
+        coverage_table = _load_coverage_table(colnames)
+        open_bins = _load_open_bins() if opt.update_stats else None
+
         reset_storage()
 
         if len(file_processing_queue) < chunk:
@@ -1385,7 +1985,10 @@ def process_ingest_files(files_to_process, tstart, tstop, ingest_id, chunk=6):
             large_sample, offset = _aggregate_dataset_samples(f['samples'], large_sample, offset)
             metadata = np.unique(np.concatenate((metadata, f['metadata'][...]), 0))
             if not opt.dry_run:
-                yday = Time(ingest_file['tstart'], format='unix').yday
+                yday = timeconv.secs2date(timeconv.unix_to_cxcsec(ingest_file['tstart']))
+                # UTC date in the ISO format of ``astropy.time.Time.iso``
+                processing_date = datetime.datetime.now(datetime.timezone.utc).strftime(
+                    '%Y-%m-%d %H:%M:%S.%f')[:-3]
                 archfiles_row = dict(
                     filename=str(f.filename).replace('/srv/telemetry/staging/', ''),
                     tstart=ingest_file['tstart'],
@@ -1394,7 +1997,7 @@ def process_ingest_files(files_to_process, tstart, tstop, ingest_id, chunk=6):
                     chunk_group=chunk_group,
                     year=yday[0:4],
                     doy=yday[5:8],
-                    processing_date=Time.now().iso,
+                    processing_date=processing_date,
                     ingest_id=ingest_id
                 )
                 db.insert(archfiles_row, 'archfiles')
@@ -1446,7 +2049,29 @@ def process_ingest_files(files_to_process, tstart, tstop, ingest_id, chunk=6):
             f" new datapoints to the archive for {len(msids)} msids ..."
         )
 
-        _append_h5_col_tlm(msids)
+        # Times are converted to delta times by the append, so take the
+        # latest samples first
+        n_latest = latest_table.n_samples
+        latest_table.update({msid: (timeconv.ms_to_unix(np.asarray(_times[msid][-n_latest:])),
+                                    _values[msid][-n_latest:])
+                             for msid in msids if len(_times[msid]) > 0})
+        sample_times = {msid: timeconv.ms_to_unix(np.asarray(_times[msid], dtype=np.float64))
+                        for msid in msids}
+        coverage_table.update(sample_times)
+        had_rows = {msid for msid in msids if committed_rows.get(msid, 0) > 0}
+
+        committed_rows.update(_append_h5_col_tlm(msids))
+        _publish_coverage_table(coverage_table)
+        _publish_committed_rows(committed_rows)
+        _publish_latest_table(latest_table)
+
+        if opt.update_stats:
+            for msid in msids:
+                if _append_inline_stats(open_bins, msid, sample_times[msid],
+                                        np.asarray(_values[msid], dtype=np.float64),
+                                        had_rows=msid in had_rows):
+                    pyramid_msids.add(msid)
+            _publish_open_bins(open_bins)
 
         processed_files = processed_files + file_processing_chunk
         sql = (
@@ -1458,7 +2083,12 @@ def process_ingest_files(files_to_process, tstart, tstop, ingest_id, chunk=6):
         db.execute(sql)
         db.commit()
 
-    ingest_record['tstop'] = Time(Time.now(), format="datetime").unix
+    # The coarser levels of the stats pyramid are built once per ingest from
+    # the finest level
+    for msid in sorted(pyramid_msids):
+        _update_stats_pyramid(msid)
+
+    ingest_record['tstop'] = time.time()
     ingest_record['processed_files'] = len(processed_files)
     ingest_record['ingest_status'] = 'success'
 
@@ -1491,7 +2121,7 @@ def move_archive_files(filetype, processed_ingest_files):
 
         os.chdir(STAGING_DIRECTORY)
 
-        tarfile_name = f"stage_{int(DateTime().secs)}.tar"
+        tarfile_name = f"stage_{int(timeconv.unix_to_cxcsec(time.time()))}.tar"
         tar = tarfile.open(tarfile_name, mode='w')
 
         for ingest_file in processed_ingest_files:
@@ -6,16 +6,25 @@ from __future__ import print_function, division, absolute_import
 
 import os
 import time
+import pickle
+import tempfile
+import threading
 import six
 from six.moves import zip
 from functools import wraps
 import numpy as np
-from astropy.time import TimeDatetime
+
+from . import timeconv
 
 
 # Cache the results of fetching 3 days of telemetry keyed by MSID
 FETCH_SIZES = {}
 
+# Cached pickle files keyed by file name, each with the (mtime_ns, size, inode)
+# of the file when it was read
+_PICKLE_CACHE = {}
+_PICKLE_CACHE_LOCK = threading.Lock()
+
 
 def timeit_wrapper(func):
     """
@@ -41,6 +50,96 @@ def get_env_variable(var_name):
         raise ValueError(error_msg)
 
 
+def _file_stamp(filename):
+    """Get the (mtime_ns, size, inode) of ``filename`` or None if it does not exist"""
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+
+def read_pickle_cached(filename):
+    """
+    Read a pickle file that is replaced with ``write_pickle_atomic``.  The
+    object is cached and only read again when the file changes, so repeated
+    calls cost one ``os.stat``.  The cached object must not be modified.
+
+    :param filename: pickle file name
+    :returns: unpickled object, or None if the file does not exist
+    """
+    stamp = _file_stamp(filename)
+    if stamp is None:
+        return None
+
+    with _PICKLE_CACHE_LOCK:
+        cached = _PICKLE_CACHE.get(filename)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    with open(filename, 'rb') as fh:
+        obj = pickle.load(fh)
+
+    with _PICKLE_CACHE_LOCK:
+        _PICKLE_CACHE[filename] = (stamp, obj)
+
+    return obj
+
+
+def write_pickle_atomic(filename, obj):
+    """
+    Write ``obj`` to a pickle file, replacing the file atomically (write to a
+    temporary file in the same directory and rename).  Readers never block the
+    writer and always see either the previous or the new file.
+
+    :param filename: pickle file name
+    :param obj: object to pickle
+    """
+    dirname = os.path.dirname(os.path.abspath(filename))
+    fd, tmpname = tempfile.mkstemp(dir=dirname, prefix='.' + os.path.basename(filename) + '.')
+    try:
+        with os.fdopen(fd, 'wb') as fh:
+            pickle.dump(obj, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.chmod(tmpname, 0o644)
+        os.replace(tmpname, filename)
+    except Exception:
+        if os.path.exists(tmpname):
+            os.unlink(tmpname)
+        raise
+
+
+def map_msids(func, MSIDs, args=(), workers=None, msids_per_worker=1):
+    """
+    Call ``func(chunk, *args)`` for chunks of ``MSIDs`` in worker processes,
+    since reads from the HDF5 files in one process are serialized.  MSIDs are
+    interleaved between workers to balance the load.
+
+    :param func: picklable function returning one result per MSID of a chunk
+    :param MSIDs: list of MSID names
+    :param args: other arguments of ``func``
+    :param workers: number of worker processes (default=number of CPUs, with
+                    at least ``msids_per_worker`` MSIDs per worker)
+    :param msids_per_worker: minimum number of MSIDs per worker
+    :returns: list of the results of each MSID, in the order of ``MSIDs``
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    workers = max(min(workers, len(MSIDs) // msids_per_worker), 1)
+    if workers == 1:
+        return list(func(MSIDs, *args))
+
+    out = [None] * len(MSIDs)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(func, MSIDs[i::workers], *args) for i in range(workers)]
+        for i, future in enumerate(futures):
+            out[i::workers] = future.result()
+    return out
+
+
 def get_fetch_size(msids, start, stop, stat=None, interpolate_dt=None, fast=True):
     """
     Estimate the memory size required to fetch the ``msids`` between ``start`` and
@@ -68,11 +167,12 @@ def get_fetch_size(msids, start, stop, stat=None, interpolate_dt=None, fast=True
     :returns: fetch_Mb, interpolated_Mb
     """
 
-    start = TimeDatetime(start)
-    stop = TimeDatetime(stop)
+    start = timeconv.to_secs(start)
+    stop = timeconv.to_secs(stop)
+    fetch_days = (stop - start) / 86400
 
     # Short circuit in the case of a short fetch or not full-resolution telemetry
-    if fast and (stop - start < 30 or stat is not None):
+    if fast and (fetch_days < 30 or stat is not None):
         return -1, -1
 
     from . import fetch
@@ -91,14 +191,14 @@ def get_fetch_size(msids, start, stop, stat=None, interpolate_dt=None, fast=True
             fetch_rows = len(dat.vals)
             FETCH_SIZES[msid, stat] = (fetch_bytes, fetch_rows)
 
-    scale = (stop - start) / 3.0
+    scale = fetch_days / 3.0
     fetch_bytes = sum(FETCH_SIZES[msid, stat][0] * scale for msid in msids)
 
     # Number of output rows = total fetch time (days) / interpolate interval in days
     if interpolate_dt is None:
         out_bytes = fetch_bytes
     else:
-        n_rows_out = (stop - start) / (interpolate_dt / 86400)
+        n_rows_out = fetch_days / (interpolate_dt / 86400)
         out_bytes = sum(FETCH_SIZES[msid, stat][0] * n_rows_out / FETCH_SIZES[msid, stat][1]
                         for msid in msids)
 
@@ -144,8 +244,8 @@ def ss_vector(start, stop=None, obj='Earth'):
       subplot(2, 1, 2)
       plot_cxctime(vec['times'], vec['distance'])
 
-    :param start: start time (TimeDatetime format)
-    :param stop: stop time (TimeDatetime format)
+    :param start: start time (DateTime format)
+    :param stop: stop time (DateTime format)
     :param obj: solar system object ('Earth', 'Moon', 'Sun')
 
     :returns: table of vector values
@@ -161,8 +261,8 @@ def ss_vector(start, stop=None, obj='Earth'):
         raise ValueError('obj parameter must be one of {0}'
                          .format(list(sign.keys())))
 
-    tstart = TimeDatetime(start).secs
-    tstop = TimeDatetime(stop).secs
+    tstart = timeconv.to_secs(start)
+    tstop = timeconv.to_secs(stop)
     q_att_msids = ['aoattqt1', 'aoattqt2', 'aoattqt3', 'aoattqt4']
     q_atts = fetch.MSIDset(q_att_msids, tstart, tstop, stat='5min')
 
@@ -342,8 +442,8 @@ def state_intervals(times, vals):
     state_vals = vals[transitions[1:]]
     state_times = midtimes[transitions]
 
-    intervals = {'datestart': TimeDatetime(state_times[:-1]).date,
-                 'datestop': TimeDatetime(state_times[1:]).date,
+    intervals = {'datestart': timeconv.secs2date(state_times[:-1]),
+                 'datestop': timeconv.secs2date(state_times[1:]),
                  'tstart': state_times[:-1],
                  'tstop': state_times[1:],
                  'duration': state_times[1:] - state_times[:-1],
@@ -11,6 +11,9 @@ CREATE TABLE IF NOT EXISTS ingest_history (
   ingest_status     text, -- success, failure, null
   new_msids         int, -- number of new msids added during this ingest
   chunk_size        int, -- processing chunks used during this ingest
+  stats_msids       int, -- number of msids processed by the stats update after this ingest
+  stats_failures    int, -- number of msids for which the stats update failed
+  stats_status      text, -- running, success, failure, null
 
   CONSTRAINT pk_ingest_id PRIMARY KEY (ingest_id)
 );